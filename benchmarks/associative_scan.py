@@ -0,0 +1,74 @@
+"""
+Benchmarks the sequential (`jax.lax.scan`) against the parallel-prefix
+(`associative_scan=True`) implementation of the sensor signal filters
+- `sensors._butterworth` (forward-backward)
+- `sensors._quasi_physical_simulation`
+- `maths.quat_lowpassfilter`
+
+For an increasing sequence length this script reports the runtime of one (already
+compiled) call, vmapped over a batch of sequences.
+
+Run with
+    python benchmarks/associative_scan.py
+"""
+
+from functools import partial
+import time
+
+import jax
+import jax.numpy as jnp
+
+import ring
+from ring.algorithms import sensors
+
+SEQUENCE_LENGTHS = [1000, 6000, 30000]
+BATCHSIZE = 32
+N_REPEATS = 10
+DT = 0.01
+
+
+def _filters(associative_scan: bool) -> dict:
+    return {
+        "butterworth": lambda xs: sensors._butterworth(
+            xs.pos, 1 / DT, 10.0, associative_scan=associative_scan
+        ),
+        "quasi_physical": lambda xs: sensors._quasi_physical_simulation(
+            xs, DT, associative_scan
+        ).pos,
+        "quat_lowpassfilter": lambda xs: ring.maths.quat_lowpassfilter(
+            xs.rot, 10.0, 1 / DT, associative_scan=associative_scan
+        ),
+    }
+
+
+def benchmark(f, xs) -> float:
+    f = jax.jit(jax.vmap(f))
+    jax.block_until_ready(f(xs))
+    t0 = time.time()
+    for _ in range(N_REPEATS):
+        jax.block_until_ready(f(xs))
+    return (time.time() - t0) / N_REPEATS
+
+
+def _random_xs(T: int) -> ring.Transform:
+    key_pos, key_rot = jax.random.split(jax.random.PRNGKey(1))
+    pos = jnp.cumsum(jax.random.normal(key_pos, (BATCHSIZE, T, 3)) * DT, axis=1)
+    rot = jax.vmap(partial(ring.maths.quat_random, batch_shape=(T,)))(
+        jax.random.split(key_rot, BATCHSIZE)
+    )
+    return ring.Transform(pos, rot)
+
+
+def main():
+    print(f"{'filter':>20} {'T':>8} {'scan [ms]':>10} {'assoc. scan [ms]':>17}")
+    for T in SEQUENCE_LENGTHS:
+        xs = _random_xs(T)
+        sequential, parallel = _filters(False), _filters(True)
+        for name in sequential:
+            t_seq = benchmark(sequential[name], xs)
+            t_par = benchmark(parallel[name], xs)
+            print(f"{name:>20} {T:>8} {t_seq * 1000:>10.2f} {t_par * 1000:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
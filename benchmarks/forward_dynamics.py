@@ -0,0 +1,86 @@
+"""
+Benchmarks the forward dynamics of `ring.System.dynamics_method`: `crba` (mass matrix)
+with a `dense` solve (O(n^3)) or with the `ltdl` factorisation along the kinematic
+tree (`ring.System.mass_mat_solver`) against `aba` (articulated-body algorithm, O(n)).
+
+For a chain with an increasing number of links this script reports
+- the compile time of `jax.jit(ring.step)`
+- the runtime of one (already compiled) step
+
+The systems use the `levels` scan mode, because the `sequential` composite-rigid-body
+algorithm traces O(n^2) operations and takes minutes to compile for 20 links.
+
+Run with
+    python benchmarks/forward_dynamics.py
+"""
+
+import time
+
+import jax
+import jax.numpy as jnp
+
+import ring
+
+N_LINKS = [5, 10, 20, 50]
+DYNAMICS_METHODS = {
+    "dense": dict(dynamics_method="crba", mass_mat_solver="dense"),
+    "ltdl": dict(dynamics_method="crba", mass_mat_solver="ltdl"),
+    "aba": dict(dynamics_method="aba"),
+}
+SCAN_MODE = "levels"
+N_REPEATS = 100
+JOINT_TYPES = ["rx", "ry", "rz"]
+
+
+def chain_xml(n_links: int) -> str:
+    bodies = ""
+    for i in reversed(range(n_links)):
+        joint = "free" if i == 0 else JOINT_TYPES[i % len(JOINT_TYPES)]
+        bodies = (
+            f'<body name="seg{i}" pos="0.1 0 0" joint="{joint}" damping="'
+            + " ".join(["0.1"] * (6 if i == 0 else 1))
+            + '"><geom type="box" mass="1" pos="0.05 0 0" dim="0.1 0.05 0.05"/>'
+            f"{bodies}</body>"
+        )
+    return f"""
+<x_xy>
+    <options gravity="0 0 9.81" dt="0.01"/>
+    <worldbody>
+        {bodies}
+    </worldbody>
+</x_xy>
+"""
+
+
+def benchmark(sys: ring.System) -> tuple[float, float]:
+    state = ring.State.create(sys)
+    taus = jnp.zeros((sys.qd_size(),))
+
+    t0 = time.time()
+    step = jax.jit(ring.step).lower(sys, state, taus).compile()
+    compile_time = time.time() - t0
+
+    jax.block_until_ready(step(sys, state, taus))
+    t0 = time.time()
+    for _ in range(N_REPEATS):
+        state = step(sys, state, taus)
+    jax.block_until_ready(state)
+    step_time = (time.time() - t0) / N_REPEATS
+
+    return compile_time, step_time
+
+
+def main():
+    print(f"{'n_links':>8} {'method':>8} {'compile [s]':>12} {'step [ms]':>10}")
+    for n_links in N_LINKS:
+        sys = ring.System.create(chain_xml(n_links)).replace(scan_mode=SCAN_MODE)
+        for method, fields in DYNAMICS_METHODS.items():
+            compile_time, step_time = benchmark(sys.replace(**fields))
+            print(
+                f"{n_links:>8} {method:>8} {compile_time:>12.2f} "
+                f"{step_time * 1000:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmarks `ring.RCMG` with an increasing number of `MotionConfig`s, once with the
+configs stacked into traced arrays and one vmapped `draw_random_q`
+(`stack_configs=True`, see `ring.algorithms.stack_motionconfigs`) and once with one
+`draw_random_q` per config (the default).
+
+For every number of configs this script reports
+- the compile time of the lazy generator
+- the generated sequences per second (after compilation)
+
+Run with
+    python benchmarks/generator_configs.py
+"""
+
+import time
+
+import jax
+import numpy as np
+
+import ring
+
+N_CONFIGS = [1, 4, 8]
+REPEATS = 2
+T = 30.0
+N_REPEATS = 5
+
+
+def make_configs(n_configs: int) -> list[ring.MotionConfig]:
+    return [
+        ring.MotionConfig(T=T, t_max=t_max, dang_max=dang_max)
+        for t_max, dang_max in zip(
+            np.linspace(0.3, 1.5, n_configs), np.linspace(3.0, 1.0, n_configs)
+        )
+    ]
+
+
+def benchmark(n_configs: int, stack_configs: bool) -> tuple[float, float]:
+    sys = ring.io.load_example("test_three_seg_seg2")
+    rcmg = ring.RCMG(
+        sys,
+        make_configs(n_configs),
+        add_X_imus=True,
+        add_y_relpose=True,
+        stack_configs=stack_configs,
+    )
+    gen = rcmg.to_lazy_gen(REPEATS * n_configs)
+
+    t0 = time.time()
+    jax.block_until_ready(gen(jax.random.PRNGKey(0)))
+    compile_time = time.time() - t0
+
+    t0 = time.time()
+    for i in range(N_REPEATS):
+        jax.block_until_ready(gen(jax.random.PRNGKey(i)))
+    return compile_time, N_REPEATS * REPEATS * n_configs / (time.time() - t0)
+
+
+def main():
+    print(
+        f"{'configs':>8} {'loop compile [s]':>17} {'stacked compile [s]':>20} "
+        f"{'loop [seq/s]':>13} {'stacked [seq/s]':>16}"
+    )
+    for n_configs in N_CONFIGS:
+        loop_compile, loop_throughput = benchmark(n_configs, False)
+        stacked_compile, stacked_throughput = benchmark(n_configs, True)
+        print(
+            f"{n_configs:>8} {loop_compile:>17.1f} {stacked_compile:>20.1f} "
+            f"{loop_throughput:>13.1f} {stacked_throughput:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
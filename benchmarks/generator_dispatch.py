@@ -0,0 +1,62 @@
+"""
+Benchmarks the `dispatch` argument of `ring.RCMG.to_lazy_gen` for an increasing
+number of systems that are generated in one batch, see `batch.generators_lazy`.
+
+For every number of systems this script reports
+- the compile time of `switch` and `grouped` dispatch
+- the generated sequences per second (after compilation) of both
+
+Run with
+    python benchmarks/generator_dispatch.py
+"""
+
+import time
+
+import jax
+
+import ring
+
+N_SYSTEMS = [1, 2, 4]
+SIZE_PER_SYSTEM = 8
+T = 30.0
+N_REPEATS = 5
+EXAMPLE = "test_three_seg_seg2"
+
+
+def benchmark(rcmg: ring.RCMG, dispatch: str) -> tuple[float, float]:
+    bs = SIZE_PER_SYSTEM * len(rcmg.gens)
+    gen = rcmg.to_lazy_gen(bs, dispatch=dispatch)
+    t0 = time.time()
+    jax.block_until_ready(gen(jax.random.PRNGKey(0)))
+    compile_time = time.time() - t0
+
+    t0 = time.time()
+    for i in range(N_REPEATS):
+        jax.block_until_ready(gen(jax.random.PRNGKey(i)))
+    return compile_time, N_REPEATS * bs / (time.time() - t0)
+
+
+def main():
+    print(
+        f"{'systems':>8} {'switch compile [s]':>19} {'grouped compile [s]':>20} "
+        f"{'switch [seq/s]':>15} {'grouped [seq/s]':>16}"
+    )
+    for n_systems in N_SYSTEMS:
+        # the generators of all systems are distinct, even if the systems are not
+        sys = ring.io.load_example(EXAMPLE)
+        rcmg = ring.RCMG(
+            [sys] * n_systems,
+            ring.MotionConfig(T=T),
+            add_X_imus=True,
+            add_y_relpose=True,
+        )
+        switch_compile, switch_throughput = benchmark(rcmg, "switch")
+        grouped_compile, grouped_throughput = benchmark(rcmg, "grouped")
+        print(
+            f"{n_systems:>8} {switch_compile:>19.1f} {grouped_compile:>20.1f} "
+            f"{switch_throughput:>15.1f} {grouped_throughput:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmarks the throughput of `ring.RCMG.to_list` for an increasing number of worker
+processes (`processes` argument), see `batch.generators_eager_processes`.
+
+This script reports the generated sequences per second, including the startup and
+the compilation of the worker processes.
+
+Run with
+    python benchmarks/generator_processes.py
+"""
+
+import os
+import time
+
+import ring
+
+SIZE = 256
+T = 30.0
+
+
+def benchmark(rcmg: ring.RCMG, processes: int) -> float:
+    t0 = time.time()
+    data = rcmg.to_list(SIZE, processes=processes)
+    return len(data) / (time.time() - t0)
+
+
+def main():
+    sys = ring.io.load_example("exclude/standard_sys")
+    # many small calls, such that the calls can be distributed
+    rcmg = ring.RCMG(
+        [sys] * 16,
+        ring.MotionConfig(T=T),
+        add_X_imus=True,
+        add_y_relpose=True,
+        disable_tqdm=True,
+    )
+
+    n_cpus = os.cpu_count()
+    processes = [1] + [p for p in [2, 4, 8, 16, 32, 64] if p <= n_cpus]
+    print(f"{'processes':>10} {'seq/s':>10}")
+    for p in processes:
+        print(f"{p:>10} {benchmark(rcmg, p):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmarks three ways of generating data at several sampling rates:
+- `product`: the cartesian product of systems and rates of
+  `utils.randomize_sys.randomize_hz`, one generator per rate
+- `traced`: `randomize_hz` without buckets, one generator with a traced `dt` whose
+  sequences have the length at the lowest rate
+- `buckets`: `randomize_hz` with `n_buckets`, one generator per bucket of rates
+  whose sequences span `T` at every rate, padded and with a validity mask
+
+For every method this script reports the number of generators, the compile time,
+the generated sequences per second (after compilation), the number of timesteps
+of a sequence and the fraction of valid timesteps.
+
+Run with
+    python benchmarks/generator_randomize_hz.py
+"""
+
+import time
+
+import jax
+import numpy as np
+
+import ring
+
+# rates whose `dt` divides the rescaled `T` of `randomize_hz` without round-off,
+# otherwise its motion and system disagree on the number of timesteps
+SAMPLING_RATES = [40.0, 50.0, 80.0, 100.0]
+N_BUCKETS = 2
+T = 10.0
+SIZE = 16
+N_REPEATS = 5
+
+
+def make_rcmg(method: str) -> ring.RCMG:
+    sys = ring.io.load_example("test_three_seg_seg2")
+    config = ring.MotionConfig(T=T)
+    kwargs = dict(add_X_imus=True, add_y_relpose=True)
+    if method == "product":
+        syss, configs = ring.utils.randomize_sys.randomize_hz(
+            [sys], [config], SAMPLING_RATES
+        )
+        # the sequences of different rates have different lengths, so they can
+        # not be batched into one lazy generator
+        return [ring.RCMG(s, c, **kwargs) for s, c in zip(syss, configs)]
+    randomize_hz_kwargs = dict(sampling_rates=SAMPLING_RATES)
+    if method == "buckets":
+        randomize_hz_kwargs["n_buckets"] = N_BUCKETS
+    return [
+        ring.RCMG(
+            sys,
+            config,
+            randomize_hz=True,
+            randomize_hz_kwargs=randomize_hz_kwargs,
+            **kwargs,
+        )
+    ]
+
+
+def benchmark(method: str) -> tuple[int, float, float, int, float]:
+    rcmgs = make_rcmg(method)
+    gens = [rcmg.to_lazy_gen(SIZE // len(rcmgs)) for rcmg in rcmgs]
+    n_generators = sum(len(rcmg.gens) for rcmg in rcmgs)
+
+    t0 = time.time()
+    data = jax.block_until_ready([gen(jax.random.PRNGKey(0)) for gen in gens])
+    compile_time = time.time() - t0
+
+    t0 = time.time()
+    for i in range(N_REPEATS):
+        jax.block_until_ready([gen(jax.random.PRNGKey(i)) for gen in gens])
+    throughput = N_REPEATS * SIZE / (time.time() - t0)
+
+    X = data[-1][0]
+    N = X["seg1"]["acc"].shape[1]
+    valid = np.mean(X["mask"]) if "mask" in X else 1.0
+    return n_generators, compile_time, throughput, N, valid
+
+
+def main():
+    print(
+        f"{'method':>8} {'generators':>11} {'compile [s]':>12} {'seq/s':>8} "
+        f"{'timesteps':>10} {'valid':>6}"
+    )
+    for method in ["product", "traced", "buckets"]:
+        n_generators, compile_time, throughput, N, valid = benchmark(method)
+        print(
+            f"{method:>8} {n_generators:>11} {compile_time:>12.1f} "
+            f"{throughput:>8.1f} {N:>10} {valid:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
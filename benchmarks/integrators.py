@@ -0,0 +1,94 @@
+"""
+Benchmarks `ring.System.integration_method` and the substepping of `ring.step` for a
+pendulum with a stiff, unactuated spring joint (as from `motion_artifacts`) that
+diverges with semi-implicit Euler at the sensor rate of 100 Hz.
+
+For every configuration this script reports
+- the compile time of the unrolled and vmapped simulation
+- the runtime of the (already compiled) simulation
+- the maximum error of the joint angles w.r.t. a reference with 64 substeps
+
+Run with
+    python benchmarks/integrators.py
+"""
+
+import time
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+import ring
+
+BATCHSIZE = 32
+T = 100
+N_REPEATS = 5
+# (integration_method, n_substeps, max_substeps)
+CONFIGS = {
+    "euler": ("semi_implicit_euler", 1, None),
+    "euler x8": ("semi_implicit_euler", 8, None),
+    "euler adaptive": ("semi_implicit_euler", 1, 16),
+    "implicit": ("implicit_damping_euler", 1, None),
+    "rk4 x4": ("rk4", 4, None),
+}
+REFERENCE = ("semi_implicit_euler", 64, None)
+
+SYS_XML = r"""
+<x_xy>
+    <options gravity="0 0 9.81" dt="0.01"/>
+    <worldbody>
+        <body name="upper" joint="ry" damping="0.1">
+            <geom type="box" mass="1" pos="0.5 0 0" dim="1 0.1 0.1"/>
+            <body name="imu" pos="1 0 0" joint="rx" damping="0.01" spring_stiff="500">
+                <geom type="box" mass="0.1" pos="0 0.1 0" dim="0.05 0.2 0.05"/>
+            </body>
+        </body>
+    </worldbody>
+</x_xy>
+"""
+
+
+def simulate(sys: ring.System, n_substeps: int, max_substeps):
+    def _simulate(q0):
+        def body(state, _):
+            state = ring.step(sys, state, None, n_substeps, max_substeps)
+            return state, state.q
+
+        state = ring.State.create(sys, q=q0)
+        return jax.lax.scan(body, state, None, length=T)[1]
+
+    return jax.jit(jax.vmap(_simulate))
+
+
+def benchmark(sys: ring.System, config, q0) -> tuple[float, float, jax.Array]:
+    method, n_substeps, max_substeps = config
+    sys = sys.replace(integration_method=method)
+
+    t0 = time.time()
+    fn = simulate(sys, n_substeps, max_substeps).lower(q0).compile()
+    compile_time = time.time() - t0
+
+    qs = jax.block_until_ready(fn(q0))
+    t0 = time.time()
+    for _ in range(N_REPEATS):
+        jax.block_until_ready(fn(q0))
+    run_time = (time.time() - t0) / N_REPEATS
+
+    return compile_time, run_time, qs
+
+
+def main():
+    sys = ring.System.create(SYS_XML)
+    q0 = jax.random.uniform(jax.random.PRNGKey(1), (BATCHSIZE, 2), minval=-0.5)
+    q_ref = benchmark(sys, REFERENCE, q0)[2]
+
+    print(f"{'config':>16} {'compile [s]':>12} {'run [ms]':>10} {'max error':>10}")
+    for name, config in CONFIGS.items():
+        compile_time, run_time, qs = benchmark(sys, config, q0)
+        error = float(jnp.max(jnp.abs(qs - q_ref)))
+        error = f"{error:>10.4f}" if np.isfinite(error) else f"{'diverged':>10}"
+        print(f"{name:>16} {compile_time:>12.2f} {run_time * 1000:>10.1f} {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmarks `inverse_kinematics_endeffectors`, which solves a time series of
+endeffector targets using warm starts, against solving each frame independently
+with `inverse_kinematics_endeffector` under `jax.vmap`.
+
+For a chain of two spherical joints and two endeffectors this script reports
+- the compile time
+- the throughput in frames per second
+- the fraction of converged frames
+
+Run with
+    python benchmarks/inverse_kinematics.py
+"""
+
+import time
+
+import jax
+import jax.numpy as jnp
+
+import ring
+from ring.algorithms import kinematics
+
+SEQUENCE_LENGTHS = [100, 1000]
+RANDOM_Q0_STARTS = 4
+TOL = 1e-3
+
+xml = """
+<x_xy>
+    <worldbody>
+        <body name="s1" joint="spherical">
+            <body name="s2" joint="spherical" pos="1 0 0">
+                <body name="endeffector" joint="frozen" pos="1 0 0"/>
+            </body>
+        </body>
+    </worldbody>
+</x_xy>
+"""
+ENDEFFECTORS = ["s2", "endeffector"]
+
+
+def targets(sys: ring.System, T: int) -> dict[str, ring.Transform]:
+    t = jnp.linspace(0, T / 100, T)[:, None]
+    phases = jax.random.uniform(jax.random.PRNGKey(1), (6,), maxval=2 * jnp.pi)
+    angles = jnp.sin(t + phases)
+    qs = jnp.concatenate(
+        (ring.maths.quat_euler(angles[:, :3]), ring.maths.quat_euler(angles[:, 3:])),
+        axis=-1,
+    )
+    xs = jax.vmap(lambda q: kinematics.forward_kinematics_transforms(sys, q)[0])(qs)
+    return {name: xs.take(sys.name_to_idx(name), axis=1) for name in ENDEFFECTORS}
+
+
+def warm_started(sys, endeffector_xs):
+    _, _, converged = kinematics.inverse_kinematics_endeffectors(
+        sys,
+        endeffector_xs,
+        random_q0_starts=RANDOM_Q0_STARTS,
+        key=jax.random.PRNGKey(2),
+        tol=TOL,
+    )
+    return converged
+
+
+def framewise(sys, endeffector_xs):
+    # only a single endeffector is supported
+    name = ENDEFFECTORS[-1]
+    keys = jax.random.split(jax.random.PRNGKey(2), endeffector_xs[name].shape())
+
+    def solve(x, key):
+        _, value, _ = kinematics.inverse_kinematics_endeffector(
+            sys, name, x, random_q0_starts=RANDOM_Q0_STARTS, key=key
+        )
+        return value < TOL
+
+    return jax.vmap(solve)(endeffector_xs[name], keys)
+
+
+def benchmark(fn, sys, endeffector_xs) -> tuple[float, float, float]:
+    t0 = time.time()
+    fn = jax.jit(fn).lower(sys, endeffector_xs).compile()
+    compile_time = time.time() - t0
+
+    t0 = time.time()
+    converged = jax.block_until_ready(fn(sys, endeffector_xs))
+    frames_per_second = len(converged) / (time.time() - t0)
+    return compile_time, frames_per_second, float(jnp.mean(converged))
+
+
+def main():
+    sys = ring.io.load_sys_from_str(xml)
+    print(
+        f"{'method':>12} {'T':>6} {'compile [s]':>12} {'frames/s':>10} "
+        f"{'converged':>10}"
+    )
+    for T in SEQUENCE_LENGTHS:
+        endeffector_xs = targets(sys, T)
+        for method, fn in [("warm-start", warm_started), ("framewise", framewise)]:
+            compile_time, fps, converged = benchmark(fn, sys, endeffector_xs)
+            print(
+                f"{method:>12} {T:>6} {compile_time:>12.2f} {fps:>10.1f} "
+                f"{converged:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmarks the `precision` option of `ring.RING` (mixed-precision inference with
+float32 recurrent state) on simulated IMU data of a three-segment chain.
+
+For every precision this script reports
+- the runtime of the (already compiled) forward pass
+- the mean and max deviation of the estimated orientations from the float32 network
+- the mean orientation error w.r.t. the ground truth of the non-root segments
+
+The shipped pretrained parameters are used if they are available, otherwise the
+network is randomly initialised and the ground-truth error is meaningless.
+
+Run with
+    python benchmarks/ring_precision.py
+"""
+
+from pathlib import Path
+import time
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+import ring
+
+PRECISIONS = ["float32", "bfloat16", "float16"]
+BATCHSIZE = 8
+T = 60.0
+TS = 0.01
+N_REPEATS = 5
+PARAMS = Path(ring.__file__).parent.joinpath("ml/params/0x1d76628065a71e0f.pickle")
+
+
+def simulate_data() -> tuple[jax.Array, jax.Array, list[int]]:
+    sys = ring.io.load_example("test_three_seg_seg2").replace(dt=TS)
+    gen = ring.RCMG(
+        sys,
+        ring.MotionConfig(T=T),
+        add_X_imus=True,
+        add_X_jointaxes=True,
+        add_y_relpose=True,
+        add_y_rootincl=True,
+        use_link_number_in_Xy=True,
+    ).to_lazy_gen(BATCHSIZE)
+    X, y = ring.algorithms.GeneratorTrafoExpandFlatten(gen)(jax.random.PRNGKey(1))
+    return X, y, sys.make_sys_noimu()[0].link_parents
+
+
+def make_ringnet(lam: list[int], precision: str, X: jax.Array) -> ring.ml.RING:
+    if PARAMS.is_file():
+        return ring.RING(lam, TS, precision=precision)
+    params, _ = ring.ml.RING(lam=tuple(lam)).init(X=X)
+    return ring.ml.RING(params, tuple(lam), precision=precision)
+
+
+def benchmark(ringnet, X: jax.Array) -> tuple[float, jax.Array]:
+    apply = jax.jit(lambda X: ringnet.apply(X)[0])
+    yhat = jax.block_until_ready(apply(X))
+    t0 = time.time()
+    for _ in range(N_REPEATS):
+        jax.block_until_ready(apply(X))
+    return (time.time() - t0) / N_REPEATS, yhat
+
+
+def angle_error_deg(q: jax.Array, q_ref: jax.Array) -> jax.Array:
+    return jnp.rad2deg(ring.maths.angle_error(q_ref, q))
+
+
+def main():
+    X, y, lam = simulate_data()
+    non_root = np.array(lam) != -1
+    if not PARAMS.is_file():
+        print(f"Pretrained parameters `{PARAMS.name}` not found, using random ones")
+
+    print(
+        f"{'precision':>10} {'run [ms]':>10} {'mean dev [deg]':>15} "
+        f"{'max dev [deg]':>14} {'error [deg]':>12}"
+    )
+    yhat_f32 = None
+    for precision in PRECISIONS:
+        run_time, yhat = benchmark(make_ringnet(lam, precision, X), X)
+        if yhat_f32 is None:
+            yhat_f32 = yhat
+        deviation = angle_error_deg(yhat, yhat_f32)
+        error = jnp.mean(angle_error_deg(yhat[..., non_root, :], y[..., non_root, :]))
+        print(
+            f"{precision:>10} {run_time * 1000:>10.1f} {jnp.mean(deviation):>15.3f}"
+            f" {jnp.max(deviation):>14.3f} {error:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
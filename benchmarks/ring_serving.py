@@ -0,0 +1,83 @@
+"""
+Benchmarks `ring.ml.InferenceEngine` against one `ringnet.apply` call per request
+for an increasing number of concurrent streams (subjects). Every stream sends
+windows of IMU data of a chain with a random number of bodies.
+
+For every number of streams this script reports
+- the throughput (requests per second) of sequential `apply` calls, after all
+  graphs and window lengths are compiled
+- the throughput of the engine (requests are submitted from one thread each)
+- the number of compilations of both
+
+Run with
+    python benchmarks/ring_serving.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import jax
+import numpy as np
+
+import ring
+
+N_STREAMS = [1, 4, 16, 64]
+N_BODIES = [2, 3, 4, 5, 6]
+T_WINDOWS = [100, 150, 200]
+HIDDEN_STATE_DIM = 400
+
+
+def make_requests(n_streams: int, rng) -> list[tuple[np.ndarray, tuple]]:
+    requests = []
+    for _ in range(n_streams):
+        N, T = rng.choice(N_BODIES), rng.choice(T_WINDOWS)
+        lam = tuple(range(-1, N - 1))
+        requests.append((rng.normal(size=(T, N, 9)).astype(np.float32), lam))
+    return requests
+
+
+def timeit(fn) -> float:
+    # the first call compiles all shapes
+    fn()
+    t0 = time.time()
+    fn()
+    return time.time() - t0
+
+
+def main():
+    rng = np.random.default_rng(1)
+    X0 = np.zeros((1, 2, 9), dtype=np.float32)
+    params, _ = ring.ml.RING(lam=(-1, 0), hidden_state_dim=HIDDEN_STATE_DIM).init(X=X0)
+    ringnet = ring.ml.base.ScaleX_FilterWrapper(
+        ring.ml.RING(params, hidden_state_dim=HIDDEN_STATE_DIM)
+    )
+    apply = jax.jit(lambda X, lam: ringnet.apply(X, lam=lam)[0], static_argnums=1)
+    engine = ring.ml.InferenceEngine(ringnet)
+
+    print(
+        f"{'streams':>8} {'apply [req/s]':>14} {'engine [req/s]':>15} "
+        f"{'apply compiles':>15} {'engine compiles':>16}"
+    )
+    for n_streams in N_STREAMS:
+        requests = make_requests(n_streams, rng)
+
+        def run_apply():
+            for X, lam in requests:
+                jax.block_until_ready(apply(X, lam))
+
+        def run_engine():
+            with engine, ThreadPoolExecutor(n_streams) as pool:
+                futures = list(pool.map(lambda r: engine.submit(*r), requests))
+                [future.result() for future in futures]
+
+        apply_throughput = n_streams / timeit(run_apply)
+        engine_throughput = n_streams / timeit(run_engine)
+
+        print(
+            f"{n_streams:>8} {apply_throughput:>14.1f} {engine_throughput:>15.1f} "
+            f"{apply._cache_size():>15} {engine._apply._cache_size():>16}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmarks online inference with `ringnet.step` (one timestep per call, causal
+low-pass filter) for chains with an increasing number of bodies.
+
+For every chain this script reports
+- the compile time of the first two calls of `step`
+- the median, 99th percentile and maximum latency of one `step`
+- the runtime per timestep of `ringnet.apply` over the whole sequence
+
+The shipped pretrained parameters are used if they are available, otherwise the
+network is randomly initialised (the latency is identical).
+
+Run with
+    python benchmarks/ring_streaming.py
+"""
+
+from pathlib import Path
+import time
+
+import jax
+import numpy as np
+
+import ring
+
+N_BODIES = [3, 5, 10]
+T = 1000
+TS = 0.01
+PARAMS = Path(ring.__file__).parent.joinpath("ml/params/0x1d76628065a71e0f.pickle")
+
+
+def make_ringnet(lam: tuple[int, ...], X: np.ndarray) -> ring.ml.AbstractFilter:
+    if PARAMS.is_file():
+        return ring.RING(lam, TS, lpf_filtfilt=False)
+
+    params, _ = ring.ml.RING(lam=lam).init(X=X)
+    ringnet = ring.ml.base.ScaleX_FilterWrapper(ring.ml.RING(params, lam))
+    ringnet = ring.ml.base.LPF_FilterWrapper(
+        ringnet, ring.ml._LPF_CUTOFF_FREQ, 1 / TS, filtfilt=False
+    )
+    return ring.ml.base.GroundTruthHeading_FilterWrapper(ringnet)
+
+
+def benchmark(n_bodies: int) -> tuple[float, np.ndarray, float]:
+    lam = tuple(range(-1, n_bodies - 1))
+    X = np.random.default_rng(1).normal(size=(T, n_bodies, 9)).astype(np.float32)
+    ringnet = make_ringnet(lam, X)
+
+    # compiles for the initial and for the returned state
+    t0 = time.time()
+    _, state = ringnet.step(X[0])
+    jax.block_until_ready(ringnet.step(X[1], state=state))
+    compile_time = time.time() - t0
+
+    latencies = []
+    _, state = ringnet.step(X[0])
+    for t in range(1, T):
+        t0 = time.perf_counter()
+        yhat, state = ringnet.step(X[t], state=state)
+        jax.block_until_ready(yhat)
+        latencies.append(time.perf_counter() - t0)
+
+    apply = jax.jit(lambda X: ringnet.apply(X)[0])
+    jax.block_until_ready(apply(X))
+    t0 = time.time()
+    jax.block_until_ready(apply(X))
+    apply_time = (time.time() - t0) / T
+
+    return compile_time, np.array(latencies), apply_time
+
+
+def main():
+    print(
+        f"{'N':>4} {'compile [s]':>12} {'p50 [ms]':>9} {'p99 [ms]':>9} "
+        f"{'max [ms]':>9} {'apply/T [ms]':>13}"
+    )
+    for n_bodies in N_BODIES:
+        compile_time, latencies, apply_time = benchmark(n_bodies)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(
+            f"{n_bodies:>4} {compile_time:>12.2f} {p50:>9.3f} {p99:>9.3f} "
+            f"{latencies.max() * 1000:>9.3f} {apply_time * 1000:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
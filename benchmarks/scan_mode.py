@@ -0,0 +1,97 @@
+"""
+Benchmarks the `sequential` against the `levels` scan mode of `ring.System`.
+
+For a chain and for a branched tree (every link has two children) with an increasing
+number of links this script reports
+- the compile time of `jax.jit(ring.step)`
+- the runtime of one (already compiled) step
+
+Run with
+    python benchmarks/scan_mode.py
+"""
+
+import time
+
+import jax
+import jax.numpy as jnp
+
+import ring
+
+N_LINKS = [5, 10, 20, 50]
+SCAN_MODES = ["sequential", "levels"]
+N_REPEATS = 100
+JOINT_TYPES = ["rx", "ry", "rz"]
+
+
+def _body(i: int, children: str) -> str:
+    joint = JOINT_TYPES[i % len(JOINT_TYPES)]
+    return (
+        f'<body name="seg{i}" pos="0.1 0 0" joint="{joint}">'
+        '<geom type="box" mass="1" pos="0.05 0 0" dim="0.1 0.05 0.05"/>'
+        f"{children}</body>"
+    )
+
+
+def chain_xml(n_links: int) -> str:
+    bodies = ""
+    for i in reversed(range(1, n_links)):
+        bodies = _body(i, bodies)
+    return _sys_xml(_body(0, bodies).replace('joint="rx"', 'joint="free"', 1))
+
+
+def tree_xml(n_links: int) -> str:
+    def subtree(i: int) -> str:
+        if i >= n_links:
+            return ""
+        return _body(i, subtree(2 * i + 1) + subtree(2 * i + 2))
+
+    return _sys_xml(subtree(0).replace('joint="rx"', 'joint="free"', 1))
+
+
+def _sys_xml(bodies: str) -> str:
+    return f"""
+<x_xy>
+    <options gravity="0 0 9.81" dt="0.01"/>
+    <worldbody>
+        {bodies}
+    </worldbody>
+</x_xy>
+"""
+
+
+def benchmark(sys: ring.System) -> tuple[float, float]:
+    state = ring.State.create(sys)
+    taus = jnp.zeros((sys.qd_size(),))
+
+    t0 = time.time()
+    step = jax.jit(ring.step).lower(sys, state, taus).compile()
+    compile_time = time.time() - t0
+
+    jax.block_until_ready(step(sys, state, taus))
+    t0 = time.time()
+    for _ in range(N_REPEATS):
+        state = step(sys, state, taus)
+    jax.block_until_ready(state)
+    step_time = (time.time() - t0) / N_REPEATS
+
+    return compile_time, step_time
+
+
+def main():
+    print(
+        f"{'topology':>10} {'n_links':>8} {'mode':>12} {'compile [s]':>12} "
+        f"{'step [ms]':>10}"
+    )
+    for topology, xml_fn in [("chain", chain_xml), ("tree", tree_xml)]:
+        for n_links in N_LINKS:
+            sys = ring.System.create(xml_fn(n_links))
+            for scan_mode in SCAN_MODES:
+                compile_time, step_time = benchmark(sys.replace(scan_mode=scan_mode))
+                print(
+                    f"{topology:>10} {n_links:>8} {scan_mode:>12} "
+                    f"{compile_time:>12.2f} {step_time * 1000:>10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
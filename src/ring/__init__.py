@@ -26,6 +26,11 @@ def RING(lam: list[int] | None, Ts: float | None, **kwargs) -> ml.AbstractFilter
     Params:
         lam: parent array, if `None` must be given via `ringnet.apply(..., lam=lam)`
         Ts : sampling interval of IMU data; time delta in seconds
+        precision: `float32` (default), `bfloat16` or `float16`. Runs the RNN cells
+            and MLPs with parameters and activations in this precision, the
+            recurrent state stays in float32. See `benchmarks/ring_precision.py`.
+        lpf_filtfilt: If `False`, the low-pass filter of the output is causal which
+            is required for online inference with `ringnet.step`.
 
     Returns:
         ring.ml.AbstractFilter: An instantiation of `ring.ml.ringnet.RING` with trained
@@ -69,6 +74,12 @@ def RING(lam: list[int] | None, Ts: float | None, **kwargs) -> ml.AbstractFilter
         >>> initial_state = None
         >>> yhat, state = ringnet.apply(X, state=initial_state)
         >>> # state: final hidden state, shape = (B, N, 2*H)
+        >>>
+        >>> # online inference, one timestep at a time
+        >>> ringnet = ring.RING(lam, Ts, lpf_filtfilt=False)
+        >>> state = None
+        >>> for t in range(T_i):
+        >>>     yhat_t, state = ringnet.step(X[:, t], state=state)
     """
     from pathlib import Path
     import warnings
@@ -77,6 +88,8 @@ def RING(lam: list[int] | None, Ts: float | None, **kwargs) -> ml.AbstractFilter
         use_100Hz_RING=True,
         use_lpf=True,
         lpf_cutoff_freq=ml._LPF_CUTOFF_FREQ,
+        precision="float32",
+        lpf_filtfilt=True,
     )
     config.update(kwargs)
 
@@ -98,7 +111,11 @@ def RING(lam: list[int] | None, Ts: float | None, **kwargs) -> ml.AbstractFilter
         add_Ts = True
 
     ringnet = ml.RING(
-        params=params, lam=None if lam is None else tuple(lam), jit=False, name="RING"
+        params=params,
+        lam=None if lam is None else tuple(lam),
+        jit=False,
+        name="RING",
+        precision=config["precision"],
     )
     ringnet = ml.base.ScaleX_FilterWrapper(ringnet)
     if config["use_lpf"]:
@@ -106,6 +123,7 @@ def RING(lam: list[int] | None, Ts: float | None, **kwargs) -> ml.AbstractFilter
             ringnet,
             config["lpf_cutoff_freq"],
             samp_freq=None if Ts is None else 1 / Ts,
+            filtfilt=config["lpf_filtfilt"],
             quiet=True,
         )
     ringnet = ml.base.GroundTruthHeading_FilterWrapper(ringnet)
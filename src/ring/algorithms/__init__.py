@@ -9,6 +9,7 @@ from ._random import random_position_over_time
 from .dynamics import compute_mass_matrix
 from .dynamics import forward_dynamics
 from .dynamics import inverse_dynamics
+from .dynamics import register_integration_method
 from .dynamics import step
 from .generator import FINALIZE_FN
 from .generator import Generator
@@ -23,10 +24,13 @@ from .jcalc import join_motionconfigs
 from .jcalc import JointModel
 from .jcalc import MotionConfig
 from .jcalc import register_new_joint_type
+from .jcalc import stack_motionconfigs
 from .kinematics import forward_kinematics
 from .kinematics import forward_kinematics_transforms
 from .kinematics import inverse_kinematics
 from .kinematics import inverse_kinematics_endeffector
+from .kinematics import inverse_kinematics_endeffectors
+from .kinematics import inverse_kinematics_xs
 from .sensors import accelerometer
 from .sensors import add_noise_bias
 from .sensors import gyroscope
@@ -1,3 +1,4 @@
+import math
 from typing import Callable, Optional
 import warnings
 
@@ -38,7 +39,92 @@ def random_angle_over_time(
     cdf_bins_min: int = 5,
     cdf_bins_max: Optional[int] = None,
     interpolation_method: str = "cosine",
+    vectorized: bool = False,
 ) -> jax.Array:
+    """Random angle trajectory. The knots of the trajectory are sampled in a loop.
+    With `vectorized`, they are instead sampled all at once (see `_draw_knots`),
+    which draws the candidates of only as many knots as are required to cover `T`
+    and a few extra blocks of knots otherwise. The vectorized sampler requires that the
+    time-dependent parameters are floats, otherwise the loop is used."""
+    if vectorized and not _any_callable(
+        dang_min, dang_max, delta_ang_min, delta_ang_max, t_max
+    ):
+        key_ang, consume = random.split(key_ang)
+        ANG = _angle_knots_vectorized(
+            key_t,
+            key_ang,
+            ANG_0,
+            dang_min,
+            dang_max,
+            delta_ang_min,
+            delta_ang_max,
+            t_min,
+            t_max,
+            T,
+            Ts,
+            max_iter,
+            range_of_motion,
+            range_of_motion_method,
+        )
+    else:
+        ANG, consume = _angle_knots_loop(
+            key_t,
+            key_ang,
+            ANG_0,
+            dang_min,
+            dang_max,
+            delta_ang_min,
+            delta_ang_max,
+            t_min,
+            t_max,
+            T,
+            Ts,
+            max_iter,
+            range_of_motion,
+            range_of_motion_method,
+        )
+
+    # resample
+    if N is None:
+        t = jnp.arange(T, step=Ts)
+    else:
+        t = jnp.arange(N) * Ts
+    if randomized_interpolation:
+        q = interpolate(cdf_bins_min, cdf_bins_max, method=interpolation_method)(
+            t, ANG[:, 0], ANG[:, 1], consume
+        )
+    else:
+        if interpolation_method != "cosine":
+            warnings.warn(
+                f"You have select interpolation method {interpolation_method}. "
+                "Differnt choices of interpolation method are only available if "
+                "`randomized_interpolation` is set."
+            )
+        q = cosInterpolate(t, ANG[:, 0], ANG[:, 1])
+
+    # if range_of_motion is true, then it is wrapped already
+    if not range_of_motion:
+        q = maths.wrap_to_pi(q)
+
+    return q
+
+
+def _angle_knots_loop(
+    key_t,
+    key_ang,
+    ANG_0,
+    dang_min,
+    dang_max,
+    delta_ang_min,
+    delta_ang_max,
+    t_min,
+    t_max,
+    T,
+    Ts,
+    max_iter,
+    range_of_motion,
+    range_of_motion_method,
+):
     def body_fn_outer(val):
         i, t, phi, key_t, key_ang, ANG = val
 
@@ -83,30 +169,7 @@ def random_angle_over_time(
         ANG,
         jax.lax.dynamic_index_in_dim(ANG, end - 1),
     )
-
-    # resample
-    if N is None:
-        t = jnp.arange(T, step=Ts)
-    else:
-        t = jnp.arange(N) * Ts
-    if randomized_interpolation:
-        q = interpolate(cdf_bins_min, cdf_bins_max, method=interpolation_method)(
-            t, ANG[:, 0], ANG[:, 1], consume
-        )
-    else:
-        if interpolation_method != "cosine":
-            warnings.warn(
-                f"You have select interpolation method {interpolation_method}. "
-                "Differnt choices of interpolation method are only available if "
-                "`randomized_interpolation` is set."
-            )
-        q = cosInterpolate(t, ANG[:, 0], ANG[:, 1])
-
-    # if range_of_motion is true, then it is wrapped already
-    if not range_of_motion:
-        q = maths.wrap_to_pi(q)
-
-    return q
+    return ANG, consume
 
 
 # APPROVED
@@ -127,7 +190,65 @@ def random_position_over_time(
     cdf_bins_min: int = 5,
     cdf_bins_max: Optional[int] = None,
     interpolation_method: str = "cosine",
+    vectorized: bool = False,
 ) -> jax.Array:
+    "Random position trajectory, see `random_angle_over_time` for `vectorized`."
+    if vectorized and not _any_callable(pos_min, pos_max, dpos_min, dpos_max, t_max):
+        key, consume = random.split(key)
+        POS = _position_knots_vectorized(
+            key,
+            POS_0,
+            pos_min,
+            pos_max,
+            dpos_min,
+            dpos_max,
+            t_min,
+            t_max,
+            T,
+            Ts,
+            max_it,
+        )
+    else:
+        POS, consume = _position_knots_loop(
+            key,
+            POS_0,
+            pos_min,
+            pos_max,
+            dpos_min,
+            dpos_max,
+            t_min,
+            t_max,
+            T,
+            Ts,
+            max_it,
+        )
+
+    # resample
+    if N is None:
+        t = jnp.arange(T, step=Ts)
+    else:
+        t = jnp.arange(N) * Ts
+    if randomized_interpolation:
+        r = interpolate(cdf_bins_min, cdf_bins_max, method=interpolation_method)(
+            t, POS[:, 0], POS[:, 1], consume
+        )
+    else:
+        # TODO
+        # Don't warn for position trajectories, i don't care about them as much
+        if False:
+            if interpolation_method != "cosine":
+                warnings.warn(
+                    f"You have select interpolation method {interpolation_method}. "
+                    "Differnt choices of interpolation method are only available if "
+                    "`randomized_interpolation` is set."
+                )
+        r = cosInterpolate(t, POS[:, 0], POS[:, 1])
+    return r
+
+
+def _position_knots_loop(
+    key, POS_0, pos_min, pos_max, dpos_min, dpos_max, t_min, t_max, T, Ts, max_it
+):
     def body_fn_inner(val):
         i, t, t_pre, x, x_pre, key = val
         dt = t - t_pre
@@ -206,28 +327,7 @@ def random_position_over_time(
         POS,
         jax.lax.dynamic_index_in_dim(POS, end - 1),
     )
-
-    # resample
-    if N is None:
-        t = jnp.arange(T, step=Ts)
-    else:
-        t = jnp.arange(N) * Ts
-    if randomized_interpolation:
-        r = interpolate(cdf_bins_min, cdf_bins_max, method=interpolation_method)(
-            t, POS[:, 0], POS[:, 1], consume
-        )
-    else:
-        # TODO
-        # Don't warn for position trajectories, i don't care about them as much
-        if False:
-            if interpolation_method != "cosine":
-                warnings.warn(
-                    f"You have select interpolation method {interpolation_method}. "
-                    "Differnt choices of interpolation method are only available if "
-                    "`randomized_interpolation` is set."
-                )
-        r = cosInterpolate(t, POS[:, 0], POS[:, 1])
-    return r
+    return POS, consume
 
 
 _PREALLOCATION_WARN_LIMIT = 6000
@@ -248,6 +348,71 @@ def _clip_to_pi(phi):
     return jnp.clip(phi, -jnp.pi, jnp.pi)
 
 
+def _sign_prob(prev_phi, range_of_motion_method):
+    "Probability that the next angle is larger than `prev_phi`."
+    if range_of_motion_method == "coinflip":
+        return 0.5
+    elif range_of_motion_method == "uniform":
+        return 0.5 * (1 - prev_phi / jnp.pi)
+    elif range_of_motion_method[:7] == "sigmoid":
+        scale = 1.5
+        provided_params = range_of_motion_method.split("-")
+        if len(provided_params) == 2:
+            scale = float(provided_params[-1])
+        hardcut = jnp.pi - 0.01
+        return jnp.where(
+            prev_phi > hardcut,
+            0.0,
+            jnp.where(prev_phi < -hardcut, 1.0, jax.nn.sigmoid(-scale * prev_phi)),
+        )
+    else:
+        raise NotImplementedError
+
+
+def _next_phi(
+    key,
+    dt,
+    prev_phi,
+    range_of_motion,
+    range_of_motion_method,
+    dang_min,
+    dang_max,
+):
+    key, consume = random.split(key)
+
+    if range_of_motion:
+        p = _sign_prob(prev_phi, range_of_motion_method)
+        probs = jnp.array([p, (1 - p)])
+
+        sign = random.choice(consume, jnp.array([1.0, -1.0]), p=probs)
+        lower = _clip_to_pi(prev_phi + sign * dang_min * dt)
+        upper = _clip_to_pi(prev_phi + sign * dang_max * dt)
+
+        # swap if lower > upper
+        lower, upper = jnp.sort(jnp.hstack((lower, upper)))
+
+        key, consume = random.split(key)
+        return random.uniform(consume, minval=lower, maxval=upper)
+
+    else:
+        dphi = random.uniform(consume, minval=dang_min, maxval=dang_max) * dt
+        key, consume = random.split(key)
+        sign = random.choice(consume, jnp.array([1.0, -1.0]))
+        return prev_phi + sign * dphi
+
+
+def _phi_is_valid(
+    prev_phi, next_phi, dt, dang_min, dang_max, delta_ang_min, delta_ang_max
+):
+    delta_phi = jnp.abs(next_phi - prev_phi)
+    # delta_ang is in bounds
+    cond_delta_ang = (delta_phi >= delta_ang_min) & (delta_phi <= delta_ang_max)
+    # dang is in bounds
+    dang = delta_phi / dt
+    cond_dang = (dang >= dang_min) & (dang <= dang_max)
+    return jnp.logical_and(cond_delta_ang, cond_dang)
+
+
 def _resolve_range_of_motion(
     range_of_motion,
     range_of_motion_method,
@@ -262,48 +427,6 @@ def _resolve_range_of_motion(
     key_ang,
     max_iter,
 ):
-    def _next_phi(key, dt):
-        key, consume = random.split(key)
-
-        if range_of_motion:
-            if range_of_motion_method == "coinflip":
-                probs = jnp.array([0.5, 0.5])
-            elif range_of_motion_method == "uniform":
-                p = 0.5 * (1 - prev_phi / jnp.pi)
-                probs = jnp.array([p, (1 - p)])
-            elif range_of_motion_method[:7] == "sigmoid":
-                scale = 1.5
-                provided_params = range_of_motion_method.split("-")
-                if len(provided_params) == 2:
-                    scale = float(provided_params[-1])
-                hardcut = jnp.pi - 0.01
-                p = jnp.where(
-                    prev_phi > hardcut,
-                    0.0,
-                    jnp.where(
-                        prev_phi < -hardcut, 1.0, jax.nn.sigmoid(-scale * prev_phi)
-                    ),
-                )
-                probs = jnp.array([p, (1 - p)])
-            else:
-                raise NotImplementedError
-
-            sign = random.choice(consume, jnp.array([1.0, -1.0]), p=probs)
-            lower = _clip_to_pi(prev_phi + sign * dang_min * dt)
-            upper = _clip_to_pi(prev_phi + sign * dang_max * dt)
-
-            # swap if lower > upper
-            lower, upper = jnp.sort(jnp.hstack((lower, upper)))
-
-            key, consume = random.split(key)
-            return random.uniform(consume, minval=lower, maxval=upper)
-
-        else:
-            dphi = random.uniform(consume, minval=dang_min, maxval=dang_max) * dt
-            key, consume = random.split(key)
-            sign = random.choice(consume, jnp.array([1.0, -1.0]))
-            return prev_phi + sign * dphi
-
     def body_fn(val):
         key_t, key_ang, _, _, i = val
 
@@ -311,20 +434,23 @@ def _resolve_range_of_motion(
         dt = jax.random.uniform(consume_t, minval=t_min, maxval=t_max)
 
         key_ang, consume_ang = jax.random.split(key_ang)
-        next_phi = _next_phi(consume_ang, dt)
+        next_phi = _next_phi(
+            consume_ang,
+            dt,
+            prev_phi,
+            range_of_motion,
+            range_of_motion_method,
+            dang_min,
+            dang_max,
+        )
 
         return key_t, key_ang, dt, next_phi, i + 1
 
     def cond_fn(val):
         *_, dt, next_phi, i = val
-        delta_phi = jnp.abs(next_phi - prev_phi)
-        # delta_ang is in bounds
-        cond_delta_ang = (delta_phi >= delta_ang_min) & (delta_phi <= delta_ang_max)
-        # dang is in bounds
-        dang = delta_phi / dt
-        cond_dang = (dang >= dang_min) & (dang <= dang_max)
-
-        break_if_true1 = jnp.logical_and(cond_delta_ang, cond_dang)
+        break_if_true1 = _phi_is_valid(
+            prev_phi, next_phi, dt, dang_min, dang_max, delta_ang_min, delta_ang_max
+        )
         # break out of loop
         break_if_true2 = i > max_iter
         return (i == 0) | (jnp.logical_not(break_if_true1 | break_if_true2))
@@ -334,6 +460,194 @@ def _resolve_range_of_motion(
     return dt, next_phi
 
 
+# number of times that all knots are redrawn if they do not cover `T`
+_MAX_REDRAWS = 3
+# number of blocks of knots that continue the knots if they still do not cover `T`
+_MAX_EXTRA_BLOCKS = 4
+
+
+def _any_callable(*scalars) -> bool:
+    return any(isinstance(scalar, Callable) for scalar in scalars)
+
+
+def _n_knots(t_min: float, t_max: float, T: float) -> int:
+    """Number of knots such that the sum of the `n_knots - 1` intervals, uniformly
+    distributed in [`t_min`, `t_max`], exceeds `T` except for a six sigma event."""
+    mean, std = (t_min + t_max) / 2, (t_max - t_min) / math.sqrt(12)
+    # solve n * mean - 6 * sqrt(n) * std = T for sqrt(n)
+    sqrt_n = (6 * std + math.sqrt(36 * std**2 + 4 * mean * T)) / (2 * mean)
+    return min(math.ceil(sqrt_n**2) + 1, int(T // t_min) + 1)
+
+
+def _draw_knots(
+    draw: Callable, keys: list, x_0, T: float, Ts, n_knots: int, x_start=None
+) -> jax.Array:
+    """Draws `n_knots` knots at once with `draw(x_start, n, *keys) -> (dts, xs)`,
+    which draws `n` intervals `dts` and values `xs` that continue from the value
+    `x_start` (defaults to `x_0`). The knot times are the cumulative sum of the
+    intervals. Only in the rare case that the knots do not cover `T`, they are
+    redrawn, and if they still do not cover `T` up to `_MAX_EXTRA_BLOCKS` blocks
+    of `ceil(sqrt(n_knots))` knots are drawn that continue from the last knot.
+    Returns an array of shape (`n_knots + _MAX_EXTRA_BLOCKS * n_block`, 2) like
+    the loop samplers, i.e. all knots after the first one beyond `T` are equal to
+    it, and if even the extra blocks do not cover `T` the last knot is kept."""
+    x_start = x_0 if x_start is None else x_start
+    n_block = math.ceil(math.sqrt(n_knots))
+    n_extra = _MAX_EXTRA_BLOCKS * n_block
+
+    def cond_fn(val):
+        i, t, _ = val
+        return (i == 0) | ((t[-1] <= T) & (i <= _MAX_REDRAWS))
+
+    def body_fn(val):
+        i, *_ = val
+        keys_i = [random.fold_in(key, i) for key in keys]
+        dts, xs = draw(x_start, n_knots - 1, *keys_i)
+        return i + 1, jnp.cumsum(dts), xs
+
+    # only to infer the shapes, `draw` is traced once
+    init_val = jax.tree_map(
+        lambda x: jnp.zeros(x.shape, x.dtype),
+        jax.eval_shape(body_fn, (0, None, None)),
+    )
+    _, t, xs = jax.lax.while_loop(cond_fn, body_fn, init_val)
+
+    # the extra blocks are initialised with the last knot, so that `t[-1]` is
+    # always the time of the last drawn knot
+    t = jnp.concatenate((t, jnp.repeat(t[-1:], n_extra)))
+    xs = jnp.concatenate((xs, jnp.repeat(xs[-1:], n_extra)))
+
+    def cond_fn_extra(val):
+        j, t, _ = val
+        return (t[-1] <= T) & (j < _MAX_EXTRA_BLOCKS)
+
+    def body_fn_extra(val):
+        j, t, xs = val
+        start = n_knots - 1 + j * n_block
+        keys_j = [random.fold_in(key, _MAX_REDRAWS + 1 + j) for key in keys]
+        dts, xs_j = draw(xs[start - 1], n_block, *keys_j)
+        t_j = t[start - 1] + jnp.cumsum(dts)
+        later = jnp.arange(len(t)) >= start + n_block
+        t = jnp.where(later, t_j[-1], jax.lax.dynamic_update_slice(t, t_j, (start,)))
+        xs = jnp.where(
+            later, xs_j[-1], jax.lax.dynamic_update_slice(xs, xs_j, (start,))
+        )
+        return j + 1, t, xs
+
+    _, t, xs = jax.lax.while_loop(cond_fn_extra, body_fn_extra, (0, t, xs))
+
+    t = jnp.concatenate((jnp.zeros((1,)), t))
+    knots = jnp.stack((jnp.floor(t / Ts) * Ts, jnp.concatenate((x_0[None], xs))), 1)
+    end = jnp.minimum(jnp.argmax(jnp.append(t > T, True)), len(t) - 1)
+    return jnp.where((jnp.arange(len(t)) <= end)[:, None], knots, knots[end])
+
+
+def _angle_knots_vectorized(
+    key_t,
+    key_ang,
+    ANG_0,
+    dang_min,
+    dang_max,
+    delta_ang_min,
+    delta_ang_max,
+    t_min,
+    t_max,
+    T,
+    Ts,
+    max_iter,
+    range_of_motion,
+    range_of_motion_method,
+):
+    ANG_0 = jnp.asarray(ANG_0, dtype=float)
+
+    # the accepted intervals are also bounded from above by the conditions on the
+    # angles, but not from below, since if no candidate is accepted the last one
+    # is used whose interval can be as short as `t_min`
+    t_max_eff = t_max
+    if dang_min > 0:
+        t_max_eff = min(t_max, max(delta_ang_max / dang_min, t_min))
+    n_knots = _n_knots(t_min, t_max_eff, T)
+
+    def first_valid(prev_phi, phis, dts):
+        # like `_resolve_range_of_motion`, the first valid of all `max_iter + 1`
+        # candidates, otherwise the last one
+        valid = _phi_is_valid(
+            prev_phi, phis, dts, dang_min, dang_max, delta_ang_min, delta_ang_max
+        )
+        i = jnp.argmax(valid.at[-1].set(True))
+        return dts[i], phis[i]
+
+    def draw(prev_phi, n, key_t, key_ang):
+        # all candidates of all `n` knots are drawn at once
+        shape = (n, max_iter + 1)
+        dts = random.uniform(key_t, shape, minval=t_min, maxval=t_max)
+        consume_sign, consume_mag = random.split(key_ang)
+        u_sign, u_mag = random.uniform(consume_sign, shape), random.uniform(
+            consume_mag, shape
+        )
+
+        if range_of_motion:
+            # the direction depends on the previous angle, so the knots are
+            # resolved sequentially
+
+            def step(prev_phi, val):
+                dts, u_sign, u_mag = val
+                p = _sign_prob(prev_phi, range_of_motion_method)
+                sign = jnp.where(u_sign < p, 1.0, -1.0)
+                lower = _clip_to_pi(prev_phi + sign * dang_min * dts)
+                upper = _clip_to_pi(prev_phi + sign * dang_max * dts)
+                dt, phi = first_valid(prev_phi, lower + u_mag * (upper - lower), dts)
+                return phi, (dt, phi)
+
+            _, (dts, phis) = jax.lax.scan(step, prev_phi, (dts, u_sign, u_mag))
+        else:
+            # the increments are independent of the previous angle
+            sign = jnp.where(u_sign < 0.5, 1.0, -1.0)
+            dphis = sign * (dang_min + u_mag * (dang_max - dang_min)) * dts
+            dts, dphis = jax.vmap(first_valid, (None, 0, 0))(0.0, dphis, dts)
+            phis = prev_phi + jnp.cumsum(dphis)
+        return dts, phis
+
+    return _draw_knots(draw, [key_t, key_ang], ANG_0, T, Ts, n_knots)
+
+
+def _position_knots_vectorized(
+    key, POS_0, pos_min, pos_max, dpos_min, dpos_max, t_min, t_max, T, Ts, max_it
+):
+    n_knots = _n_knots(t_min, t_max, T)
+
+    def draw(x_start, n, key):
+        key_t, consume_sign, consume_mag = random.split(key, 3)
+        dts = random.uniform(key_t, (n,), minval=t_min, maxval=t_max)
+        # all `max_it + 1` candidates of all `n` knots are drawn at once
+        shape = (n, max_it + 1)
+        sign = jnp.where(random.uniform(consume_sign, shape) < 0.5, 1.0, -1.0)
+        dpos = sign * random.uniform(
+            consume_mag, shape, minval=dpos_min, maxval=dpos_max
+        )
+
+        def step(x_pre, val):
+            # like the inner loop of `_position_knots_loop`, the first valid
+            # candidate, otherwise the position remains
+            dt, dpos = val
+            x = x_pre + dpos * dt
+            valid = (
+                (jnp.abs(dpos) < dpos_max)
+                & (jnp.abs(dpos) > dpos_min)
+                & (x >= pos_min)
+                & (x <= pos_max)
+            )
+            x = jnp.where(jnp.any(valid), x[jnp.argmax(valid)], x_pre)
+            return x, x
+
+        _, xs = jax.lax.scan(step, x_start, (dts, dpos))
+        return dts, xs
+
+    # like the loop, starts from zero and not from `POS_0`
+    POS_0 = jnp.asarray(POS_0, dtype=float)
+    return _draw_knots(draw, [key], POS_0, T, Ts, n_knots, jnp.zeros(()))
+
+
 def cosInterpolate(x, xp, fp):
     i = jnp.clip(jnp.searchsorted(xp, x, side="right"), 1, len(xp) - 1)
     dx = xp[i] - xp[i - 1]
@@ -6,6 +6,7 @@ import jax.numpy as jnp
 import ring
 from ring import maths
 from ring.algorithms.jcalc import _draw_rxyz
+from ring.algorithms.jcalc import _inv_kin_angles_two_axes
 from ring.algorithms.jcalc import _p_control_term_rxyz
 from ring.algorithms.jcalc import _qd_from_q_cartesian
 
@@ -42,12 +43,18 @@ def register_rr_imp_joint(
 
         return _motion_fn
 
+    def _inv_kin_rr_imp(x, params):
+        # exact if the primary and the residual axis are orthogonal, as they are
+        # drawn by `_draw_random_joint_axes`
+        return _inv_kin_angles_two_axes(x.rot, params["joint_axes"], params["residual"])
+
     rr_imp_joint = ring.JointModel(
         _rr_imp_transform,
         motion=[_motion_fn_factory("joint_axes"), _motion_fn_factory("residual")],
         rcmg_draw_fn=_draw_rr_imp,
         p_control_term=_p_control_term_rxyz,
         qd_from_q=_qd_from_q_cartesian,
+        inv_kin=_inv_kin_rr_imp,
         init_joint_params=_draw_random_joint_axes,
     )
     ring.register_new_joint_type(
@@ -2,6 +2,7 @@ import jax.numpy as jnp
 import ring
 from ring import maths
 from ring.algorithms.jcalc import _draw_rxyz
+from ring.algorithms.jcalc import _inv_kin_angle_axis
 from ring.algorithms.jcalc import _p_control_term_rxyz
 from ring.algorithms.jcalc import _qd_from_q_cartesian
 
@@ -17,12 +18,16 @@ def register_rr_joint():
         axis = params["joint_axes"]
         return ring.base.Motion.create(ang=axis)
 
+    def _inv_kin_rr(x, params):
+        return _inv_kin_angle_axis(x.rot, params["joint_axes"])[None]
+
     rr_joint = ring.JointModel(
         _rr_transform,
         motion=[_motion_fn],
         rcmg_draw_fn=_draw_rxyz,
         p_control_term=_p_control_term_rxyz,
         qd_from_q=_qd_from_q_cartesian,
+        inv_kin=_inv_kin_rr,
         init_joint_params=_draw_random_joint_axis,
     )
 
@@ -213,6 +213,12 @@ def register_suntay(sconfig: SuntayConfig, name: str = "suntay"):
 
         return ring.Transform.create(pos=H, rot=q_fem_tib)
 
+    def _inv_kin_suntay(x, params):
+        # the flexion angle alpha can be read off the rotation matrix, eq (26),
+        # because sin(beta) > 0 for small adduction angles
+        R_T = maths.quat_to_3x3(x.rot)
+        return jnp.arctan2(R_T[2, 1], R_T[2, 2])[None]
+
     def _init_joint_params_suntay(key):
         params = dict()
         for params_name, draw_fn_pair in draw_fn_pairs.items():
@@ -260,6 +266,7 @@ def register_suntay(sconfig: SuntayConfig, name: str = "suntay"):
             mconfig.cdf_bins_min,
             mconfig.cdf_bins_max,
             mconfig.interpolation_method,
+            mconfig.vectorized_sampling,
         )
         return _apply_rom(qs_flexion)
 
@@ -284,7 +291,7 @@ def register_suntay(sconfig: SuntayConfig, name: str = "suntay"):
         p_control_term=jcalc._p_control_term_rxyz,
         qd_from_q=jcalc._qd_from_q_cartesian,
         coordinate_vector_to_q=coordinate_vector_to_q_suntay,
-        inv_kin=None,
+        inv_kin=_inv_kin_suntay,
         init_joint_params=_init_joint_params_suntay,
         utilities=dict(
             Q_S_H_alpha_beta_gamma=_utils_Q_S_H_alpha_beta_gamma,
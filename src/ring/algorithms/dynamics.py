@@ -1,12 +1,14 @@
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 import warnings
 
 import jax
 import jax.numpy as jnp
+import numpy as np
 
 from ring import algebra
 from ring import base
 from ring import maths
+from ring import spatial
 from ring.algorithms import jcalc
 from ring.algorithms import kinematics
 
@@ -15,6 +17,9 @@ def inverse_dynamics(sys: base.System, qd: jax.Array, qdd: jax.Array) -> jax.Arr
     """Performs inverse dynamics in the system. Calculates "tau".
     NOTE: Expects `sys` to have updated `transform` and `inertia`.
     """
+    if sys.scan_mode == "levels":
+        return _inverse_dynamics_levels(sys, qd, qdd)
+
     gravity = base.Motion.create(vel=sys.gravity)
 
     vel, acc, fs = {}, {}, {}
@@ -75,9 +80,57 @@ def inverse_dynamics(sys: base.System, qd: jax.Array, qdd: jax.Array) -> jax.Arr
     return jnp.concatenate(taus)
 
 
+def _inverse_dynamics_levels(
+    sys: base.System, qd: jax.Array, qdd: jax.Array
+) -> jax.Array:
+    gravity = base.Motion.create(vel=sys.gravity)
+
+    def forward_scan(vel_acc_p, link_type, qd, qdd, link):
+        v_p, a_p = vel_acc_p
+        joint_params = link.joint_params
+        vJ = jcalc.jcalc_motion(link_type, qd, joint_params)
+        aJ = jcalc.jcalc_motion(link_type, qdd, joint_params)
+
+        # for links that connect to the worldbody `v_p` is zero and `a_p` is gravity
+        t = lambda m: algebra.transform_motion(link.transform, m)
+        v = vJ + t(v_p)
+        a = t(a_p) + aJ + algebra.motion_cross(v, vJ)
+        return v, a
+
+    vel, acc = sys.scan_levels(
+        forward_scan, (base.Motion.zero(), gravity), "ddl", qd, qdd, sys.links
+    )
+
+    @jax.vmap
+    def net_force(it, v, a):
+        return algebra.inertia_mul_motion(it, a) + algebra.motion_cross_star(
+            v, algebra.inertia_mul_motion(it, v)
+        )
+
+    fs = net_force(sys.links.inertia, vel, acc)
+
+    def backwards_scan(f_children, link_type, f, l_to_p_trafo, link):
+        f = f + f_children
+        tau = jcalc.jcalc_tau(link_type, f, link.joint_params)
+        return tau, algebra.transform_force(l_to_p_trafo, f)
+
+    return sys.scan_levels(
+        backwards_scan,
+        base.Force.zero(),
+        "lll",
+        fs,
+        jax.vmap(algebra.transform_inv)(sys.links.transform),
+        sys.links,
+        reverse=True,
+        out_type="d",
+    )
+
+
 def compute_mass_matrix(sys: base.System) -> jax.Array:
     """Computes the mass matrix of the system using the `composite-rigid-body`
     algorithm."""
+    if sys.scan_mode == "levels":
+        return _compute_mass_matrix_levels(sys)
 
     # STEP 1: Accumulate inertias inwards
     # We will stay in spatial mode in this step
@@ -178,6 +231,66 @@ def compute_mass_matrix(sys: base.System) -> jax.Array:
     return H
 
 
+def _compute_mass_matrix_levels(sys: base.System) -> jax.Array:
+    # composite-rigid-body algorithm where all quantities are expressed in the
+    # base frame, then H_ij = S_i^T @ I^c_k @ S_j with k the deeper one of link(i)
+    # and link(j) and zero if the links are not on the same path to the root
+    l_to_p = jax.vmap(algebra.transform_inv)(sys.links.transform)
+
+    def accumulate_inertias(it_children, _, it, l_to_p):
+        it = it + it_children
+        return it, algebra.transform_inertia(l_to_p, it)
+
+    its = sys.scan_levels(
+        accumulate_inertias,
+        base.Inertia.zero(),
+        "ll",
+        sys.links.inertia,
+        l_to_p,
+        reverse=True,
+    )
+    eps_to_l = sys.scan_levels(
+        lambda eps_to_p, _, p_to_l: algebra.transform_mul(p_to_l, eps_to_p),
+        base.Transform.zero(),
+        "l",
+        sys.links.transform,
+    )
+    l_to_eps = jax.vmap(algebra.transform_inv)(eps_to_l)
+
+    def motion_subspace(link_type: str, link, l_to_eps):
+        joint_params = jcalc._limit_scope_of_joint_params(link_type, link.joint_params)
+        list_motion = jcalc.get_joint_model(link_type).motion
+        if len(list_motion) == 0:
+            # joint is frozen
+            return jnp.zeros((0, 6))
+        return jnp.stack(
+            [
+                algebra.transform_motion(
+                    l_to_eps, jcalc._to_motion(m, joint_params)
+                ).as_matrix()
+                for m in list_motion
+            ]
+        )
+
+    S = sys.map_types(motion_subspace, "ll", sys.links, l_to_eps, out_type="d")
+    I_mat = jax.vmap(
+        lambda l_to_eps, it: algebra.transform_inertia(l_to_eps, it).as_matrix()
+    )(l_to_eps, its)
+
+    # static sparsity pattern of the mass matrix
+    topology = sys.topology()
+    is_ancestor, dof_to_link = topology.is_ancestor, topology.dof_to_link
+    link_i, link_j = dof_to_link[:, None], dof_to_link[None, :]
+    related = is_ancestor[link_i, link_j] | is_ancestor[link_j, link_i]
+    deeper = np.where(is_ancestor[link_i, link_j], link_j, link_i)
+
+    H = jnp.einsum("ik,ijkl,jl->ij", S, I_mat[deeper], S)
+    H = jnp.where(related, H, 0.0)
+    H += jnp.diag(sys.link_armature)
+
+    return H
+
+
 def _quaternion_spring_force(q_zeropoint, q) -> jax.Array:
     "Computes the angular velocity direction from q to q_zeropoint."
     qrel = maths.quat_mul(q_zeropoint, maths.quat_inv(q))
@@ -186,19 +299,19 @@ def _quaternion_spring_force(q_zeropoint, q) -> jax.Array:
 
 
 def _spring_force(sys: base.System, q: jax.Array):
+    if sys.scan_mode == "levels":
+        return sys.map_types(
+            lambda typ, q, zeropoint: _spring_force_link(typ, q, zeropoint),
+            "qq",
+            q,
+            sys.link_spring_zeropoint,
+            out_type="d",
+        )
+
     q_spring_force = []
 
     def _calc_spring_force_per_link(_, __, q, zeropoint, typ):
-        # cor is (free, p3d) stacked; free is (spherical, p3d) stacked
-        if typ in ["free", "cor"]:
-            quat_force = _quaternion_spring_force(zeropoint[:4], q[:4])
-            pos_force = zeropoint[4:] - q[4:]
-            q_spring_force_link = jnp.concatenate((quat_force, pos_force))
-        elif typ == "spherical":
-            q_spring_force_link = _quaternion_spring_force(zeropoint, q)
-        else:
-            q_spring_force_link = zeropoint - q
-        q_spring_force.append(q_spring_force_link)
+        q_spring_force.append(_spring_force_link(typ, q, zeropoint))
 
     sys.scan(
         _calc_spring_force_per_link,
@@ -210,31 +323,42 @@ def _spring_force(sys: base.System, q: jax.Array):
     return jnp.concatenate(q_spring_force)
 
 
+def _spring_force_link(typ: str, q: jax.Array, zeropoint: jax.Array) -> jax.Array:
+    # cor is (free, p3d) stacked; free is (spherical, p3d) stacked
+    if typ in ["free", "cor"]:
+        quat_force = _quaternion_spring_force(zeropoint[:4], q[:4])
+        pos_force = zeropoint[4:] - q[4:]
+        q_spring_force_link = jnp.concatenate((quat_force, pos_force))
+    elif typ == "spherical":
+        q_spring_force_link = _quaternion_spring_force(zeropoint, q)
+    else:
+        q_spring_force_link = zeropoint - q
+    return q_spring_force_link
+
+
 def forward_dynamics(
     sys: base.System,
     q: jax.Array,
     qd: jax.Array,
     tau: jax.Array,
     # mass_mat_inv: jax.Array,
+    dt: Optional[float | jax.Array] = None,
 ) -> Tuple[jax.Array, jax.Array]:
-    C = inverse_dynamics(sys, qd, jnp.zeros_like(qd))
-    mass_matrix = compute_mass_matrix(sys)
+    """Computes the joint accelerations. Returns them together with the inverse of
+    the mass matrix, so independent of `sys.dynamics_method` and
+    `sys.mass_mat_solver` the mass matrix is always formed and inverted. The
+    integrators of `step` use `_forward_dynamics_qdd` instead.
+    The joint damping is integrated implicitly with the timestep `dt` which defaults
+    to `sys.dt`, `dt` = 0 gives the explicit joint accelerations.
+    NOTE: Expects `sys` to have updated `transform` and `inertia`.
+    """
+    if dt is None:
+        dt = sys.dt
 
-    spring_force = -sys.link_damping * qd + sys.link_spring_stiffness * _spring_force(
-        sys, q
-    )
-    qf_smooth = tau - C + spring_force
+    qf_smooth, mass_matrix = _qf_smooth_and_mass_matrix(sys, q, qd, tau, dt)
 
     if sys.mass_mat_iters == 0:
         eye = jnp.eye(sys.qd_size())
-
-        # trick from brax / mujoco aka "integrate joint damping implicitly"
-        mass_matrix += jnp.diag(sys.link_damping) * sys.dt
-
-        # make cholesky decomposition not sometimes fail
-        # see: https://github.com/google/jax/issues/16149
-        mass_matrix += eye * 1e-6
-
         mass_mat_inv = jax.scipy.linalg.solve(mass_matrix, eye, assume_a="pos")
     else:
         warnings.warn(
@@ -247,6 +371,262 @@ def forward_dynamics(
     return mass_mat_inv @ qf_smooth, mass_mat_inv
 
 
+def _spring_and_damping_force(sys: base.System, q: jax.Array, qd: jax.Array):
+    return -sys.link_damping * qd + sys.link_spring_stiffness * _spring_force(sys, q)
+
+
+def _qf_smooth_and_mass_matrix(
+    sys: base.System, q: jax.Array, qd: jax.Array, tau: jax.Array, dt
+) -> Tuple[jax.Array, jax.Array]:
+    C = inverse_dynamics(sys, qd, jnp.zeros_like(qd))
+    mass_matrix = compute_mass_matrix(sys)
+    qf_smooth = tau - C + _spring_and_damping_force(sys, q, qd)
+
+    if sys.mass_mat_iters == 0:
+        # trick from brax / mujoco aka "integrate joint damping implicitly"
+        mass_matrix += jnp.diag(sys.link_damping) * dt
+
+        # make cholesky decomposition not sometimes fail
+        # see: https://github.com/google/jax/issues/16149
+        mass_matrix += jnp.eye(sys.qd_size()) * 1e-6
+
+    return qf_smooth, mass_matrix
+
+
+def _forward_dynamics_qdd(
+    sys: base.System,
+    q: jax.Array,
+    qd: jax.Array,
+    tau: jax.Array,
+    dt: float | jax.Array,
+) -> jax.Array:
+    """Like `forward_dynamics` but only computes the joint accelerations, using
+    `sys.dynamics_method` and `sys.mass_mat_solver`. Only with
+    `sys.mass_mat_solver` = `dense` or `sys.mass_mat_iters` > 0 the inverse of the
+    mass matrix is formed."""
+    if sys.dynamics_method == "aba":
+        qf = tau + _spring_and_damping_force(sys, q, qd)
+        return _forward_dynamics_aba(sys, qd, qf, dt)
+    assert sys.dynamics_method == "crba", f"Unknown `{sys.dynamics_method}`"
+
+    if sys.mass_mat_iters > 0 or sys.mass_mat_solver == "dense":
+        return forward_dynamics(sys, q, qd, tau, dt=dt)[0]
+    assert sys.mass_mat_solver == "ltdl", f"Unknown `{sys.mass_mat_solver}`"
+
+    qf_smooth, mass_matrix = _qf_smooth_and_mass_matrix(sys, q, qd, tau, dt)
+    dof_parents = sys.topology().dof_parents
+    LD = _ltdl_factorise(mass_matrix, dof_parents)
+    return _ltdl_solve(LD, dof_parents, qf_smooth)
+
+
+def _dof_ancestors(dof_parents: np.ndarray) -> tuple[jax.Array, jax.Array]:
+    """All (strict) ancestors of each degree of freedom padded to the maximum depth.
+    Padded entries point to the additional last index `n` and are masked out."""
+    n = len(dof_parents)
+    ancestors = []
+    for k in range(n):
+        ancestors.append([])
+        j = dof_parents[k]
+        while j != -1:
+            ancestors[k].append(j)
+            j = dof_parents[j]
+    max_depth = max([len(anc) for anc in ancestors] + [1])
+    table = np.full((n, max_depth), n, dtype=int)
+    for k, anc in enumerate(ancestors):
+        table[k, : len(anc)] = anc
+    return jnp.asarray(table), jnp.asarray(table < n)
+
+
+def _ltdl_factorise(H: jax.Array, dof_parents: np.ndarray) -> jax.Array:
+    """Sparse LTDL factorisation H = L^T D L of the mass matrix, where the sparsity of
+    `H` is given by the kinematic tree, see Featherstone, Rigid Body Dynamics
+    Algorithms, section 6.3. Returns `L` (strictly lower part) and `D` (diagonal)
+    in one matrix. Only entries of ancestors are ever touched, so the cost is
+    O(n * depth^2) instead of O(n^3)."""
+    n = H.shape[0]
+    table, mask = _dof_ancestors(dof_parents)
+    # additional row and column that absorb the updates of padded entries
+    H = jnp.pad(H, ((0, 1), (0, 1)))
+
+    def body(i, H):
+        k = n - 1 - i
+        anc, m = table[k], mask[k]
+        h = jnp.where(m, H[k, anc], 0.0)
+        a = h / H[k, k]
+        H = H.at[anc[:, None], anc[None, :]].add(-jnp.outer(a, h))
+        return H.at[k, anc].set(jnp.where(m, a, 0.0))
+
+    return jax.lax.fori_loop(0, n, body, H)[:n, :n]
+
+
+def _ltdl_solve(LD: jax.Array, dof_parents: np.ndarray, b: jax.Array) -> jax.Array:
+    "Solves H x = b given the factorisation of `_ltdl_factorise`."
+    n = LD.shape[0]
+    table, mask = _dof_ancestors(dof_parents)
+    L = jnp.where(mask, jnp.take_along_axis(LD, jnp.minimum(table, n - 1), 1), 0.0)
+    b = jnp.pad(b, (0, 1))
+
+    def solve_LT(i, b):
+        k = n - 1 - i
+        return b.at[table[k]].add(-L[k] * b[k])
+
+    def solve_L(k, x):
+        return x.at[k].add(-L[k] @ x[table[k]])
+
+    y = jax.lax.fori_loop(0, n, solve_LT, b)[:n] / jnp.diag(LD)
+    return jax.lax.fori_loop(0, n, solve_L, jnp.pad(y, (0, 1)))[:n]
+
+
+def _motion_subspace(link_type: str, link: base.Link) -> jax.Array:
+    "Motion subspace of the joint as (qd_width, 6) matrix."
+    joint_params = jcalc._limit_scope_of_joint_params(link_type, link.joint_params)
+    list_motion = jcalc.get_joint_model(link_type).motion
+    if len(list_motion) == 0:
+        # joint is frozen
+        return jnp.zeros((0, 6))
+    return jnp.stack(
+        [jcalc._to_motion(m, joint_params).as_matrix() for m in list_motion]
+    )
+
+
+def _aba_velocities(link_type, v_p, qd, link):
+    # first pass of the articulated-body algorithm, from root to leaves
+    X, S = link.transform.as_matrix(), _motion_subspace(link_type, link)
+    vJ = S.T @ qd
+    v = X @ v_p + vJ
+    c = spatial.crm(v) @ vJ
+    it = link.inertia.as_matrix()
+    return v, c, it, spatial.crf(v) @ it @ v
+
+
+def _aba_joint_terms(link_type, IA, pA, qf, d_diag, link):
+    S = _motion_subspace(link_type, link)
+    U = IA @ S.T
+    D = S @ U + jnp.diag(d_diag)
+    u = qf - S @ pA
+    return S, U, D, u
+
+
+def _aba_articulated_inertias(link_type, IA, pA, c, qf, d_diag, link):
+    # second pass, from leaves to root, returns the articulated inertia and bias
+    # force as seen by the parent
+    X = link.transform.as_matrix()
+    if len(jcalc.get_joint_model(link_type).motion) == 0:
+        Ia, pa = IA, pA + IA @ c
+    else:
+        _, U, D, u = _aba_joint_terms(link_type, IA, pA, qf, d_diag, link)
+        Ia = IA - U @ jnp.linalg.solve(D, U.T)
+        pa = pA + Ia @ c + U @ jnp.linalg.solve(D, u)
+    return X.T @ Ia @ X, X.T @ pa
+
+
+def _aba_accelerations(link_type, a_p, IA, pA, c, qf, d_diag, link):
+    # third pass, from root to leaves
+    a = link.transform.as_matrix() @ a_p + c
+    if len(jcalc.get_joint_model(link_type).motion) == 0:
+        return a, jnp.zeros((0,))
+    S, U, D, u = _aba_joint_terms(link_type, IA, pA, qf, d_diag, link)
+    qdd = jnp.linalg.solve(D, u - U.T @ a)
+    return a + S.T @ qdd, qdd
+
+
+def _forward_dynamics_aba(
+    sys: base.System, qd: jax.Array, qf: jax.Array, dt: float | jax.Array
+) -> jax.Array:
+    """O(n) articulated-body algorithm. `qf` are all generalized forces except for
+    the bias forces. Joint damping is integrated implicitly by adding it to the
+    diagonal of the joint space inertia, identical to `forward_dynamics`."""
+    d_diag = sys.link_armature + sys.link_damping * dt + 1e-6
+    gravity = base.Motion.create(vel=sys.gravity).as_matrix()
+
+    if sys.scan_mode == "levels":
+        return _forward_dynamics_aba_levels(sys, qd, qf, d_diag, gravity)
+
+    v, c, IA, pA = {-1: jnp.zeros((6,))}, {}, {}, {}
+
+    def velocities(_, __, i, p, typ, qd, link):
+        v[i], c[i], IA[i], pA[i] = _aba_velocities(typ, v[p], qd, link)
+
+    args = (list(range(sys.num_links())), sys.link_parents, sys.link_types)
+    sys.scan(velocities, "llldl", *args, qd, sys.links)
+
+    def articulated_inertias(_, __, i, p, typ, qf, d_diag, link):
+        Ia, pa = _aba_articulated_inertias(typ, IA[i], pA[i], c[i], qf, d_diag, link)
+        if p != -1:
+            IA[p], pA[p] = IA[p] + Ia, pA[p] + pa
+
+    sys.scan(articulated_inertias, "lllddl", *args, qf, d_diag, sys.links, reverse=True)
+
+    a, qdd = {-1: gravity}, []
+
+    def accelerations(_, __, i, p, typ, qf, d_diag, link):
+        a[i], qdd_i = _aba_accelerations(
+            typ, a[p], IA[i], pA[i], c[i], qf, d_diag, link
+        )
+        qdd.append(qdd_i)
+
+    sys.scan(accelerations, "lllddl", *args, qf, d_diag, sys.links)
+    return jnp.concatenate(qdd)
+
+
+def _forward_dynamics_aba_levels(
+    sys: base.System,
+    qd: jax.Array,
+    qf: jax.Array,
+    d_diag: jax.Array,
+    gravity: jax.Array,
+) -> jax.Array:
+    def velocities(v_p, typ, qd, link):
+        return _aba_velocities(typ, v_p[0], qd, link)
+
+    v, c, IA, pA = sys.scan_levels(
+        velocities,
+        (jnp.zeros((6,)), jnp.zeros((6,)), jnp.zeros((6, 6)), jnp.zeros((6,))),
+        "dl",
+        qd,
+        sys.links,
+    )
+
+    def articulated_inertias(IA_pA_children, typ, IA, pA, c, qf, d_diag, link):
+        IA, pA = IA + IA_pA_children[0], pA + IA_pA_children[1]
+        to_parent = _aba_articulated_inertias(typ, IA, pA, c, qf, d_diag, link)
+        return (IA, pA), to_parent
+
+    IA, pA = sys.scan_levels(
+        articulated_inertias,
+        (jnp.zeros((6, 6)), jnp.zeros((6,))),
+        "lllddl",
+        IA,
+        pA,
+        c,
+        qf,
+        d_diag,
+        sys.links,
+        reverse=True,
+    )
+
+    def accelerations(a_p, typ, IA, pA, c, qf, d_diag, link):
+        return _aba_accelerations(typ, a_p, IA, pA, c, qf, d_diag, link)[0]
+
+    a = sys.scan_levels(
+        accelerations, gravity, "lllddl", IA, pA, c, qf, d_diag, sys.links
+    )
+    # the worldbody is appended as last row, such that the parent -1 selects it
+    a_p = jnp.concatenate((a, gravity[None]))[jnp.array(sys.link_parents)]
+    return sys.map_types(
+        lambda typ, *args: _aba_accelerations(typ, *args)[1],
+        "llllddl",
+        a_p,
+        IA,
+        pA,
+        c,
+        qf,
+        d_diag,
+        sys.links,
+        out_type="d",
+    )
+
+
 def _strapdown_integration(
     q: base.Quaternion, dang: jax.Array, dt: float
 ) -> base.Quaternion:
@@ -258,70 +638,198 @@ def _strapdown_integration(
     return q / jnp.linalg.norm(q)
 
 
-def _semi_implicit_euler_integration(
-    sys: base.System, state: base.State, taus: jax.Array
-) -> base.State:
-    qdd, mass_mat_inv = forward_dynamics(sys, state.q, state.qd, taus)
-    del mass_mat_inv
-    qd_next = state.qd + sys.dt * qdd
-
-    q_next = []
+def _q_integrate(
+    sys: base.System, q: jax.Array, qd: jax.Array, dt: float | jax.Array
+) -> jax.Array:
+    "Integrates the velocities `qd` over `dt`, quaternions are integrated strapdown."
 
-    def q_integrate(_, __, q, qd, typ):
+    def q_integrate(q, qd, typ):
         if typ in ["free", "cor"]:
-            quat_next = _strapdown_integration(q[:4], qd[:3], sys.dt)
-            pos_next = q[4:] + qd[3:] * sys.dt
+            quat_next = _strapdown_integration(q[:4], qd[:3], dt)
+            pos_next = q[4:] + qd[3:] * dt
             q_next_i = jnp.concatenate((quat_next, pos_next))
         elif typ == "spherical":
-            quat_next = _strapdown_integration(q, qd, sys.dt)
+            quat_next = _strapdown_integration(q, qd, dt)
             q_next_i = quat_next
         else:
-            q_next_i = q + sys.dt * qd
-        q_next.append(q_next_i)
+            q_next_i = q + dt * qd
+        return q_next_i
+
+    if sys.scan_mode == "levels":
+        return sys.map_types(
+            lambda typ, q, qd: q_integrate(q, qd, typ),
+            "qd",
+            q,
+            qd,
+            out_type="q",
+        )
+
+    q_next = []
+    sys.scan(
+        lambda _, __, *args: q_next.append(q_integrate(*args)),
+        "qdl",
+        q,
+        qd,
+        sys.link_types,
+    )
+    return jnp.concatenate(q_next)
+
 
+def _semi_implicit_euler_integration(
+    sys: base.System, state: base.State, taus: jax.Array, dt: float | jax.Array
+) -> base.State:
+    qdd = _forward_dynamics_qdd(sys, state.q, state.qd, taus, dt)
+    qd_next = state.qd + dt * qdd
     # uses already `qd_next` because semi-implicit
-    sys.scan(q_integrate, "qdl", state.q, qd_next, sys.link_types)
-    q_next = jnp.concatenate(q_next)
+    q_next = _q_integrate(sys, state.q, qd_next, dt)
+    return state.replace(q=q_next, qd=qd_next)
 
-    state = state.replace(q=q_next, qd=qd_next)
-    return state
+
+def _implicit_damping_euler_integration(
+    sys: base.System, state: base.State, taus: jax.Array, dt: float | jax.Array
+) -> base.State:
+    """Like `semi_implicit_euler` but also the spring forces are integrated
+    implicitly (linearised). Evaluating the spring at the next position
+    `q + dt * qd_next` is identical to an additional joint damping of
+    `dt * stiffness` that is integrated implicitly. Stable for arbitrarily stiff
+    springs."""
+    damping = sys.link_damping + dt * sys.link_spring_stiffness
+    sys = sys.replace(link_damping=damping)
+    return _semi_implicit_euler_integration(sys, state, taus, dt)
+
+
+def _rk4_integration(
+    sys: base.System, state: base.State, taus: jax.Array, dt: float | jax.Array
+) -> base.State:
+    """Classical fourth-order Runge-Kutta. The joint damping is integrated
+    explicitly. Quaternions are integrated strapdown using the weighted average of
+    the velocities of all stages."""
+
+    def derivative(sys, q, qd):
+        return qd, _forward_dynamics_qdd(sys, q, qd, taus, 0.0)
+
+    def stage(qd_prev, qdd_prev, c):
+        q = _q_integrate(sys, state.q, qd_prev, c * dt)
+        qd = state.qd + c * dt * qdd_prev
+        sys_stage, _ = kinematics.forward_kinematics(sys, state.replace(q=q))
+        return derivative(sys_stage, q, qd)
+
+    k1 = derivative(sys, state.q, state.qd)
+    k2 = stage(*k1, 0.5)
+    k3 = stage(*k2, 0.5)
+    k4 = stage(*k3, 1.0)
+    qd_mean, qdd_mean = jax.tree_map(
+        lambda a, b, c, d: (a + 2 * b + 2 * c + d) / 6, k1, k2, k3, k4
+    )
+
+    q_next = _q_integrate(sys, state.q, qd_mean, dt)
+    return state.replace(q=q_next, qd=state.qd + dt * qdd_mean)
 
 
 _integration_methods = {
     "semi_implicit_euler": _semi_implicit_euler_integration,
+    "implicit_damping_euler": _implicit_damping_euler_integration,
+    "rk4": _rk4_integration,
 }
 
 
+def register_integration_method(
+    name: str,
+    method: Callable[
+        [base.System, base.State, jax.Array, float | jax.Array], base.State
+    ],
+    overwrite: bool = False,
+) -> None:
+    """Makes `method` available as `System.integration_method` = `name`.
+
+    Args:
+        name: Name of the integration method.
+        method: Function `(sys, state, taus, dt) -> state` that integrates the state
+            over the timestep `dt`. `sys` has updated `transform` and `inertia`, use
+            `dt` and not `sys.dt` which is not divided by the number of substeps.
+        overwrite: Whether or not an existing method of the same name is replaced.
+    """
+    name = name.lower()
+    assert (
+        overwrite or name not in _integration_methods
+    ), f"integration method `{name}` already exists, use `overwrite=True`"
+    _integration_methods[name] = method
+
+
 def kinetic_energy(sys: base.System, qd: jax.Array):
     H = compute_mass_matrix(sys)
     return 0.5 * qd @ H @ qd
 
 
+# largest `dt` * `omega` per substep of the stiffest spring in adaptive substepping,
+# semi-implicit Euler is stable for `dt` * `omega` < 2
+_ADAPTIVE_MAX_OMEGA_DT = 1.0
+
+
+def _adaptive_n_substeps(
+    sys: base.System, n_substeps: int, max_substeps: int
+) -> jax.Array:
+    """Number of substeps that resolves the undamped natural frequency of the
+    stiffest joint spring with `_ADAPTIVE_MAX_OMEGA_DT`. Only springs enter, these
+    model the passive compliance of unactuated joints (e.g. from `motion_artifacts`).
+    NOTE: Expects `sys` to have updated `transform` and `inertia`.
+    """
+    inertia = jnp.diag(compute_mass_matrix(sys)) + 1e-6
+    omega = jnp.max(jnp.sqrt(sys.link_spring_stiffness / inertia), initial=0.0)
+    n = jnp.ceil(sys.dt * omega / _ADAPTIVE_MAX_OMEGA_DT).astype(int)
+    return jnp.clip(n, n_substeps, max_substeps)
+
+
 def step(
     sys: base.System,
     state: base.State,
     taus: Optional[jax.Array] = None,
     n_substeps: int = 1,
+    max_substeps: Optional[int] = None,
 ) -> base.State:
-    "Steps the dynamics. Returns the state of next timestep."
+    """Steps the dynamics. Returns the state of next timestep.
+
+    Args:
+        sys: System, `sys.integration_method` selects the integrator.
+        state: Current state.
+        taus: Generalized forces that are applied during the whole timestep.
+        n_substeps: Number of substeps of size `sys.dt` / `n_substeps`.
+        max_substeps: If given, the number of substeps is chosen adaptively between
+            `n_substeps` and `max_substeps` from the stiffness of the joint springs
+            of `sys` at the current state, such that stiff passive subsystems remain
+            stable without reducing `sys.dt`. This can not be reverse-mode
+            differentiated.
+    """
     assert sys.q_size() == state.q.size
     if taus is None:
         taus = jnp.zeros_like(state.qd)
     assert sys.qd_size() == state.qd.size == taus.size
+    method = sys.integration_method.lower()
     assert (
-        sys.integration_method.lower() == "semi_implicit_euler"
-    ), "Currently, nothing else then `semi_implicit_euler` implemented."
+        method in _integration_methods
+    ), f"Unknown `{method}`, available are {list(_integration_methods)}"
+    integrate = _integration_methods[method]
 
-    sys = sys.replace(dt=sys.dt / n_substeps)
-
-    for _ in range(n_substeps):
+    def substep(state, dt):
         # update kinematics before stepping; this means that the `x` in `state`
         # will lag one step behind but otherwise we would have to return
         # the system object which would be awkward
-        sys, state = kinematics.forward_kinematics(sys, state)
-        state = _integration_methods[sys.integration_method.lower()](sys, state, taus)
-
-    return state
+        sys_fk, state = kinematics.forward_kinematics(sys, state)
+        return integrate(sys_fk, state, taus, dt)
+
+    if max_substeps is not None:
+        assert max_substeps >= n_substeps
+        sys_fk, _ = kinematics.forward_kinematics(sys, state)
+        n = _adaptive_n_substeps(sys_fk, n_substeps, max_substeps)
+        dt = sys.dt / n
+        return jax.lax.fori_loop(0, n, lambda _, state: substep(state, dt), state)
+
+    dt = sys.dt / n_substeps
+    if n_substeps == 1:
+        return substep(state, dt)
+    return jax.lax.scan(
+        lambda state, _: (substep(state, dt), None), state, None, length=n_substeps
+    )[0]
 
 
 def _inv_approximate(a: jax.Array, a_inv: jax.Array, num_iter: int = 10) -> jax.Array:
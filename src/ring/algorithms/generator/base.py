@@ -1,5 +1,8 @@
+from dataclasses import replace
 from functools import partial
+import itertools
 import random
+import time
 from typing import Callable, Optional
 import warnings
 
@@ -48,18 +51,44 @@ class RCMG:
         keep_output_extras: bool = False,
         use_link_number_in_Xy: bool = False,
         cor: bool = False,
+        stack_configs: bool = False,
         disable_tqdm: bool = False,
     ) -> None:
-        "Random Chain Motion Generator"
+        """Random Chain Motion Generator
+
+        With `stack_configs`, the `config`s are traced as arrays and `q` of all
+        `config`s is drawn by one vmapped `draw_random_q` (if the configs can be
+        stacked, see `jcalc.stack_motionconfigs`). This compiles much faster for
+        many `config`s but the throughput is lower, because the sampling loops of
+        all `config`s run as long as the one of the slowest `config`."""
 
         sys, config = utils.to_list(sys), utils.to_list(config)
         sys_ml = sys[0] if sys_ml is None else sys_ml
 
+        # everything (but the system) the generators depend on
+        cache_args = dict(locals())
+        for k in ["self", "sys", "disable_tqdm"]:
+            cache_args.pop(k)
+
         for c in config:
             assert c.is_feasible()
 
-        self.gens = []
-        for _sys in sys:
+        # with `n_buckets` in `randomize_hz_kwargs`, there is one generator per
+        # system and bucket of similar `sampling_rates`, see `_hz_buckets`
+        hz_buckets = [randomize_hz_kwargs]
+        if randomize_hz and "n_buckets" in randomize_hz_kwargs:
+            hz_buckets = _hz_buckets(**randomize_hz_kwargs)
+
+        self.gens, self._cache_keys = [], []
+        for _sys, hz_bucket in itertools.product(sys, hz_buckets):
+            # computed lazily, only if the cache is enabled
+            self._cache_keys.append(
+                partial(
+                    _cache_key,
+                    _sys,
+                    cache_args | dict(randomize_hz_kwargs=hz_bucket),
+                )
+            )
             self.gens.append(
                 _build_mconfig_batched_generator(
                     sys=_sys,
@@ -78,7 +107,7 @@ class RCMG:
                     randomize_motion_artifacts=randomize_motion_artifacts,
                     randomize_joint_params=randomize_joint_params,
                     randomize_hz=randomize_hz,
-                    randomize_hz_kwargs=randomize_hz_kwargs,
+                    randomize_hz_kwargs=hz_bucket,
                     imu_motion_artifacts=imu_motion_artifacts,
                     imu_motion_artifacts_kwargs=imu_motion_artifacts_kwargs,
                     dynamic_simulation=dynamic_simulation,
@@ -87,6 +116,7 @@ class RCMG:
                     keep_output_extras=keep_output_extras,
                     use_link_number_in_Xy=use_link_number_in_Xy,
                     cor=cor,
+                    stack_configs=stack_configs,
                 )
             )
 
@@ -94,6 +124,21 @@ class RCMG:
         self._size_of_generators = [self._n_mconfigs] * len(self.gens)
 
         self._disable_tqdm = disable_tqdm
+        # compiled generators of `sample`, one per generator
+        self._sample_fns = {}
+
+    def __getstate__(self):
+        # e.g. for `processes` > 1, the compiled generators are rebuilt if required
+        state = self.__dict__.copy()
+        state["_sample_fns"] = {}
+        return state
+
+    def _lazy_cache_key(self) -> Optional[str]:
+        "Key of all generators, `None` if any generator can not be keyed."
+        cache_keys = [cache_key() for cache_key in self._cache_keys]
+        if None in cache_keys:
+            return None
+        return utils.compile_cache.make_key(cache_keys)
 
     def _compute_repeats(self, sizes: int | list[int]) -> list[int]:
         "how many times the generators are repeated to create a batch of `sizes`"
@@ -127,9 +172,87 @@ class RCMG:
         return repeats
 
     def to_lazy_gen(
-        self, sizes: int | list[int] = 1, jit: bool = True
+        self,
+        sizes: int | list[int] = 1,
+        jit: bool = True,
+        dispatch: str = "switch",
+        nan_resamples: int = 0,
     ) -> types.BatchedGenerator:
-        return batch.generators_lazy(self.gens, self._compute_repeats(sizes), jit)
+        "See `batch.generators_lazy` for `dispatch` and `nan_resamples`."
+        return batch.generators_lazy(
+            self.gens,
+            self._compute_repeats(sizes),
+            jit,
+            self._lazy_cache_key,
+            dispatch,
+            nan_resamples,
+        )
+
+    def sample(
+        self, indices: int | list[int] | np.ndarray, seed: int = 1
+    ) -> PyTree[np.ndarray]:
+        """Random-access generation. Returns the sequences `indices` as numpy arrays
+        batched along the first axis. Sequence `i` only depends on `seed` and `i`,
+        not on any other sequence, so an infinite dataset can e.g. be sharded over
+        workers with `rcmg.sample(range(rank, N, n_workers))` and any single
+        sequence can be regenerated. Empty `indices` return an empty batch.
+
+        Every call of a generator yields `len(config)` sequences, sequence `i` is
+        sequence `i % len(config)` of call `c = i // len(config)` which executes
+        generator `c % len(self.gens)` (one per system, and per bucket of sampling
+        rates) with the key `jax.random.fold_in(jax.random.PRNGKey(seed), c)`.
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        assert indices.ndim == 1, "`indices` must be one-dimensional"
+        calls = indices // self._n_mconfigs
+        assert np.all((calls >= 0) & (calls < 2**32)), "Index out of range"
+
+        key, unique_calls = jax.random.PRNGKey(seed), np.unique(calls)
+        if len(indices) == 0:
+            # e.g. a worker of `range(rank, N, n_workers)` with `rank >= N`
+            shapes = jax.eval_shape(self.gens[0], key)
+            return jax.tree_map(lambda s: np.zeros((0,) + s.shape[1:], s.dtype), shapes)
+        data, positions = [], {}
+        for i_gen in range(len(self.gens)):
+            gen_calls = unique_calls[unique_calls % len(self.gens) == i_gen]
+            if len(gen_calls) == 0:
+                continue
+            for call in gen_calls:
+                positions[call] = len(positions)
+            data.append(self._sample_calls(i_gen, key, gen_calls))
+        data = jax.tree_map(lambda *arrs: np.concatenate(arrs), *data)
+
+        rows = [
+            positions[call] * self._n_mconfigs + i % self._n_mconfigs
+            for i, call in zip(indices, calls)
+        ]
+        return jax.tree_map(lambda arr: arr[np.array(rows)], data)
+
+    def _sample_calls(
+        self, i_gen: int, key: jax.Array, calls: np.ndarray
+    ) -> PyTree[np.ndarray]:
+        if i_gen not in self._sample_fns:
+            gen = self.gens[i_gen]
+
+            def sample_fn(key, calls):
+                keys = jax.vmap(jax.random.fold_in, (None, 0))(key, calls)
+                return jax.vmap(gen)(keys)
+
+            cache_key = utils.compile_cache.derive_key(
+                self._cache_keys[i_gen], "sample"
+            )
+            self._sample_fns[i_gen] = utils.compile_cache.jit(sample_fn, cache_key)
+
+        # the number of calls is padded to a power of two, such that only few
+        # batch sizes are compiled
+        n_calls = len(calls)
+        padded = np.zeros((1 << (n_calls - 1).bit_length(),), dtype=np.uint32)
+        padded[:n_calls] = calls
+        # converts also to numpy; but with np.array.flags.writeable = False
+        data = jax.device_get(self._sample_fns[i_gen](key, padded))
+        return jax.tree_map(
+            lambda arr: np.array(arr[:n_calls]).reshape((-1,) + arr.shape[2:]), data
+        )
 
     @staticmethod
     def _number_of_executions_required(size: int) -> int:
@@ -145,8 +268,8 @@ class RCMG:
 
         return n_calls
 
-    def _generators_ncalls(self, sizes: int | list[int] = 1):
-        "Returns list of unbatched sequences as numpy arrays."
+    def _ncalls(self, sizes: int | list[int] = 1) -> tuple[list[int], list[int]]:
+        "Returns the repeats per call and the number of calls of every generator."
         repeats = self._compute_repeats(sizes)
         sizes = list(jnp.array(repeats) * jnp.array(self._size_of_generators))
 
@@ -157,26 +280,60 @@ class RCMG:
             gcd = utils.gcd(n_call, repeat)
             n_calls.append(gcd)
             reduced_repeats.append(repeat // gcd)
+        return reduced_repeats, n_calls
+
+    def _generators(self, sizes: int | list[int] = 1):
+        return self._generators_ncalls(sizes)[0]
+
+    def _generators_ncalls(self, sizes: int | list[int] = 1):
+        "Returns list of unbatched sequences as numpy arrays."
+        reduced_repeats, n_calls = self._ncalls(sizes)
         jits = [N > 1 for N in n_calls]
 
         gens = []
-        for i in range(len(repeats)):
+        for i in range(len(reduced_repeats)):
             gens.append(
-                batch.generators_lazy([self.gens[i]], [reduced_repeats[i]], jits[i])
+                batch.generators_lazy(
+                    [self.gens[i]], [reduced_repeats[i]], jits[i], self._cache_keys[i]
+                )
             )
 
         return gens, n_calls
 
+    def _generators_eager(
+        self,
+        sizes: int | list[int],
+        callback: Callable[[list[PyTree[np.ndarray]]], None],
+        seed: int,
+        offset: int = 0,
+        processes: Optional[int] = 1,
+    ) -> None:
+        if processes == 1:
+            gens, n_calls = self._generators_ncalls(sizes)
+            batch.generators_eager(
+                gens, n_calls, callback, seed, self._disable_tqdm, offset
+            )
+        else:
+            # only the workers build the generators
+            batch.generators_eager_processes(
+                partial(self._generators, sizes),
+                self._ncalls(sizes)[1],
+                callback,
+                seed,
+                self._disable_tqdm,
+                offset,
+                processes,
+            )
+
     def to_list(
-        self, sizes: int | list[int] = 1, seed: int = 1
+        self, sizes: int | list[int] = 1, seed: int = 1, processes: Optional[int] = 1
     ) -> list[tree_utils.PyTree[np.ndarray]]:
-        "Returns list of unbatched sequences as numpy arrays."
-        gens, n_calls = self._generators_ncalls(sizes)
-
+        """Returns list of unbatched sequences as numpy arrays. With `processes` > 1
+        (or `None` for one per CPU), the sequences are generated by a pool of
+        processes, see `batch.generators_eager_processes`; the result does not
+        depend on `processes`."""
         data = []
-        batch.generators_eager(
-            gens, n_calls, lambda d: data.extend(d), seed, self._disable_tqdm
-        )
+        self._generators_eager(sizes, lambda d: data.extend(d), seed, 0, processes)
         return data
 
     def to_folder(
@@ -190,6 +347,7 @@ class RCMG:
             utils.pickle_save, overwrite=True
         ),
         verbose: bool = True,
+        processes: Optional[int] = 1,
     ):
 
         i = 0
@@ -204,8 +362,96 @@ class RCMG:
                 save_fn(d, file)
                 i += 1
 
-        gens, n_calls = self._generators_ncalls(sizes)
-        batch.generators_eager(gens, n_calls, callback, seed, self._disable_tqdm)
+        self._generators_eager(sizes, callback, seed, 0, processes)
+
+    def to_shards(
+        self,
+        path: str,
+        sizes: int | list[int] = 1,
+        seed: int = 1,
+        shard_size: int = 1024,
+        overwrite: bool = False,
+        resume: bool = False,
+        verbose: bool = True,
+        processes: Optional[int] = 1,
+    ) -> dict:
+        """Writes the sequences in the sharded format of `ring.utils.shards`, i.e.
+        fixed-size shards of contiguous arrays per leaf. Read with
+        `utils.shards.ShardReader` or `dataloader.make_generator(backend="shards")`.
+
+        Sequences are streamed to disk, so memory usage does not grow with `sizes`.
+        With `resume`, an interrupted run continues from its last checkpoint
+        (using the seed recorded there) and yields the same dataset as an
+        uninterrupted run. Returns the number of written sequences, the elapsed
+        seconds and the sequences per second. See `to_list` for `processes`.
+        """
+        writer = utils.shards.ShardWriter(path, shard_size, overwrite, resume)
+        return self._stream(writer, sizes, seed, verbose, processes)
+
+    def to_hdf5(
+        self,
+        path: str,
+        sizes: int | list[int] = 1,
+        seed: int = 1,
+        overwrite: bool = True,
+        resume: bool = False,
+        compression: Optional[str] = None,
+        chunk_sequences: int = 1,
+        verbose: bool = True,
+        processes: Optional[int] = 1,
+    ) -> dict:
+        """Writes the sequences to one hdf5 file using `utils.hdf5.HDF5Writer`.
+
+        Sequences are streamed to disk, so memory usage does not grow with `sizes`.
+        With `resume`, an interrupted run continues from its last checkpoint
+        (using the seed recorded there) and yields the same dataset as an
+        uninterrupted run. Returns the number of written sequences, the elapsed
+        seconds and the sequences per second. See `to_list` for `processes`.
+        """
+        writer = utils.hdf5.HDF5Writer(
+            path,
+            compression=compression,
+            chunk_sequences=chunk_sequences,
+            overwrite=overwrite,
+            resume=resume,
+        )
+        return self._stream(writer, sizes, seed, verbose, processes)
+
+    def _stream(
+        self,
+        writer,
+        sizes: int | list[int],
+        seed: int,
+        verbose: bool,
+        processes: Optional[int],
+    ) -> dict:
+        sizes, offset = (sizes if isinstance(sizes, int) else list(sizes)), 0
+        if writer.checkpoint_meta is not None:
+            meta = writer.checkpoint_meta
+            assert meta["sizes"] == sizes, (
+                f"Resumed run was started with `sizes`={meta['sizes']} but "
+                f"`sizes`={sizes} is given"
+            )
+            seed, offset = meta["seed"], meta["offset"]
+        n_sequences, n_calls_done = len(writer), offset
+
+        def callback(data: list[PyTree[np.ndarray]]) -> None:
+            nonlocal n_calls_done
+            writer.append(utils.replace_elements_w_nans(data, verbose=verbose))
+            n_calls_done += 1
+            writer.checkpoint(seed=seed, offset=n_calls_done, sizes=sizes)
+
+        t0 = time.time()
+        with writer:
+            self._generators_eager(sizes, callback, seed, offset, processes)
+        seconds = time.time() - t0
+
+        n_sequences = len(writer) - n_sequences
+        return dict(
+            n_sequences=n_sequences,
+            seconds=seconds,
+            seq_per_sec=n_sequences / seconds,
+        )
 
     def to_pickle(
         self,
@@ -256,6 +502,14 @@ class RCMG:
         return generator
 
 
+def _cache_key(sys: base.System, cache_args: dict) -> Optional[str]:
+    "Key of the `utils.compile_cache`, `None` if e.g. a custom `setup_fn` is used."
+    try:
+        return utils.compile_cache.make_key("RCMG", sys, cache_args)
+    except utils.compile_cache.Unkeyable:
+        return None
+
+
 def _copy_dicts(f) -> dict:
     def _f(*args, **kwargs):
         _copy = lambda obj: obj.copy() if isinstance(obj, dict) else obj
@@ -293,6 +547,7 @@ def _build_mconfig_batched_generator(
     keep_output_extras: bool,
     use_link_number_in_Xy: bool,
     cor: bool,
+    stack_configs: bool,
 ) -> types.BatchedGenerator:
 
     if add_X_jointaxes or add_y_relpose or add_y_rootincl:
@@ -373,6 +628,13 @@ def _build_mconfig_batched_generator(
             Xy, extras = f(Xy, extras)
         return Xy, extras
 
+    max_sampling_rate = randomize_hz_kwargs.get("max_sampling_rate")
+
+    # the configs are traced, such that `draw_random_q` is only traced once
+    stacked_config = None
+    if stack_configs and len(config) > 1:
+        stacked_config = jcalc.stack_motionconfigs(config)
+
     def _gen(key: types.PRNGKey):
         key, *consume = jax.random.split(key, len(config) + 1)
         syss = jax.vmap(_setup_fn, (0, None))(jnp.array(consume), sys)
@@ -381,19 +643,41 @@ def _build_mconfig_batched_generator(
             assert "sampling_rates" in randomize_hz_kwargs
             hzs = randomize_hz_kwargs["sampling_rates"]
             assert len(set([c.T for c in config])) == 1
-            N = int(min(hzs) * config[0].T)
             key, consume = jax.random.split(key)
-            dt = 1 / jax.random.choice(consume, jnp.array(hzs))
+            if max_sampling_rate is None:
+                N = int(min(hzs) * config[0].T)
+                dt = 1 / jax.random.choice(consume, jnp.array(hzs))
+            else:
+                # every sequence spans `T` and is padded to the length at the
+                # `max_sampling_rate`, `X["mask"]` marks the valid timesteps
+                N = int(max(hzs) * config[0].T)
+                i_hz = jax.random.choice(consume, len(hzs))
+                dt = 1 / jnp.array(hzs)[i_hz]
+                N_valid = jnp.array([int(hz * config[0].T) for hz in hzs])[i_hz]
             # makes sys.dt from float to AbstractArray
             syss = syss.replace(dt=jnp.array(dt))
         else:
             N = None
 
-        qs = []
-        for i, _config in enumerate(config):
-            key, _q = draw_random_q(key, syss[i], _config, N)
-            qs.append(_q)
-        qs = jnp.stack(qs)
+        if stacked_config is None:
+            qs = []
+            for i, _config in enumerate(config):
+                key, _q = draw_random_q(key, syss[i], _config, N)
+                qs.append(_q)
+            qs = jnp.stack(qs)
+        else:
+            # one vmapped `draw_random_q` for all configs, with the same keys as
+            # the loop above
+            keys_q = []
+            for _ in config:
+                keys_q.append(key)
+                key = _draw_random_q_key(key, sys)
+
+            def _draw_random_q(key, sys, fields):
+                _config = replace(stacked_config[0], **fields)
+                return draw_random_q(key, sys, _config, N)[1]
+
+            qs = jax.vmap(_draw_random_q)(jnp.stack(keys_q), syss, stacked_config[1])
 
         @jax.vmap
         def _vmapped_context(key, q, sys):
@@ -404,6 +688,13 @@ def _build_mconfig_batched_generator(
 
         keys = jax.random.split(key, len(config))
         Xy, extras = _vmapped_context(keys, qs, syss)
+        if randomize_hz and max_sampling_rate is not None:
+            N_pad = int(max_sampling_rate * config[0].T)
+            X, y = _pad_time_axis(Xy, N_pad)
+            assert isinstance(X, dict) and "mask" not in X
+            mask = jnp.arange(N_pad) < N_valid
+            X["mask"] = jnp.repeat(mask[None], len(config), axis=0)
+            Xy = (X, y)
         output = (Xy, extras) if keep_output_extras else Xy
         output = output if output_transform is None else output_transform(output)
         return output
@@ -411,6 +702,55 @@ def _build_mconfig_batched_generator(
     return _gen
 
 
+def _hz_buckets(sampling_rates: list[float], n_buckets: int, **kwargs) -> list[dict]:
+    """Splits the sorted `sampling_rates` into `n_buckets` buckets of similar rates.
+    Returns the `randomize_hz_kwargs` of every bucket. The sequences of a bucket
+    are generated with the length of its highest rate, so every sequence spans
+    `T`, and then padded to the length at the highest of all `sampling_rates`.
+    Every bucket (and thereby rate) gets the same share of the batch, if the
+    rates are split evenly.
+
+    Since all buckets are padded to the same global length, the buckets only
+    reduce the cost of simulating the low rates. The batches, and thereby
+    training, still have the length `max(sampling_rates) * T` for every sequence,
+    padded timesteps are only excluded from the loss by `X["mask"]`."""
+    assert 0 < n_buckets <= len(sampling_rates)
+    buckets = np.array_split(np.sort(sampling_rates), n_buckets)
+    return [
+        dict(
+            kwargs,
+            sampling_rates=[float(hz) for hz in bucket],
+            max_sampling_rate=float(max(sampling_rates)),
+        )
+        for bucket in buckets
+    ]
+
+
+def _pad_time_axis(tree: PyTree, N: int) -> PyTree:
+    "Pads the time axis (axis 1) by repeating the last timestep."
+
+    def pad(arr):
+        if arr.ndim < 2 or arr.shape[1] == N:
+            return arr
+        pad_width = [(0, 0), (0, N - arr.shape[1])] + [(0, 0)] * (arr.ndim - 2)
+        return jnp.pad(arr, pad_width, mode="edge")
+
+    return jax.tree_map(pad, tree)
+
+
+def _link_keys(key: types.PRNGKey | None, key_start: types.PRNGKey) -> jax.Array:
+    """The keys of a link in `draw_random_q`, the first one is passed on to the
+    child link. `key` is `None` for the root links."""
+    if key is None:
+        key = key_start
+    return jax.random.split(key, 3)
+
+
+def _draw_random_q_key(key: types.PRNGKey, sys: base.System) -> types.PRNGKey:
+    "Returns the key that `draw_random_q` returns, without drawing `q`."
+    return sys.scan(lambda k, *_: _link_keys(k, key)[0], "l", sys.link_types)[-1]
+
+
 def draw_random_q(
     key: types.PRNGKey,
     sys: base.System,
@@ -430,9 +770,7 @@ def draw_random_q(
             if link_type in joint_params
             else joint_params["default"]
         )
-        if key is None:
-            key = key_start
-        key, key_t, key_value = jax.random.split(key, 3)
+        key, key_t, key_value = _link_keys(key, key_start)
         draw_fn = jcalc.get_joint_model(link_type).rcmg_draw_fn
         if draw_fn is None:
             raise Exception(f"The joint type {link_type} has no draw fn specified.")
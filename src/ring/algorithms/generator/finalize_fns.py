@@ -263,7 +263,8 @@ def _expand_dt(X: dict, T: int):
             numpy = np
         else:
             numpy = jnp
-        dt = numpy.repeat(dt[:, None, :], T, axis=1)
+        # `dt` of `RCMG(..., randomize_hz=True)` has shape (B,)
+        dt = numpy.repeat(dt.reshape((dt.shape[0], 1, -1)), T, axis=1)
         for seg in X:
             X[seg]["dt"] = dt
     return X
@@ -271,6 +272,8 @@ def _expand_dt(X: dict, T: int):
 
 def _expand_then_flatten(Xy):
     X, y = Xy
+    # validity mask of padded sequences, see `randomize_hz_kwargs` of `RCMG`
+    mask = X.pop("mask", None)
     gyr = X["0"]["gyr"]
 
     batched = True
@@ -296,6 +299,8 @@ def _expand_then_flatten(Xy):
     X, y = _flatten(X), _flatten(y)
     if not batched:
         X, y = jax.tree_map(lambda arr: arr[0], (X, y))
+    if mask is not None:
+        return X, y, mask
     return X, y
 
 
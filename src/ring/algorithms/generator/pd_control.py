@@ -137,6 +137,8 @@ def _unroll_dynamics_pd_control(
     sys_q_ref: Optional[base.System] = None,
     initial_sim_state_is_zeros: bool = False,
     clip_taus: Optional[float] = None,
+    n_substeps: int = 1,
+    max_substeps: Optional[int] = None,
 ):
     assert q_ref.ndim == 2
 
@@ -160,7 +162,7 @@ def _unroll_dynamics_pd_control(
         if clip_taus is not None:
             assert clip_taus > 0.0
             taus = jnp.clip(taus, -clip_taus, clip_taus)
-        state = dynamics.step(sys, state, taus)
+        state = dynamics.step(sys, state, taus, n_substeps, max_substeps)
         carry = (state, cs)
         return carry, state
 
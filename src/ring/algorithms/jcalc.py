@@ -52,6 +52,9 @@ class MotionConfig:
     interpolation_method: str = "cosine"
     range_of_motion_hinge: bool = True
     range_of_motion_hinge_method: str = "uniform"
+    # sample all knots of the trajectories at once instead of in a loop, see
+    # `_random.random_angle_over_time`
+    vectorized_sampling: bool = False
 
     # initial value of joints
     ang0_min: float = -jnp.pi
@@ -282,6 +285,46 @@ def join_motionconfigs(
     return replace(configs[0], **changes)
 
 
+# fields that determine shapes or the control flow of `draw_random_q`
+_STATIC_MOTIONCONFIG_FIELDS = [
+    "T",
+    "t_min",
+    "cor_t_min",
+    "cdf_bins_min",
+    "cdf_bins_max",
+    "randomized_interpolation_angle",
+    "randomized_interpolation_position",
+    "interpolation_method",
+    "range_of_motion_hinge",
+    "range_of_motion_hinge_method",
+    "vectorized_sampling",
+]
+
+
+def stack_motionconfigs(
+    configs: list[MotionConfig],
+) -> Optional[tuple[MotionConfig, dict[str, jax.Array]]]:
+    """Splits `configs` into one config of the static fields and a dict of the
+    remaining fields stacked along a leading axis, such that
+    `replace(config, **{k: v[i] for k, v in fields.items()})` equals `configs[i]`.
+    The dict can be traced, e.g. vmapped over, so one graph serves all `configs`.
+    Fields that are a `TimeDependentFloat` are static. Returns `None` if the static
+    fields differ between `configs` or with `vectorized_sampling` which requires
+    all fields to be static."""
+    if any(c.vectorized_sampling for c in configs):
+        return None
+
+    fields = {}
+    for name in configs[0].__dict__:
+        values = [getattr(c, name) for c in configs]
+        if name in _STATIC_MOTIONCONFIG_FIELDS or any(callable(v) for v in values):
+            if any(v is not values[0] and v != values[0] for v in values[1:]):
+                return None
+        else:
+            fields[name] = jnp.array(values, dtype=float)
+    return configs[0], fields
+
+
 DRAW_FN = Callable[
     # config, key_t, key_value, dt, N, params
     [
@@ -460,6 +503,7 @@ def _draw_rxyz(
         config.cdf_bins_min,
         config.cdf_bins_max,
         config.interpolation_method,
+        config.vectorized_sampling,
     )
 
 
@@ -492,6 +536,7 @@ def _draw_pxyz(
         config.cdf_bins_min,
         config.cdf_bins_max,
         config.interpolation_method,
+        config.vectorized_sampling,
     )
 
 
@@ -745,7 +790,41 @@ def _inv_kin_pxyz_factory(xyz: str):
 
 def _inv_kin_free_2d(x: base.Transform, _) -> jax.Array:
     angle_x = _inv_kin_rxyz_factory("x")
-    return jnp.concatenate((angle_x(x), x.pos[1:]))
+    return jnp.concatenate((angle_x(x, None), x.pos[1:]))
+
+
+def _inv_kin_cor(x: base.Transform, _) -> jax.Array:
+    # the translation could be split arbitrarily between the free and the p3d part,
+    # all of it is assigned to the free part
+    return jnp.concatenate((x.rot, x.pos, jnp.zeros((3,))))
+
+
+def _inv_kin_saddle(x: base.Transform, _) -> jax.Array:
+    # projection, a rotation around the x-axis is dropped
+    return maths.quat_to_euler(x.rot)[1:]
+
+
+def _inv_kin_angle_axis(q: jax.Array, axis: jax.Array) -> jax.Array:
+    "Angle of the rotation `q` around `axis`, residual rotations are dropped."
+    axis = maths.safe_normalize(axis)
+    # NOTE: CONVENTION
+    return -2 * jnp.arctan2(q[1:] @ axis, q[0])
+
+
+def _inv_kin_angles_two_axes(
+    q: jax.Array, axis_first: jax.Array, axis_second: jax.Array
+) -> jax.Array:
+    """Angles of rotations around the orthogonal axes `axis_first` and then
+    `axis_second` such that they compose to `q`. Projection if `q` can not be
+    composed exactly."""
+    a = maths.safe_normalize(axis_second)
+    b = maths.safe_normalize(axis_first)
+    # q = A * B = [ca * cb, sa * cb * a + ca * sb * b + sa * sb * (a x b)]
+    q_w, q_a, q_b, q_c = q[0], q[1:] @ a, q[1:] @ b, q[1:] @ jnp.cross(a, b)
+    half_angle_a = jnp.arctan2(q_w * q_a + q_b * q_c, q_w**2 + q_b**2)
+    half_angle_b = jnp.arctan2(q_w * q_b + q_a * q_c, q_w**2 + q_a**2)
+    # NOTE: CONVENTION
+    return -2 * jnp.array([half_angle_b, half_angle_a])
 
 
 _joint_types = {
@@ -801,6 +880,7 @@ _joint_types = {
         _p_control_term_cor,
         _qd_from_q_free,
         _coordinate_vector_to_q_free_spherical_cor,
+        _inv_kin_cor,
     ),
     "rx": JointModel(
         lambda q, _: _rxyz_transform(q, _, jnp.array([1.0, 0, 0])),
@@ -863,6 +943,7 @@ _joint_types = {
         _p_control_term_rxyz,
         _qd_from_q_cartesian,
         maths.wrap_to_pi,
+        _inv_kin_saddle,
     ),
 }
 
@@ -19,6 +19,8 @@ def forward_kinematics_transforms(
         - Transforms from base to links. Transforms first axis is (n_links,).
         - Updated system object with updated `transform2` and `transform` fields.
     """
+    if sys.scan_mode == "levels":
+        return _forward_kinematics_transforms_levels(sys, q)
 
     eps_to_l = {-1: base.Transform.zero()}
 
@@ -42,6 +44,27 @@ def forward_kinematics_transforms(
     return (eps_to_l_trafos, sys)
 
 
+def _forward_kinematics_transforms_levels(
+    sys: base.System, q: jax.Array
+) -> Tuple[base.Transform, base.System]:
+    def joint_transforms(joint_type: str, q, link):
+        transform2 = jcalc.jcalc_transform(joint_type, q, link.joint_params)
+        transform = algebra.transform_mul(transform2, link.transform1)
+        return transform2, transform
+
+    # the joint transforms do not depend on the tree, only the accumulation does
+    transform2, transform = sys.map_types(joint_transforms, "ql", q, sys.links)
+
+    def update_eps_to_l(eps_to_p, _, transform):
+        return algebra.transform_mul(transform, eps_to_p)
+
+    eps_to_l_trafos = sys.scan_levels(
+        update_eps_to_l, base.Transform.zero(), "l", transform
+    )
+    links = sys.links.replace(transform=transform, transform2=transform2)
+    return (eps_to_l_trafos, sys.replace(links=links))
+
+
 def forward_kinematics(
     sys: base.System, state: base.State
 ) -> Tuple[base.System, base.State]:
@@ -62,11 +85,7 @@ def inverse_kinematics(
     x = state.x
     q = []
 
-    def f(_, __, i: int, x_i: base.Transform, link_i: base.Link, p: int, typ: str):
-        if p == -1:
-            x_p = base.Transform.zero()
-        else:
-            x_p = x[p]
+    def inv_kin(x_i: base.Transform, x_p: base.Transform, link_i: base.Link, typ: str):
         joint_params = jcalc._limit_scope_of_joint_params(typ, link_i.joint_params)
         transform_p_to_i = algebra.transform_mul(x_i, algebra.transform_inv(x_p))
         transform2 = algebra.transform_mul(
@@ -78,7 +97,25 @@ def inverse_kinematics(
                 f"Please specify for the custom joint `{typ}`"
                 " the JointModel.inv_kin field."
             )
-        q.append(inv_kin_link(transform2, joint_params))
+        return inv_kin_link(transform2, joint_params)
+
+    if sys.scan_mode == "levels":
+        # the worldbody is appended as last row, such that the parent -1 selects it
+        x_ext = x.concatenate(base.Transform.zero((1,)))
+        x_p = x_ext[jnp.array(sys.link_parents)]
+        q = sys.map_types(
+            lambda typ, *args: inv_kin(*args, typ),
+            "lll",
+            x,
+            x_p,
+            sys.links,
+            out_type="q",
+        )
+        return state.replace(q=q)
+
+    def f(_, __, i: int, x_i: base.Transform, link_i: base.Link, p: int, typ: str):
+        x_p = base.Transform.zero() if p == -1 else x[p]
+        q.append(inv_kin(x_i, x_p, link_i, typ))
 
     sys.scan(
         f,
@@ -97,6 +134,23 @@ def inverse_kinematics(
     return state.replace(q=q)
 
 
+def inverse_kinematics_xs(sys: base.System, xs: base.Transform) -> jax.Array:
+    """Vectorised `inverse_kinematics` of a time series of maximal coordinates,
+    e.g. to retarget a whole trial. Uses the `JointModel.inv_kin` of every joint,
+    no iterative solver is involved.
+
+    Args:
+        sys (base.System): System under consideration.
+        xs (base.Transform): Transforms from base to links of shape (T, n_links).
+
+    Returns:
+        jax.Array: Minimal coordinates of shape (T, q_size).
+    """
+    assert xs.ndim() == 3, "Expected `xs` of shape (T, n_links)"
+    state = base.State.create(sys)
+    return jax.vmap(lambda x: inverse_kinematics(sys, state.replace(x=x)).q)(xs)
+
+
 def inverse_kinematics_endeffector(
     sys: base.System,
     endeffector_link_name: str,
@@ -185,13 +239,13 @@ def inverse_kinematics_endeffector(
         assert len(q0) == sys.q_size()
 
     def objective(q: jax.Array) -> jax.Array:
-        q = sys.coordinate_vector_to_q(q, custom_joints)
-        xhat = forward_kinematics_transforms(sys, q)[0][
-            sys.name_to_idx(endeffector_link_name)
-        ]
-        error_rot = maths.angle_error(endeffector_x.rot, xhat.rot)
-        error_pos = jnp.sqrt(jnp.sum((endeffector_x.pos - xhat.pos) ** 2))
-        return error_weight_rot * error_rot + error_weight_pos * error_pos
+        return _endeffectors_error(
+            sys,
+            sys.coordinate_vector_to_q(q, custom_joints),
+            {endeffector_link_name: endeffector_x},
+            error_weight_rot,
+            error_weight_pos,
+        )
 
     solver = jaxopt_solver(objective, **jaxopt_solver_kwargs)
     results = solver.run(q0)
@@ -200,3 +254,127 @@ def inverse_kinematics_endeffector(
     # parameters in the system object, such as sys.links.joint_params
     q_sol_value = objective(jax.lax.stop_gradient(results.params))
     return q_sol, q_sol_value, results
+
+
+def _endeffectors_error(
+    sys: base.System,
+    q: jax.Array,
+    endeffector_xs: dict[str, base.Transform],
+    error_weight_rot: float,
+    error_weight_pos: float,
+) -> jax.Array:
+    x = forward_kinematics_transforms(sys, q)[0]
+    error = 0.0
+    for name, endeffector_x in endeffector_xs.items():
+        xhat = x[sys.name_to_idx(name)]
+        error_rot = maths.angle_error(endeffector_x.rot, xhat.rot)
+        # grad-safe, the initial guess can already be the solution
+        error_pos = maths.safe_norm(endeffector_x.pos - xhat.pos)[0]
+        error += error_weight_rot * error_rot + error_weight_pos * error_pos
+    return error
+
+
+def inverse_kinematics_endeffectors(
+    sys: base.System,
+    endeffector_xs: dict[str, base.Transform],
+    error_weight_rot: float = 1.0,
+    error_weight_pos: float = 1.0,
+    q0: Optional[jax.Array] = None,
+    random_q0_starts: Optional[int] = None,
+    key: Optional[jax.Array] = None,
+    tol: float = 1e-3,
+    custom_joints: dict[str, Callable[[jax.Array], jax.Array]] = {},
+    jaxopt_solver: Solver = jaxopt.LBFGS,
+    **jaxopt_solver_kwargs,
+) -> tuple[jax.Array, jax.Array, jax.Array]:
+    """Find the minimal coordinates for a time series of desired rotational and
+    positional states of one or more endeffectors, e.g. to retarget optical motion
+    capture data.
+
+    The frames are solved sequentially (using `jax.lax.scan`) and each frame is
+    initialised with the solution of the previous frame. Only frames whose
+    residual loss is not below `tol` are re-solved from up to `random_q0_starts`
+    random initial values, one after another until one has converged. The best of
+    all solutions is kept.
+
+    Args:
+        sys (base.System): System under consideration.
+        endeffector_xs (dict[str, base.Transform]): Desired position and rotation
+            states for each endeffector link name. Transforms have a leading time
+            axis (T,). The residual loss is summed over all endeffectors.
+        error_weight_rot (float, optional): Weight of rotational error term in
+            optimized loss. Defaults to 1.0.
+        error_weight_pos (float, optional): Weight of position error term in
+            optimized loss. Defaults to 1.0.
+        q0 (Optional[jax.Array], optional): Initial minimal coordinates guess of the
+            first frame. Defaults to None.
+        random_q0_starts (Optional[int], optional): Number of random initial values
+            to try for frames that did not converge. Defaults to None.
+        key (Optional[jax.Array], optional): PRNGKey, only required if
+            `random_q0_starts` > 0. Defaults to None.
+        tol (float, optional): A frame converged if its residual loss is below
+            `tol`. Defaults to 1e-3.
+        custom_joints (dict[str, Callable[[jax.Array], jax.Array]], optional):
+            See `inverse_kinematics_endeffector`. Defaults to {}.
+        jaxopt_solver (Solver, optional): Solver to use. Defaults to jaxopt.LBFGS.
+
+    Returns:
+        tuple[jax.Array, jax.Array, jax.Array]: Minimal coordinates solutions
+            (T, q_size), residual losses (T,) and whether the frame converged (T,).
+    """
+    T = None
+    for name, endeffector_x in endeffector_xs.items():
+        assert endeffector_x.ndim() == 2, f"`{name}` requires a leading time axis"
+        T = endeffector_x.shape(axis=0) if T is None else T
+        assert endeffector_x.shape(axis=0) == T, "All endeffectors need same length"
+
+    if random_q0_starts is not None:
+        assert key is not None, "`random_q0_starts` requires `key`"
+    else:
+        key = jax.random.PRNGKey(0)
+
+    if q0 is None:
+        q0 = base.State.create(sys).q
+    assert len(q0) == sys.q_size()
+
+    def solve(q0: jax.Array, xs: dict[str, base.Transform]):
+        def objective(q: jax.Array) -> jax.Array:
+            q = sys.coordinate_vector_to_q(q, custom_joints)
+            return _endeffectors_error(sys, q, xs, error_weight_rot, error_weight_pos)
+
+        params = jaxopt_solver(objective, **jaxopt_solver_kwargs).run(q0).params
+        q_sol = sys.coordinate_vector_to_q(params, custom_joints)
+        return q_sol, objective(jax.lax.stop_gradient(params))
+
+    n_restarts = 0 if random_q0_starts is None else random_q0_starts
+
+    def step(carry, xs):
+        q_prev, key = carry
+        key, consume = jax.random.split(key)
+        q0s = jnp.concatenate(
+            (
+                q_prev[None],
+                jax.random.normal(consume, shape=(n_restarts, sys.q_size())),
+            )
+        )
+
+        # try initial values one after another until one has converged
+        def cond_fn(val):
+            i, _, value_best = val
+            return (i < len(q0s)) & ~(value_best < tol)
+
+        def body_fn(val):
+            i, q_best, value_best = val
+            q_sol, value = solve(q0s[i], xs)
+            better = value < value_best
+            q_best = jnp.where(better, q_sol, q_best)
+            value_best = jnp.where(better, value, value_best)
+            return i + 1, q_best, value_best
+
+        _, q_sol, value = jax.lax.while_loop(
+            cond_fn, body_fn, (0, q_prev, jnp.array(jnp.inf))
+        )
+        return (q_sol, key), (q_sol, value, value < tol)
+
+    _, (qs, values, converged) = jax.lax.scan(step, (q0, key), endeffector_xs)
+    return qs, values, converged
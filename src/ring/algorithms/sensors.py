@@ -3,6 +3,7 @@ from typing import Optional
 
 import jax
 import jax.numpy as jnp
+import numpy as np
 
 from ring import algebra
 from ring import algorithms
@@ -186,6 +187,7 @@ def imu(
     key: Optional[jax.random.PRNGKey] = None,
     noisy: bool = False,
     smoothen_degree: Optional[int] = None,
+    smoothen_kernel: str | np.ndarray = "uniform",
     delay: Optional[int] = None,
     random_s2s_ori: Optional[float] = None,
     quasi_physical: bool = False,
@@ -196,11 +198,19 @@ def imu(
     gyro_second_order: bool = False,
     natural_units: bool = False,
     acc_xinyuyi_n: int = 1,
+    associative_scan: bool = False,
 ) -> dict:
     """Simulates a 6D IMU, `xs` should be Transforms from eps-to-imu.
     NOTE: `smoothen_degree` is used as window size for moving average.
+    NOTE: `smoothen_kernel` replaces the moving average by another symmetric FIR
+    filter, either `gaussian`, `savgol{order}` or an array of `smoothen_degree`
+    coefficients.
     NOTE: If `smoothen_degree` is given, and `delay` is not, then delay is chosen
     such moving average window is delayed to just be causal.
+    NOTE: `associative_scan` computes the `quasi_physical` simulation and the
+    low-pass filters using parallel-prefix scans instead of sequential scans. The
+    rotations are then filtered by `maths.quat_ema_lowpassfilter` instead of
+    `maths.quat_lowpassfilter`, which is a different filter (not only rounding).
     """
     assert xs.ndim() == 2
 
@@ -215,18 +225,26 @@ def imu(
         xs = jax.vmap(algebra.transform_mul, in_axes=(None, 0))(xs_s2s, xs)
 
     if quasi_physical:
-        xs = _quasi_physical_simulation(xs, dt)
+        xs = _quasi_physical_simulation(xs, dt, associative_scan)
 
     if low_pass_filter_pos_f_cutoff is not None:
         xs = xs.replace(
             pos=_butterworth(
-                xs.pos, f_sampling=1 / dt, f_cutoff=low_pass_filter_pos_f_cutoff
+                xs.pos,
+                f_sampling=1 / dt,
+                f_cutoff=low_pass_filter_pos_f_cutoff,
+                associative_scan=associative_scan,
             )
         )
 
     if low_pass_filter_rot_cutoff is not None:
+        quat_lpf = (
+            maths.quat_ema_lowpassfilter
+            if associative_scan
+            else maths.quat_lowpassfilter
+        )
         xs = xs.replace(
-            rot=maths.quat_lowpassfilter(
+            rot=quat_lpf(
                 xs.rot, cutoff_freq=low_pass_filter_rot_cutoff, samp_freq=1 / dt
             )
         )
@@ -245,7 +263,7 @@ def imu(
 
     if smoothen_degree is not None:
         measurements = jax.tree_map(
-            lambda arr: _moving_average(arr, smoothen_degree),
+            lambda arr: _smoothen(arr, smoothen_degree, smoothen_kernel),
             measurements,
         )
 
@@ -306,6 +324,20 @@ def rel_pose(
 
     qrel = lambda q1, q2: maths.quat_mul(q1, maths.quat_inv(q2))
 
+    if sys.scan_mode == "levels":
+        # one batched `qrel` for all links instead of one per link
+        names = [name for name, p in zip(sys.link_names, sys.link_parents) if p != -1]
+        idxs_i = [sys_xs.name_to_idx(name) for name in names]
+        idxs_p = [
+            sys_xs.name_to_idx(sys.idx_to_name(sys.link_parents[sys.name_to_idx(name)]))
+            for name in names
+        ]
+        if len(names) == 0:
+            return {}
+        rots = xs.rot
+        qrels = jax.vmap(qrel)(rots[jnp.array(idxs_p)], rots[jnp.array(idxs_i)])
+        return {name: qrels[i] for i, name in enumerate(names)}
+
     y = {}
 
     def pose_child_to_parent(_, __, name_i: str, p: int):
@@ -477,21 +509,109 @@ def _joint_axes_from_sys(sys: base.Transform, N: int) -> dict:
     return X
 
 
+# below these window sizes summing shifted copies of the signal is cheaper than the
+# blocked cumulative sum (moving average) or the fft-based convolution (fir kernels)
+_MOVING_AVERAGE_DIRECT_MAX_WINDOW = 16
+_FIR_DIRECT_MAX_WINDOW = 32
+
+
+def _pad_edges(arr: jax.Array, half_window: int) -> jax.Array:
+    "Pads `half_window` copies of the first and the last value of `arr`."
+    return jnp.concatenate(
+        (
+            jnp.repeat(arr[:1], half_window, axis=0),
+            arr,
+            jnp.repeat(arr[-1:], half_window, axis=0),
+        )
+    )
+
+
 def _moving_average(arr: jax.Array, window: int) -> jax.Array:
     "Padds with left and right values of array."
     assert window % 2 == 1
     assert window > 1, "Window size of 1 would be a no-op"
-    arr_smooth = jnp.zeros((len(arr) + window - 1,) + arr.shape[1:])
-    half_window = (window - 1) // 2
-    arr_padded = arr_smooth.at[half_window : (len(arr) + half_window)].set(arr)
-    arr_padded = arr_padded.at[:half_window].set(arr[0])
-    arr_padded = arr_padded.at[-half_window:].set(arr[-1])
+    T = len(arr)
+    arr_padded = _pad_edges(arr, (window - 1) // 2)
+
+    if window <= _MOVING_AVERAGE_DIRECT_MAX_WINDOW:
+        return sum(arr_padded[i : i + T] for i in range(window)) / window
+    return _window_sums(arr_padded, window)[:T] / window
+
+
+def _window_sums(arr: jax.Array, window: int) -> jax.Array:
+    """Sums over all windows `arr[t:t+window]` in O(T). Cumulative sums are only
+    taken within blocks of length `window`, such that (unlike a global cumulative
+    sum) the floating point error does not grow with the length of `arr`."""
+    n_blocks = -(-len(arr) // window) + 1
+    pad = n_blocks * window - len(arr)
+    arr = jnp.pad(arr, ((0, pad),) + ((0, 0),) * (arr.ndim - 1))
+    blocks = arr.reshape((n_blocks, window) + arr.shape[1:])
+    # exclusive cumulative sum within each block
+    csum = jnp.cumsum(blocks, axis=1) - blocks
+    total = csum[:, -1] + blocks[:, -1]
+    # window starting at offset r of block k = suffix of block k + prefix of block k+1
+    sums = total[:-1, None] - csum[:-1] + csum[1:]
+    return sums.reshape((-1,) + arr.shape[1:])
+
+
+def _fir_kernel(kernel: str, window: int) -> np.ndarray:
+    """Coefficients of the symmetric smoothing kernel `kernel` of length `window`.
+
+    - `uniform`: moving average
+    - `gaussian`: gaussian window with standard deviation of `window / 6`
+    - `savgol{order}`: Savitzky-Golay filter that fits a polynomial of degree
+        `order`, e.g. `savgol2`
+    """
+    assert window % 2 == 1
+    x = np.arange(window) - (window - 1) // 2
+    if kernel == "uniform":
+        coeffs = np.ones((window,))
+    elif kernel == "gaussian":
+        coeffs = np.exp(-0.5 * (x / (window / 6)) ** 2)
+    elif kernel.startswith("savgol"):
+        order = int(kernel[len("savgol") :])
+        assert order < window, "Polynomial order must be smaller than the window"
+        # least-squares polynomial fit, the smoothed value is the fit at `x = 0`
+        coeffs = np.linalg.pinv(x[:, None] ** np.arange(order + 1)[None])[0]
+    else:
+        raise NotImplementedError(f"Unknown smoothing kernel `{kernel}`")
+    return coeffs / np.sum(coeffs)
+
 
-    for i in range(-half_window, half_window + 1):
-        rolled = jnp.roll(arr_padded, i, axis=0)
-        arr_smooth += rolled
-    arr_smooth = arr_smooth / window
-    return arr_smooth[half_window : (len(arr) + half_window)]
+def _fir_filter(arr: jax.Array, kernel: np.ndarray) -> jax.Array:
+    """Filters `arr` along its first axis with the symmetric, odd-length FIR `kernel`.
+    Padds with left and right values of array."""
+    window = len(kernel)
+    assert window % 2 == 1
+    T = len(arr)
+    arr_padded = _pad_edges(arr, (window - 1) // 2)
+
+    if window <= _FIR_DIRECT_MAX_WINDOW:
+        return sum(arr_padded[i : i + T] * kernel[i] for i in range(window))
+
+    def convolve(signal):
+        return jax.scipy.signal.fftconvolve(signal, kernel[::-1], mode="valid")
+
+    shape = arr_padded.shape
+    arr_padded = arr_padded.reshape((shape[0], -1))
+    return jax.vmap(convolve, in_axes=1, out_axes=1)(arr_padded).reshape(
+        (T,) + shape[1:]
+    )
+
+
+def _smoothen(
+    arr: jax.Array, window: int, kernel: str | np.ndarray = "uniform"
+) -> jax.Array:
+    "Smoothens `arr` using the cheapest implementation for the kernel and window."
+    if isinstance(kernel, str):
+        if kernel == "uniform":
+            return _moving_average(arr, window)
+        kernel = _fir_kernel(kernel, window)
+    kernel = np.asarray(kernel)
+    assert kernel.shape == (
+        window,
+    ), f"Smoothing kernel has shape {kernel.shape} but window size is {window}"
+    return _fir_filter(arr, kernel)
 
 
 _quasi_physical_sys_str = r"""
@@ -526,11 +646,27 @@ _constants = {
 }
 
 
-def _quasi_physical_simulation(xs: base.Transform, dt: float) -> base.Transform:
+def _quasi_physical_simulation(
+    xs: base.Transform, dt: float, associative_scan: bool = False
+) -> base.Transform:
     mass = 1.0
     damp = _constants["qp_damp"]
     stif = _constants["qp_stif"]
 
+    zero_vel = jnp.zeros_like(xs.pos[0])
+    state = (xs.pos[0], zero_vel)
+    zeropoint_vel = jnp.vstack((zero_vel, jnp.diff(xs.pos, axis=0) / dt))
+
+    if associative_scan:
+        # the semi-implicit step below as linear recurrence of the state
+        # (pos, vel) with the transition matrix `A`
+        c, k = dt * damp / mass, dt * stif / mass
+        A = jnp.array([[1 - dt * k, dt * (1 - c)], [-k, 1 - c]])
+        force = (damp * zeropoint_vel + stif * xs.pos) / mass
+        bs = jnp.stack((dt**2 * force, dt * force), axis=1)
+        pos = maths.linear_recurrence(A, bs, jnp.stack(state))[:, 0]
+        return xs.replace(pos=pos)
+
     def step_dynamics(state, zeropoint):
         pos, vel = state
         zeropoint_pos, zeropoint_vel = zeropoint
@@ -540,9 +676,6 @@ def _quasi_physical_simulation(xs: base.Transform, dt: float) -> base.Transform:
         pos += dt * vel
         return (pos, vel), pos
 
-    zero_vel = jnp.zeros_like(xs.pos[0])
-    state = (xs.pos[0], zero_vel)
-    zeropoint_vel = jnp.vstack((zero_vel, jnp.diff(xs.pos, axis=0) / dt))
     zeropoint = (xs.pos, zeropoint_vel)
     _, pos = jax.lax.scan(step_dynamics, state, zeropoint)
     return xs.replace(pos=pos)
@@ -553,13 +686,17 @@ def _butterworth(
     f_sampling: float,
     f_cutoff: int,
     method: str = "forward_backward",
+    associative_scan: bool = False,
 ) -> jax.Array:
     """https://stackoverflow.com/questions/20924868/calculate-coefficients-of-2nd-order
-    -butterworth-low-pass-filter"""
+    -butterworth-low-pass-filter
+
+    With `associative_scan`, the recurrence is computed using a parallel-prefix scan
+    over the state `(y_i, y_{i-1})`, see `maths.linear_recurrence`."""
 
     if method == "forward_backward":
-        signal = _butterworth(signal, f_sampling, f_cutoff, "forward")
-        return _butterworth(signal, f_sampling, f_cutoff, "backward")
+        signal = _butterworth(signal, f_sampling, f_cutoff, "forward", associative_scan)
+        return _butterworth(signal, f_sampling, f_cutoff, "backward", associative_scan)
     elif method == "forward":
         pass
     elif method == "backward":
@@ -581,8 +718,14 @@ def _butterworth(
         y_i = b0 * x_i + b1 * x_im1 + b2 * x_im2 + a1 * y_im1 + a2 * y_im2
         return (x_i, x_im1, y_i, y_im1), y_i
 
-    init = (signal[1], signal[0]) * 2
-    signal = jax.lax.scan(f, init, signal[2:])[1]
+    if associative_scan:
+        bs = b0 * signal[2:] + b1 * signal[1:-1] + b2 * signal[:-2]
+        bs = jnp.stack((bs, jnp.zeros_like(bs)), axis=1)
+        A = jnp.array([[a1, a2], [1.0, 0.0]])
+        signal = maths.linear_recurrence(A, bs, signal[1::-1])[:, 0]
+    else:
+        init = (signal[1], signal[0]) * 2
+        signal = jax.lax.scan(f, init, signal[2:])[1]
     signal = jnp.concatenate((signal[0:1],) * 2 + (signal,))
 
     if method == "backward":
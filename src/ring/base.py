@@ -1,5 +1,6 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Callable, Optional, Sequence, Union
+from typing import Any, Callable, NamedTuple, Optional, Sequence, Union
 
 from flax import struct
 import jax
@@ -151,6 +152,7 @@ class Transform(_Base):
 @struct.dataclass
 class Motion(_Base):
     "Coordinate vector that represents a spatial motion vector in Plücker Coordinates."
+
     ang: Vector
     vel: Vector
 
@@ -176,6 +178,7 @@ class Motion(_Base):
 @struct.dataclass
 class Force(_Base):
     "Coordinate vector that represents a spatial force vector in Plücker Coordinates."
+
     ang: Vector
     vel: Vector
 
@@ -399,9 +402,121 @@ QD_WIDTHS = {
 }
 
 
+class Topology(NamedTuple):
+    """Static index tables of the kinematic tree of a `System`. Obtain using
+    `System.topology()`; it is computed once per tree and then shared by all systems
+    with identical `link_parents` and `link_types`. All arrays are read-only."""
+
+    # link-idx -> slice into `q` and `qd`
+    q_slices: tuple[slice, ...]
+    qd_slices: tuple[slice, ...]
+    q_size: int
+    qd_size: int
+    # depth of each link; links that connect to the worldbody have depth 0
+    depth: np.ndarray
+    # direct children of each link
+    children: tuple[np.ndarray, ...]
+    # all links of the subtree that starts at each link (inclusive, ascending)
+    subtrees: tuple[np.ndarray, ...]
+    # path from the root to each link (inclusive); for the leaves these are the
+    # root-to-leaf paths
+    paths: tuple[np.ndarray, ...]
+    leaves: np.ndarray
+    # `is_ancestor[i, j]` is true if link i is on the path from the root to link j
+    is_ancestor: np.ndarray
+    # qd-idx -> link-idx
+    dof_to_link: np.ndarray
+    # qd-idx -> qd-idx of the parent degree of freedom (-1 for none); the degrees of
+    # freedom of a multi-dof joint form a chain
+    dof_parents: np.ndarray
+    # (joint type, link indices) for `System.scan_levels` and `System.map_types`
+    groups_by_depth: tuple[tuple[str, np.ndarray], ...]
+    groups_by_type: tuple[tuple[str, np.ndarray], ...]
+
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    arr.setflags(write=False)
+    return arr
+
+
+@lru_cache(maxsize=256)
+def _topology(
+    link_parents: tuple[int, ...],
+    link_types: tuple[str, ...],
+    widths: tuple[tuple[int, int], ...],
+) -> Topology:
+    N = len(link_parents)
+
+    q_slices, qd_slices = [], []
+    q_idx, qd_idx = 0, 0
+    for q_width, qd_width in widths:
+        q_slices.append(slice(q_idx, q_idx + q_width))
+        qd_slices.append(slice(qd_idx, qd_idx + qd_width))
+        q_idx += q_width
+        qd_idx += qd_width
+
+    paths = {-1: []}
+
+    def path(i: int) -> list[int]:
+        if i not in paths:
+            paths[i] = path(link_parents[i]) + [i]
+        return paths[i]
+
+    paths = [path(i) for i in range(N)]
+
+    is_ancestor = np.zeros((N, N), dtype=bool)
+    for i, path in enumerate(paths):
+        is_ancestor[path, i] = True
+
+    children = [np.flatnonzero(np.array(link_parents) == i) for i in range(N)]
+
+    dof_parents = []
+    last_dof = {-1: -1}
+    for i, (_, qd_width) in enumerate(widths):
+        assert link_parents[i] < i, "Links must be ordered such that parents come first"
+        # frozen links have no degrees of freedom
+        parent_dof = last_dof[link_parents[i]]
+        for dof in range(qd_slices[i].start, qd_slices[i].stop):
+            dof_parents.append(parent_dof)
+            parent_dof = dof
+        last_dof[i] = parent_dof
+    depth = np.array([len(path) - 1 for path in paths], dtype=int)
+
+    def groups(keys) -> tuple:
+        groups = {}
+        for link_idx, key in enumerate(keys):
+            groups.setdefault(key, []).append(link_idx)
+        return tuple(
+            (key[1], _read_only(np.array(groups[key], dtype=int)))
+            for key in sorted(groups, key=lambda key: key[0])
+        )
+
+    return Topology(
+        q_slices=tuple(q_slices),
+        qd_slices=tuple(qd_slices),
+        q_size=q_idx,
+        qd_size=qd_idx,
+        depth=_read_only(depth),
+        children=tuple(_read_only(c) for c in children),
+        subtrees=tuple(_read_only(np.flatnonzero(row)) for row in is_ancestor),
+        paths=tuple(_read_only(np.array(path, dtype=int)) for path in paths),
+        leaves=_read_only(
+            np.array([i for i in range(N) if len(children[i]) == 0], dtype=int)
+        ),
+        is_ancestor=_read_only(is_ancestor),
+        dof_to_link=_read_only(
+            np.repeat(np.arange(N), [qd_width for _, qd_width in widths])
+        ),
+        dof_parents=_read_only(np.array(dof_parents, dtype=int)),
+        groups_by_depth=groups(zip(depth, link_types)),
+        groups_by_type=groups((0, typ) for typ in link_types),
+    )
+
+
 @struct.dataclass
 class System(_Base):
     "System object. Create using `System.create(path_xml)`"
+
     link_parents: list[int] = struct.field(False)
     links: Link
     link_types: list[str] = struct.field(False)
@@ -427,14 +542,36 @@ class System(_Base):
 
     omc: list[MaxCoordOMC | None] = struct.field(True, default_factory=lambda: [])
 
+    # either `sequential` or `levels`; `levels` switches the algorithms in
+    # `ring.algorithms` to their level-scheduled implementations that are built on
+    # `System.scan_levels` and `System.map_types` (compiles faster for large systems)
+    scan_mode: str = struct.field(False, default_factory=lambda: "sequential")
+
+    # either `crba` or `aba`; `crba` solves with the mass matrix of the
+    # composite-rigid-body algorithm which is O(n^3), `aba` uses the O(n)
+    # articulated-body algorithm and never forms the mass matrix
+    dynamics_method: str = struct.field(False, default_factory=lambda: "crba")
+    # either `ltdl` or `dense`; how `crba` solves with the mass matrix in `step` if
+    # `mass_mat_iters` is zero. `ltdl` factorises the mass matrix along the kinematic
+    # tree and solves only for the required right-hand side
+    mass_mat_solver: str = struct.field(False, default_factory=lambda: "ltdl")
+
     def num_links(self) -> int:
         return len(self.link_parents)
 
+    def topology(self) -> Topology:
+        "Index tables of the kinematic tree, see `Topology`. Computed lazily, cached."
+        return _topology(
+            tuple(self.link_parents),
+            tuple(self.link_types),
+            tuple((Q_WIDTHS[typ], QD_WIDTHS[typ]) for typ in self.link_types),
+        )
+
     def q_size(self) -> int:
-        return sum([Q_WIDTHS[typ] for typ in self.link_types])
+        return self.topology().q_size
 
     def qd_size(self) -> int:
-        return sum([QD_WIDTHS[typ] for typ in self.link_types])
+        return self.topology().qd_size
 
     def name_to_idx(self, name: str) -> int:
         return self.link_names.index(name)
@@ -447,14 +584,13 @@ class System(_Base):
 
     def idx_map(self, type: str) -> dict:
         "type: is either `l` or `q` or `d`"
-        dict_int_slices = {}
-
-        def f(_, idx_map, name: str, link_idx: int):
-            dict_int_slices[name] = idx_map[type](link_idx)
-
-        self.scan(f, "ll", self.link_names, list(range(self.num_links())))
-
-        return dict_int_slices
+        topology = self.topology()
+        idx_map = {
+            "l": lambda link_idx: link_idx,
+            "q": lambda link_idx: topology.q_slices[link_idx],
+            "d": lambda link_idx: topology.qd_slices[link_idx],
+        }[type]
+        return {name: idx_map(i) for i, name in enumerate(self.link_names)}
 
     def parent_name(self, name: str) -> str:
         return self.idx_to_name(self.link_parents[self.name_to_idx(name)])
@@ -618,8 +754,7 @@ class System(_Base):
         return self._bodies_indices_to_bodies_name(bodies) if names else bodies
 
     def children(self, name: str, names: bool = False) -> list[int] | list[str]:
-        p = self.name_to_idx(name)
-        bodies = [i for i in range(self.num_links()) if self.link_parents[i] == p]
+        bodies = self.topology().children[self.name_to_idx(name)].tolist()
         return bodies if (not names) else [self.idx_to_name(i) for i in bodies]
 
     def scan(self, f: Callable, in_types: str, *args, reverse: bool = False):
@@ -639,6 +774,59 @@ class System(_Base):
         """
         return _scan_sys(self, f, in_types, *args, reverse=reverse)
 
+    def scan_levels(
+        self,
+        f: Callable,
+        init: Any,
+        in_types: str,
+        *args,
+        reverse: bool = False,
+        out_type: str = "l",
+    ):
+        """Level-scheduled variant of `scan`. Links are grouped by their depth in the
+        tree and by their joint type, and `f` is `jax.vmap`-ed over each group. So,
+        the number of traced operations scales with the number of groups instead of
+        the number of links.
+
+        Args:
+            f (Callable): Function for a single link. Receives the static joint type
+                of the link as second argument.
+                If not `reverse`: f(y_parent, link_type, *args) -> y
+                If `reverse`: f(y_children, link_type, *args) -> (y, y_to_parent)
+                where `y_children` is `init` plus the sum of all `y_to_parent` of
+                the children of this link.
+            init: Value of `y_parent` for links that connect to the worldbody, or
+                the zero-element of `y_to_parent` if `reverse`.
+            in_types: string specifying the type of each input arg, see `scan`.
+                Inputs of type 'l' must be arrays (or pytrees of arrays).
+            args: Arguments passed to `f`, and split to match the link.
+            reverse (bool, optional): If `true` from leaves to root. Defaults to False.
+            out_type (str, optional): Only for `reverse`. Either 'l' or 'q' or 'd'.
+                If 'q' or 'd' then `y` must be of shape (q_width, ...) or
+                (qd_width, ...) and the outputs are concatenated accordingly.
+
+        Returns:
+            ys: Stacked output y of f.
+        """
+        return _scan_sys_levels(
+            self, f, init, in_types, *args, reverse=reverse, out_type=out_type
+        )
+
+    def map_types(self, f: Callable, in_types: str, *args, out_type: str = "l"):
+        """Maps `f` over all links where links are grouped by their joint type and
+        `f` is `jax.vmap`-ed over each group.
+
+        Args:
+            f (Callable): f(link_type, *args) -> y
+            in_types: string specifying the type of each input arg, see `scan`.
+            args: Arguments passed to `f`, and split to match the link.
+            out_type (str, optional): Either 'l' or 'q' or 'd', see `scan_levels`.
+
+        Returns:
+            ys: Stacked or concatenated output y of f.
+        """
+        return _map_sys_types(self, f, in_types, *args, out_type=out_type)
+
     def parse(self) -> "System":
         """Initial setup of system. System object does not work unless it is parsed.
         Currently it does:
@@ -929,7 +1117,7 @@ def _parse_system_calculate_inertia(sys: System):
     return sys.scan(compute_inertia_per_link, "l", list(range(sys.num_links())))
 
 
-def _scan_sys(sys: System, f: Callable, in_types: str, *args, reverse: bool = False):
+def _check_scan_args(sys: System, in_types: str, args) -> None:
     assert len(args) == len(in_types)
     for in_type, arg in zip(in_types, args):
 
@@ -948,17 +1136,13 @@ def _scan_sys(sys: System, f: Callable, in_types: str, *args, reverse: bool = Fa
             B == B_re
         ), f"arg={arg} has a length of B={B} which isn't the required length={B_re}"
 
+
+def _scan_sys(sys: System, f: Callable, in_types: str, *args, reverse: bool = False):
+    _check_scan_args(sys, in_types, args)
+
     order = range(sys.num_links())
-    q_idx, qd_idx = 0, 0
-    q_idxs, qd_idxs = {}, {}
-    for link_idx, link_type in zip(order, sys.link_types):
-        # build map from
-        # link-idx -> q_idx
-        # link-idx -> qd_idx
-        q_idxs[link_idx] = slice(q_idx, q_idx + Q_WIDTHS[link_type])
-        qd_idxs[link_idx] = slice(qd_idx, qd_idx + QD_WIDTHS[link_type])
-        q_idx += Q_WIDTHS[link_type]
-        qd_idx += QD_WIDTHS[link_type]
+    topology = sys.topology()
+    q_idxs, qd_idxs = topology.q_slices, topology.qd_slices
 
     idx_map = {
         "l": lambda link_idx: link_idx,
@@ -982,6 +1166,107 @@ def _scan_sys(sys: System, f: Callable, in_types: str, *args, reverse: bool = Fa
     return ys
 
 
+def _group_idxs(sys: System, link_idxs: np.ndarray, in_type: str) -> np.ndarray:
+    """Indices that gather the entries of a group of links of the same joint type.
+    Shape is (n_links_group,) for 'l' and (n_links_group, q/qd_width) for 'q'/'d'."""
+    if in_type == "l":
+        return link_idxs
+    topology = sys.topology()
+    slices = topology.q_slices if in_type == "q" else topology.qd_slices
+    return np.array(
+        [np.arange(slices[i].start, slices[i].stop) for i in link_idxs], dtype=int
+    ).reshape((len(link_idxs), -1))
+
+
+def _link_arg_to_pytree(arg):
+    if isinstance(arg, list):
+        arg = np.asarray(arg)
+        assert arg.dtype.kind in "biuf", (
+            "Inputs of type `l` must be numeric for `scan_levels` and `map_types`, "
+            "the joint type is passed to `f` directly."
+        )
+    return arg
+
+
+def _take_group(sys: System, link_idxs: np.ndarray, in_types: str, args) -> list:
+    args_group = []
+    for arg, in_type in zip(args, in_types):
+        idxs = _group_idxs(sys, link_idxs, in_type)
+        args_group.append(tree_map(lambda arr: arr[idxs], _link_arg_to_pytree(arg)))
+    return args_group
+
+
+def _ungroup(
+    sys: System, ys: list, groups: Sequence[tuple[str, np.ndarray]], out_type: str
+):
+    "Inverse operation of `_take_group`; concatenates and restores the link order"
+    assert out_type in ["l", "q", "d"], f"Unknown `out_type`={out_type}"
+
+    idxs = [_group_idxs(sys, link_idxs, out_type).ravel() for _, link_idxs in groups]
+    if out_type != "l":
+        ys = [tree_map(lambda arr: arr.reshape((-1,) + arr.shape[2:]), y) for y in ys]
+    ys = tree_map(lambda *arrs: jnp.concatenate(arrs), *ys)
+    order = np.argsort(np.concatenate(idxs), kind="stable")
+    return tree_map(lambda arr: arr[order], ys)
+
+
+def _scan_sys_levels(
+    sys: System,
+    f: Callable,
+    init: Any,
+    in_types: str,
+    *args,
+    reverse: bool = False,
+    out_type: str = "l",
+):
+    _check_scan_args(sys, in_types, args)
+    assert reverse or out_type == "l", "`out_type` is only supported if `reverse`"
+
+    N = sys.num_links()
+    groups = sys.topology().groups_by_depth
+    if reverse:
+        groups = groups[::-1]
+
+    # the additional last row stands in for the worldbody, s.t. the parent index -1
+    # gathers from (scatters to) this row
+    carry = tree_map(lambda arr: jnp.repeat(jnp.asarray(arr)[None], N + 1, 0), init)
+
+    ys = []
+    for link_type, link_idxs in groups:
+        parents = np.array(sys.link_parents)[link_idxs]
+        args_group = _take_group(sys, link_idxs, in_types, args)
+        f_link = lambda y, *args_link: f(y, link_type, *args_link)  # noqa: B023
+
+        if reverse:
+            y_children = tree_map(lambda arr: arr[link_idxs], carry)
+            y, y_to_parent = jax.vmap(f_link)(y_children, *args_group)
+            carry = tree_map(lambda a, b: a.at[parents].add(b), carry, y_to_parent)
+            ys.append(y)
+        else:
+            y_parent = tree_map(lambda arr: arr[parents], carry)
+            y = jax.vmap(f_link)(y_parent, *args_group)
+            carry = tree_map(lambda a, b: a.at[link_idxs].set(b), carry, y)
+
+    if reverse:
+        return _ungroup(sys, ys, groups, out_type)
+    return tree_map(lambda arr: arr[:N], carry)
+
+
+def _map_sys_types(sys: System, f: Callable, in_types: str, *args, out_type: str):
+    _check_scan_args(sys, in_types, args)
+
+    groups = sys.topology().groups_by_type
+    ys = []
+    for link_type, link_idxs in groups:
+        args_group = _take_group(sys, link_idxs, in_types, args)
+        ys.append(
+            jax.vmap(lambda *args_link: f(link_type, *args_link))(  # noqa: B023
+                *args_group
+            )
+        )
+    return _ungroup(sys, ys, groups, out_type)
+
+
 @struct.dataclass
 class State(_Base):
     """The static and dynamic state of a system in minimal and maximal coordinates.
@@ -1,4 +1,5 @@
 from functools import partial
+from typing import Optional
 
 import jax
 from jax import custom_jvp
@@ -331,6 +332,33 @@ def quat_avg(qs: jax.Array):
     )[1][:, -1]
 
 
+def linear_recurrence(A: jax.Array, bs: jax.Array, s0: jax.Array) -> jax.Array:
+    """Computes the states `s_k = A @ s_{k-1} + b_k` for k = 1, ..., T using a
+    parallel-prefix (associative) scan, i.e. in O(log T) sequential steps.
+
+    Args:
+        A: Transition matrix of shape (n, n).
+        bs: Inputs `b_1, ..., b_T` of shape (T, n, ...).
+        s0: Initial state of shape (n, ...).
+
+    Returns:
+        jax.Array: The states `s_1, ..., s_T` of shape (T, n, ...).
+    """
+    T, n = bs.shape[:2]
+    batch_shape = bs.shape[2:]
+    bs = bs.reshape((T, n, -1))
+    bs = bs.at[0].add(A @ s0.reshape((n, -1)))
+    As = jnp.broadcast_to(A, (T, n, n))
+
+    def combine(earlier, later):
+        A1, b1 = earlier
+        A2, b2 = later
+        return A2 @ A1, A2 @ b1 + b2
+
+    _, ss = jax.lax.associative_scan(combine, (As, bs))
+    return ss.reshape((T, n) + batch_shape)
+
+
 # cutoff_freq=20.0; sampe_freq=100.0
 # -> alpha = 0.55686
 # cutoff_freq=15.0
@@ -340,17 +368,26 @@ def quat_lowpassfilter(
     cutoff_freq: float = 20.0,
     samp_freq: float = 100.0,
     filtfilt: bool = False,
+    q_init: Optional[jax.Array] = None,
 ) -> jax.Array:
+    """First-order low-pass filter of the quaternions `qs`, every step rotates the
+    filter state by the fraction `alpha` of the remaining error rotation.
+
+    The filter state starts at `qs[0]`, or at `q_init` if given which then is the
+    filtered quaternion before `qs[0]`. This allows to filter a stream of
+    quaternions chunk by chunk by passing the last filtered quaternion as `q_init`.
+    See `quat_ema_lowpassfilter` for a parallel approximation.
+    """
     assert qs.ndim == 2
     assert qs.shape[1] == 4
+    assert q_init is None or not filtfilt, "`q_init` requires `filtfilt` = False"
 
     if filtfilt:
         qs = quat_lowpassfilter(qs, cutoff_freq, samp_freq, filtfilt=False)
         qs = quat_lowpassfilter(jnp.flip(qs, 0), cutoff_freq, samp_freq, filtfilt=False)
         return jnp.flip(qs, 0)
 
-    omega_times_Ts = 2 * jnp.pi * cutoff_freq / samp_freq
-    alpha = omega_times_Ts / (1 + omega_times_Ts)
+    alpha = _quat_lowpassfilter_alpha(cutoff_freq, samp_freq)
 
     def f(y, x):
         # error quaternion; current state -> target
@@ -371,15 +408,54 @@ def quat_lowpassfilter(
         y = quat_mul(q_err_scaled, y)
         return y, y
 
-    qs_filtered = jax.lax.scan(f, qs[0], qs[1:])[1]
-
-    # padd with first value, such that length remains equal
-    qs_filtered = jnp.vstack((qs[0:1], qs_filtered))
+    if q_init is None:
+        qs_filtered = jax.lax.scan(f, qs[0], qs[1:])[1]
+        # padd with first value, such that length remains equal
+        qs_filtered = jnp.vstack((qs[0:1], qs_filtered))
+    else:
+        qs_filtered = jax.lax.scan(f, q_init, qs)[1]
 
     # renormalize due to float32 numerical errors accumulating
     return qs_filtered / jnp.linalg.norm(qs_filtered, axis=-1, keepdims=True)
 
 
+def _quat_lowpassfilter_alpha(cutoff_freq: float, samp_freq: float) -> float:
+    omega_times_Ts = 2 * jnp.pi * cutoff_freq / samp_freq
+    return omega_times_Ts / (1 + omega_times_Ts)
+
+
+def quat_ema_lowpassfilter(
+    qs: jax.Array,
+    cutoff_freq: float = 20.0,
+    samp_freq: float = 100.0,
+    filtfilt: bool = False,
+) -> jax.Array:
+    """Exponential moving average of the (hemisphere-aligned) quaternions `qs`,
+    computed using `linear_recurrence` with O(log T) sequential steps. This is a
+    different filter than `quat_lowpassfilter` with the same `alpha`, it only
+    agrees with it up to second order in the step-wise rotation angle."""
+    assert qs.ndim == 2
+    assert qs.shape[1] == 4
+
+    if filtfilt:
+        qs = quat_ema_lowpassfilter(qs, cutoff_freq, samp_freq, filtfilt=False)
+        qs = quat_ema_lowpassfilter(
+            jnp.flip(qs, 0), cutoff_freq, samp_freq, filtfilt=False
+        )
+        return jnp.flip(qs, 0)
+
+    alpha = _quat_lowpassfilter_alpha(cutoff_freq, samp_freq)
+    # `q` and `-q` are the same rotation, so flip signs such that consecutive
+    # quaternions are in the same hemisphere
+    dots = jnp.sum(qs[1:] * qs[:-1], axis=-1)
+    signs = jnp.cumprod(jnp.where(dots < 0, -1.0, 1.0))
+    qs = qs.at[1:].multiply(signs[:, None])
+    A = jnp.array([[1.0]]) * (1 - alpha)
+    qs_filtered = linear_recurrence(A, alpha * qs[1:, None], qs[0:1])[:, 0]
+    qs_filtered = jnp.vstack((qs[0:1], qs_filtered))
+    return qs_filtered / jnp.linalg.norm(qs_filtered, axis=-1, keepdims=True)
+
+
 def quat_inclinationAngle(q: jax.Array):
     head, incl = quat_project(q, jnp.array([0.0, 0, 1]))
     return quat_angle(incl)
@@ -4,6 +4,7 @@ from . import ml_utils
 from . import optimizer
 from . import ringnet
 from . import rnno_v1
+from . import serving
 from . import train
 from . import training_loop
 from .base import AbstractFilter
@@ -11,6 +12,7 @@ from .ml_utils import on_cluster
 from .ml_utils import unique_id
 from .optimizer import make_optimizer
 from .ringnet import RING
+from .serving import InferenceEngine
 from .train import train_fn
 
 _LPF_CUTOFF_FREQ = 10.0
@@ -46,6 +46,34 @@ class AbstractFilter(ABC):
         else:
             return self._apply_unbatched(X, params, state, y, lam)
 
+    def step(self, x, params=None, state=None, y=None, lam=None):
+        """Online inference of a single timestep, `x.shape` = (B, N, F) or (N, F).
+        Pass the returned state to the next call. The first two calls compile
+        `apply` for a window of length one (for the initial `state` and for the
+        returned state), every further call with the same shapes has constant
+        latency. Filters that are not causal (e.g. `LPF_FilterWrapper`
+        with `filtfilt`) do not give the same result as `apply` over the sequence.
+        """
+        assert x.ndim in [2, 3]
+        if lam is not None:
+            lam = tuple(lam)
+        if "_jit_step" not in self.__dict__:
+            self._jit_step = jax.jit(self._step, static_argnames="lam")
+        return self._jit_step(x, params, state, y, lam=lam)
+
+    def _step(self, x, params, state, y, lam):
+        # add and remove the time axis
+        t_axis = x.ndim - 2
+        X, y = jax.tree_map(lambda arr: jnp.expand_dims(arr, t_axis), (x, y))
+        yhat, state = self.apply(X, params, state, y, lam)
+        return jnp.squeeze(yhat, t_axis), state
+
+    def __getstate__(self):
+        # the compiled `step` can not be pickled
+        state = self.__dict__.copy()
+        state.pop("_jit_step", None)
+        return state
+
     @property
     def name(self) -> str:
         if not hasattr(self, "_name"):
@@ -146,6 +174,12 @@ class AbstractFilterWrapper(AbstractFilter):
 
 
 class LPF_FilterWrapper(AbstractFilterWrapper):
+    """Low-pass filters the output quaternions of `filter`. With `filtfilt` the
+    filter runs forward and backward over the whole sequence. Otherwise, it is
+    causal and the state becomes `dict(filter=..., lpf=...)` where `lpf` is the last
+    filtered output, such that the filter continues seamlessly, e.g. with `step`.
+    """
+
     def __init__(
         self,
         filter: AbstractFilter,
@@ -160,6 +194,12 @@ class LPF_FilterWrapper(AbstractFilterWrapper):
         self._kwargs = dict(cutoff_freq=cutoff_freq, filtfilt=filtfilt)
         self.quiet = quiet
 
+    def init(self, bs=None, X=None, lam=None, seed: int = 1):
+        params, state = super().init(bs, X, lam, seed)
+        if not self._kwargs["filtfilt"]:
+            state = dict(filter=state, lpf=None)
+        return params, state
+
     def apply(self, X, params=None, state=None, y=None, lam=None):
         if X.ndim == 4:
             if self.samp_freq is not None:
@@ -179,26 +219,25 @@ class LPF_FilterWrapper(AbstractFilterWrapper):
         if self.samp_freq is None and not self.quiet:
             print(f"Detected the following sampling rates from `X`: {samp_freq}")
 
+        causal = not self._kwargs["filtfilt"]
+        q_init = None
+        if causal and state is not None:
+            state, q_init = state["filter"], state["lpf"]
+
         yhat, state = super().apply(X, params, state, y, lam)
 
+        def lpf(q, samp_freq, q_init):
+            return ring.maths.quat_lowpassfilter(
+                q, samp_freq=samp_freq, q_init=q_init, **self._kwargs
+            )
+
+        lpf = jax.vmap(lpf, in_axes=(1, None, 0), out_axes=1)
         if yhat.ndim == 4:
-            yhat = jax.vmap(
-                jax.vmap(
-                    lambda q, samp_freq: ring.maths.quat_lowpassfilter(
-                        q, samp_freq=samp_freq, **self._kwargs
-                    ),
-                    in_axes=(1, None),
-                    out_axes=1,
-                )
-            )(yhat, samp_freq)
-        else:
-            yhat = jax.vmap(
-                lambda q, samp_freq: ring.maths.quat_lowpassfilter(
-                    q, samp_freq=samp_freq, **self._kwargs
-                ),
-                in_axes=(1, None),
-                out_axes=1,
-            )(yhat, samp_freq)
+            lpf = jax.vmap(lpf)
+        yhat = lpf(yhat, samp_freq, q_init)
+
+        if causal:
+            state = dict(filter=state, lpf=yhat[..., -1, :, :])
         return yhat, state
 
 
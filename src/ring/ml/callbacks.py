@@ -278,6 +278,12 @@ class SaveParamsTrainingLoopCallback(training_loop.TrainingLoopCallback):
             os.system(f"rmdir {str(Path(filename).parent)}")
 
 
+class GradsStats(NamedTuple):
+    "Summary of the gradients of one chunk, see `train_fn(tbp_scan_grads_stats)`"
+    max: jax.Array
+    l2norm: jax.Array
+
+
 class LogGradsTrainingLoopCallBack(training_loop.TrainingLoopCallback):
     def __init__(
         self,
@@ -300,9 +306,12 @@ class LogGradsTrainingLoopCallBack(training_loop.TrainingLoopCallback):
     ) -> None:
         gradient_log = {}
         for i, grads_tbp in enumerate(grads):
-            grads_flat = tree_utils.batch_concat(grads_tbp, num_batch_dims=0)
-            grads_max = jnp.max(jnp.abs(grads_flat))
-            grads_norm = jnp.linalg.norm(grads_flat)
+            if isinstance(grads_tbp, GradsStats):
+                grads_max, grads_norm = grads_tbp
+            else:
+                grads_flat = tree_utils.batch_concat(grads_tbp, num_batch_dims=0)
+                grads_max = jnp.max(jnp.abs(grads_flat))
+                grads_norm = jnp.linalg.norm(grads_flat)
             if self.kill_if_larger is not None:
                 if grads_norm > self.kill_if_larger:
                     self.last_larger.append(True)
@@ -345,6 +354,33 @@ class NanKillRunCallback(training_loop.TrainingLoopCallback):
             )
 
 
+class LogNanRejectionsCallback(training_loop.TrainingLoopCallback):
+    """Logs the counts of a generator with `nan_resamples` > 0, see `NanRejections`.
+    Only the counts of samples that have finished generating are logged, such that
+    this never waits for samples that are prefetched, see `TrainingLoop`."""
+
+    def __init__(self, nan_rejections) -> None:
+        self.nan_rejections = nan_rejections
+
+    def after_training_step(
+        self,
+        i_episode: int,
+        metrices: dict,
+        params: dict,
+        grads: list[dict],
+        sample_eval: dict,
+        loggers: list[ml_utils.Logger],
+        opt_state,
+    ) -> None:
+        summary = self.nan_rejections.summary(block=False)
+        metrices.update(
+            {
+                "nan_rejection_rate": summary["rejection_rate"],
+                "nan_failed": summary["n_failed"],
+            }
+        )
+
+
 class LogEpisodeTrainingLoopCallback(training_loop.TrainingLoopCallback):
     def __init__(self, kill_after_episode: Optional[int] = None) -> None:
         self.kill_after_episode = kill_after_episode
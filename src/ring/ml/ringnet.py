@@ -1,3 +1,4 @@
+import contextlib
 from functools import partial
 from pathlib import Path
 from types import SimpleNamespace
@@ -6,10 +7,12 @@ from typing import Callable, Optional
 import haiku as hk
 import jax
 import jax.numpy as jnp
+import jmp
 import tree_utils
 
 from ring.maths import safe_normalize
 from ring.ml import base as ml_base
+from ring.utils import compile_cache
 from ring.utils import pickle_load
 
 
@@ -76,6 +79,41 @@ def _make_rnno_cell_apply_fn(
     return _rnno_cell_apply_fn
 
 
+_PRECISIONS = ["float32", "bfloat16", "float16"]
+
+
+@contextlib.contextmanager
+def _precision_policy(precision: str):
+    """Parameters and activations of the RNN cells and MLPs in `precision`. Their
+    outputs, and with it the recurrent state and the messages, and the layernorms
+    stay in float32."""
+    assert precision in _PRECISIONS, f"`precision` must be one of {_PRECISIONS}"
+    if precision == "float32":
+        yield
+        return
+
+    policy = jmp.get_policy(f"params={precision},compute={precision},output=float32")
+    with contextlib.ExitStack() as stack:
+        for cls in [StackedRNNCell, hk.nets.MLP]:
+            stack.enter_context(hk.mixed_precision.push_policy(cls, policy))
+        stack.enter_context(
+            hk.mixed_precision.push_policy(hk.LayerNorm, jmp.get_policy("float32"))
+        )
+        yield
+
+
+def _cast_params(params: dict, precision: str) -> dict:
+    "Casts pretrained float32 `params` to the parameter dtype of `_precision_policy`."
+    dtype = jnp.dtype(precision)
+
+    def cast(module_name, name, value):
+        if "layer_norm" in module_name or not jnp.issubdtype(value.dtype, jnp.floating):
+            return value
+        return value.astype(dtype)
+
+    return hk.data_structures.map(cast, params)
+
+
 def make_ring(
     lam: list[int],
     hidden_state_dim: int = 400,
@@ -87,6 +125,7 @@ def make_ring(
     link_output_normalize: bool = True,
     link_output_transform: Optional[Callable] = None,
     layernorm: bool = True,
+    precision: str = "float32",
 ) -> SimpleNamespace:
 
     if link_output_normalize:
@@ -98,6 +137,7 @@ def make_ring(
 
     @hk.without_apply_rng
     @hk.transform_with_state
+    @_with_precision_policy(precision)
     def forward(X):
         send_msg = hk.nets.MLP(
             [hidden_state_dim] * send_message_n_layers + [message_dim]
@@ -136,6 +176,17 @@ def make_ring(
     return forward
 
 
+def _with_precision_policy(precision: str):
+    def decorator(fn):
+        def _fn(*args, **kwargs):
+            with _precision_policy(precision):
+                return fn(*args, **kwargs)
+
+        return _fn
+
+    return decorator
+
+
 class StackedRNNCell(hk.Module):
     def __init__(
         self,
@@ -200,14 +251,32 @@ class RING(ml_base.AbstractFilter):
         forward_factory=make_ring,
         **kwargs,
     ):
-        "Untrained RING network"
+        """Untrained RING network. `kwargs` are passed to `forward_factory`, e.g.
+        `precision` = `bfloat16` or `float16` for mixed-precision inference with
+        `make_ring`, then also the (pretrained) `params` are cast."""
         self.forward_lam_factory = partial(forward_factory, **kwargs)
         self.params = self._load_params(params)
+        if self.params is not None and kwargs.get("precision", "float32") != "float32":
+            self.params = _cast_params(self.params, kwargs["precision"])
         self.lam = lam
         self._name = name
 
         if jit:
-            self.apply = jax.jit(self.apply, static_argnames="lam")
+            self._jit_apply()
+
+    def _jit_apply(self) -> None:
+        # `params` and `lam` might be closed over, so they are part of the key
+        self.apply = compile_cache.jit(
+            self.apply, self._cache_key, static_argnames="lam"
+        )
+
+    def _cache_key(self) -> Optional[str]:
+        try:
+            return compile_cache.make_key(
+                "RING", self.forward_lam_factory, self.params, self.lam
+            )
+        except compile_cache.Unkeyable:
+            return None
 
     def apply(self, X, params=None, state=None, y=None, lam=None):
         if lam is None:
@@ -284,5 +353,5 @@ class RING(ml_base.AbstractFilter):
     @staticmethod
     def _post_load(ringnet: "RING", jit: bool = True) -> "RING":
         if jit:
-            ringnet.apply = jax.jit(ringnet.apply, static_argnames="lam")
+            ringnet._jit_apply()
         return ringnet
@@ -0,0 +1,178 @@
+"""In-process inference engine that batches the requests of many subjects.
+
+Requests of different kinematic graphs `lam` and sequence lengths `T` are grouped
+into buckets of padded `N` and `T`. The parent array is passed as *data* and not as
+static argument, such that one compiled and vmapped call serves all graphs of a
+bucket. Padded bodies are additional roots without inputs, they neither send nor
+receive messages, so they do not change the estimates of the real bodies. Padded
+timesteps are appended, so they do not change the estimates of causal filters.
+
+Example:
+    >>> engine = ring.ml.serving.InferenceEngine(ring.RING(None, 0.01))
+    >>> with engine:
+    >>>     futures = [engine.submit(X, lam) for X, lam in requests]
+    >>>     yhats = [future.result() for future in futures]
+"""
+
+from concurrent.futures import Future
+import queue
+import threading
+import time
+from typing import Optional
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from ring.ml import base as ml_base
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def _round_up(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple
+
+
+class InferenceEngine:
+    """Batches requests `(X, lam)` with `X.shape` = (T, N, F) and runs them in one
+    vmapped call per bucket. Use `infer` for a list of requests or `submit` from
+    many threads, which returns a `Future` of the (T, N, F_out) estimate.
+
+    Args:
+        filter: The filter, e.g. `ring.RING(None, Ts)`. It must accept `lam` in
+            `apply` and is compiled by the engine, so its `nojit` version is used.
+            With a non-causal `LPF_FilterWrapper` (`filtfilt`) the estimates of the
+            last timesteps change due to the padding of `T`.
+        max_batch_size: Maximum number of requests that are collected into one
+            batch by the worker thread of `submit`.
+        max_wait: Seconds that the worker thread waits for further requests after
+            the first request of a batch.
+        T_bucket_size: `T` is padded to a multiple of this.
+    """
+
+    def __init__(
+        self,
+        filter: ml_base.AbstractFilter,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        T_bucket_size: int = 100,
+    ):
+        self.filter = filter.nojit()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.T_bucket_size = T_bucket_size
+
+        def apply(X, lam):
+            return self.filter.apply(X, lam=lam)[0]
+
+        self._apply = jax.jit(jax.vmap(apply))
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        # guards `_worker`, such that concurrent `submit`s start only one worker
+        self._lock = threading.Lock()
+        self._compiled_buckets: set[tuple[int, int, int, int]] = set()
+
+    def _bucket(self, X: np.ndarray) -> tuple[int, int, int]:
+        T, N, F = X.shape
+        return _round_up(T, self.T_bucket_size), _next_power_of_two(N), F
+
+    def infer(self, requests: list[tuple[np.ndarray, list[int]]]) -> list[np.ndarray]:
+        """Runs all `requests` batched by bucket, at most `max_batch_size` per call.
+        Returns the estimates in the order of `requests`."""
+        groups: dict[tuple[int, int, int], list[int]] = {}
+        for i, (X, lam) in enumerate(requests):
+            assert X.ndim == 3 and X.shape[1] == len(lam), f"X.shape={X.shape}"
+            groups.setdefault(self._bucket(X), []).append(i)
+
+        yhats = [None] * len(requests)
+        for (T_pad, N_pad, _), idxs in groups.items():
+            for start in range(0, len(idxs), self.max_batch_size):
+                chunk = idxs[start : start + self.max_batch_size]
+                batch = [requests[i] for i in chunk]
+                for i, yhat in zip(chunk, self._infer_bucket(batch, T_pad, N_pad)):
+                    yhats[i] = yhat
+        return yhats
+
+    def _infer_bucket(self, batch, T_pad: int, N_pad: int) -> list[np.ndarray]:
+        # the batch size is padded as well, such that only log2(max_batch_size)
+        # batch sizes are compiled
+        B = len(batch)
+        B_pad = _next_power_of_two(B)
+        F = batch[0][0].shape[-1]
+        X = np.zeros((B_pad, T_pad, N_pad, F), dtype=np.float32)
+        lam = np.full((B_pad, N_pad), -1, dtype=np.int32)
+        for b, (X_b, lam_b) in enumerate(batch):
+            X[b, : X_b.shape[0], : X_b.shape[1]] = X_b
+            lam[b, : len(lam_b)] = lam_b
+
+        self._compiled_buckets.add((B_pad, T_pad, N_pad, F))
+        yhat = np.asarray(self._apply(jnp.asarray(X), jnp.asarray(lam)))
+        return [
+            yhat[b, : X_b.shape[0], : X_b.shape[1]] for b, (X_b, _) in enumerate(batch)
+        ]
+
+    def n_compiled_buckets(self) -> int:
+        "Number of distinct (batch size, T, N, F) shapes that have been compiled."
+        return len(self._compiled_buckets)
+
+    def submit(self, X: np.ndarray, lam: list[int]) -> Future:
+        "Queues a request, the worker thread is started if it is not running."
+        with self._lock:
+            if self._worker is None:
+                self._start()
+        future = Future()
+        self._queue.put((np.asarray(X), tuple(lam), future))
+        return future
+
+    def start(self) -> None:
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        assert self._worker is None, "The engine is already running"
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        "Finishes all queued requests, then stops the worker thread."
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                break
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0.0)
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            try:
+                yhats = self.infer([(X, lam) for X, lam, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), yhat in zip(batch, yhats):
+                    future.set_result(yhat)
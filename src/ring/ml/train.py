@@ -39,28 +39,56 @@ def _build_step_fn(
     filter: ml_base.AbstractFilter,
     optimizer,
     tbp,
+    tbp_scan: bool = False,
+    tbp_scan_grads_stats: bool = False,
 ):
     """Build step function that optimizes filter parameters based on `metric_fn`.
-    `initial_state` has shape (pmap, vmap, state_dim)"""
+    `initial_state` has shape (pmap, vmap, state_dim)
+
+    If `tbp_scan`, then the entire episode (all `T/tbp` chunks including the
+    optimizer updates) is one compiled `jax.lax.scan`. If additionally
+    `tbp_scan_grads_stats`, then per chunk only the maximum and l2-norm of the
+    gradients are returned instead of the gradients themselves.
+
+    The optional `mask` of shape (B, T) marks the valid timesteps, e.g. of padded
+    sequences, only those contribute to the loss. Then `metric_fn` must not reduce
+    over the time-axis. The optimizer update of a chunk without any valid timestep
+    is skipped, since e.g. Adam would still move the parameters on zero gradients."""
 
     @partial(jax.value_and_grad, has_aux=True)
-    def loss_fn(params, state, X, y):
+    def loss_fn(params, state, X, y, mask):
         yhat, state = filter.apply(params=params, state=state, X=X)
-        # this vmap maps along batch-axis, not time-axis
-        # time-axis is handled by `metric_fn`
-        pipe = lambda q, qhat: jnp.mean(jax.vmap(metric_fn)(q, qhat))
+
+        def pipe(q, qhat):
+            # this vmap maps along batch-axis, not time-axis
+            # time-axis is handled by `metric_fn`
+            error = jax.vmap(metric_fn)(q, qhat)
+            if mask is None:
+                return jnp.mean(error)
+            assert error.ndim >= mask.ndim, (
+                f"With a `mask` of shape {mask.shape}, `metric_fn` must keep the "
+                f"time-axis, but its batched output has shape {error.shape}"
+            )
+            _mask = jnp.broadcast_to(
+                mask.reshape(mask.shape + (1,) * (error.ndim - mask.ndim)),
+                error.shape,
+            )
+            return jnp.sum(jnp.where(_mask, error, 0.0)) / jnp.maximum(
+                jnp.sum(_mask), 1
+            )
+
         error_tree = jax.tree_map(pipe, y, yhat)
         return jnp.mean(tree_utils.batch_concat(error_tree, 0)), state
 
     @partial(
         jax.pmap,
-        in_axes=(None, 0, 0, 0),
+        in_axes=(None, 0, 0, 0, 0),
         out_axes=((None, 0), None),
         axis_name="devices",
     )
-    def pmapped_loss_fn(params, state, X, y):
+    def pmapped_loss_fn(params, state, X, y, mask):
         pmean = lambda arr: jax.lax.pmean(arr, axis_name="devices")
-        (loss, state), grads = loss_fn(params, state, X, y)
+        (loss, state), grads = loss_fn(params, state, X, y, mask)
         return (pmean(loss), state), pmean(grads)
 
     @jax.jit
@@ -69,27 +97,89 @@ def _build_step_fn(
         params = optax.apply_updates(params, updates)
         return params, opt_state
 
+    @partial(
+        jax.pmap,
+        in_axes=(None, None, 0, 0, 0, 0),
+        out_axes=(None, None, None, None),
+        axis_name="devices",
+    )
+    def pmapped_episode_fn(params, opt_state, state, X, y, mask):
+        pmean = lambda arr: jax.lax.pmean(arr, axis_name="devices")
+        # (vmap, T, N, F) -> (n_chunks, vmap, tbp, N, F)
+        to_chunks = lambda arr: jnp.moveaxis(
+            arr.reshape(arr.shape[:1] + (-1, tbp) + arr.shape[2:]), 1, 0
+        )
+
+        def chunk_fn(carry, Xy_tbp):
+            params, opt_state, state = carry
+            (loss, state), grads = loss_fn(params, state, *Xy_tbp)
+            loss, grads = pmean(loss), pmean(grads)
+            state = jax.lax.stop_gradient(state)
+            updates, new_opt_state = optimizer.update(grads, opt_state, params)
+            new_params = optax.apply_updates(params, updates)
+            mask_tbp = Xy_tbp[2]
+            if mask_tbp is None:
+                params, opt_state = new_params, new_opt_state
+            else:
+                skip = jax.lax.pmax(jnp.sum(mask_tbp), "devices") == 0
+                params, opt_state = jax.tree_map(
+                    lambda old, new: jnp.where(skip, old, new),
+                    (params, opt_state),
+                    (new_params, new_opt_state),
+                )
+            if tbp_scan_grads_stats:
+                grads_flat = tree_utils.batch_concat(grads, num_batch_dims=0)
+                grads = ml_callbacks.GradsStats(
+                    jnp.max(jnp.abs(grads_flat)), jnp.linalg.norm(grads_flat)
+                )
+            return (params, opt_state, state), (loss, grads)
+
+        (params, opt_state, _), (losses, grads) = jax.lax.scan(
+            chunk_fn,
+            (params, opt_state, state),
+            jax.tree_map(to_chunks, (X, y, mask)),
+        )
+        return params, opt_state, losses[-1], grads
+
     initial_state = None
 
-    def step_fn(params, opt_state, X, y):
+    def step_fn(params, opt_state, X, y, mask=None):
         assert X.ndim == y.ndim == 4
         B, T, N, F = X.shape
+        assert mask is None or mask.shape == (B, T), f"mask.shape={mask.shape}"
         pmap_size, vmap_size = distribute_batchsize(B)
 
         nonlocal initial_state
         if initial_state is None:
             initial_state = expand_batchsize(filter.init(B, X)[1], pmap_size, vmap_size)
 
-        X, y = expand_batchsize((X, y), pmap_size, vmap_size)
+        X, y, mask = expand_batchsize((X, y, mask), pmap_size, vmap_size)
+
+        if tbp_scan:
+            assert T % tbp == 0, f"`tbp`={tbp} must divide the sequence length T={T}"
+            params, opt_state, loss, grads = pmapped_episode_fn(
+                params, opt_state, initial_state, X, y, mask
+            )
+            n_chunks = T // tbp
+            debug_grads = [jax.tree_map(lambda a: a[i], grads) for i in range(n_chunks)]
+            return params, opt_state, {"loss": loss}, debug_grads
 
         state = initial_state
         debug_grads = []
+        n_chunks = int(T / tbp)
+        masks = [None] * n_chunks
+        if mask is not None:
+            masks = list(tree_utils.tree_split(mask, n_chunks, axis=-1))
         for i, (X_tbp, y_tbp) in enumerate(
-            tree_utils.tree_split((X, y), int(T / tbp), axis=-3)
+            tree_utils.tree_split((X, y), n_chunks, axis=-3)
         ):
-            (loss, state), grads = pmapped_loss_fn(params, state, X_tbp, y_tbp)
+            (loss, state), grads = pmapped_loss_fn(
+                params, state, X_tbp, y_tbp, masks[i]
+            )
             debug_grads.append(grads)
             state = jax.lax.stop_gradient(state)
+            if masks[i] is not None and not jnp.any(masks[i]):
+                continue
             params, opt_state = apply_grads(grads, params, opt_state)
 
         return params, opt_state, {"loss": loss}, debug_grads
@@ -119,6 +209,10 @@ def train_fn(
     loss_fn: LOSS_FN = _default_loss_fn,
     metrices: Optional[METRICES] = _default_metrices,
     link_names: Optional[list[str]] = None,
+    prefetch: int = 0,
+    prefetch_device=None,
+    tbp_scan: bool = False,
+    tbp_scan_grads_stats: bool = False,
 ) -> bool:
     """Trains RNNO
 
@@ -136,6 +230,16 @@ def train_fn(
         initial_params: If given uses as initial parameters.
         key_network: PRNG Key that inits the network state and parameters.
         key_generator: PRNG Key that inits the data stream of the generator.
+        prefetch: Number of samples that are generated in a background thread in
+            advance. Overlaps the sample generation with the training step. The
+            queue-starvation metrices are logged. Zero disables prefetching.
+        prefetch_device: Device (or sharding) the prefetched samples are moved to.
+        tbp_scan: If set, one episode of truncated backpropagation is a single
+            compiled `lax.scan` over the chunks with the optimizer update inside.
+            Requires that `tbp` divides the sequence length.
+        tbp_scan_grads_stats: Only with `tbp_scan`. Then only the max and l2-norm of
+            the gradients of each chunk are returned (and logged) instead of the
+            gradients themselves.
 
     Returns: bool
         Wether or not the training run was killed by a callback.
@@ -153,7 +257,7 @@ def train_fn(
         filter_params = filter.search_attr("params")
 
     if filter_params is None:
-        X, _ = generator(jax.random.PRNGKey(1))
+        X = generator(jax.random.PRNGKey(1))[0]
         filter_params, _ = filter.init(X=X, seed=seed_network)
         del X
 
@@ -165,6 +269,8 @@ def train_fn(
         filter,
         optimizer,
         tbp=tbp,
+        tbp_scan=tbp_scan,
+        tbp_scan_grads_stats=tbp_scan_grads_stats,
     )
 
     default_callbacks = []
@@ -192,6 +298,12 @@ def train_fn(
     if callback_kill_if_nan:
         default_callbacks.append(ml_callbacks.NanKillRunCallback())
 
+    # generators from `RCMG.to_lazy_gen(..., nan_resamples=...)`
+    if getattr(generator, "nan_rejections", None) is not None:
+        default_callbacks.append(
+            ml_callbacks.LogNanRejectionsCallback(generator.nan_rejections)
+        )
+
     # always log, because we also want `i_epsiode` to be logged in wandb
     default_callbacks.append(
         ml_callbacks.LogEpisodeTrainingLoopCallback(callback_kill_after_episode)
@@ -240,6 +352,8 @@ def train_fn(
         step_fn,
         loggers=loggers,
         callbacks=callbacks_all,
+        prefetch=prefetch,
+        prefetch_device=prefetch_device,
     )
 
     return loop.run(n_episodes)
@@ -1,5 +1,8 @@
+import queue
 import random
-from typing import Optional
+import threading
+import time
+from typing import Any, Optional
 
 import jax
 from ring.algorithms import Generator
@@ -37,6 +40,98 @@ class TrainingLoopCallback:
         pass
 
 
+class GeneratorPrefetcher:
+    """Calls the generator in a background thread, such that the generation of the
+    next samples overlaps with the training step on the device.
+
+    Keys are submitted with `submit` and the samples are returned by `get` in the
+    same order, so the data stream is identical to calling the generator directly.
+
+    Args:
+        generator: Any `Generator`, e.g. from `RCMG.to_lazy_gen`,
+            `RCMG.eager_gen_from_list` or `utils.dataloader.make_generator`.
+        queue_depth: Maximum number of samples that are generated in advance.
+        device: If given, samples are moved to this device (or sharding) in the
+            background thread using `jax.device_put`.
+    """
+
+    def __init__(self, generator: Generator, queue_depth: int = 2, device=None):
+        assert queue_depth >= 1, f"`queue_depth` must be >= 1, got {queue_depth}"
+        self._generator = generator
+        self._device = device
+        self._keys = queue.Queue()
+        self._samples = queue.Queue(maxsize=queue_depth)
+        self._stop = threading.Event()
+        self._reset_metrices()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            key = self._keys.get()
+            if key is None:
+                break
+            try:
+                sample = self._generator(key)
+                if self._device is not None:
+                    sample = jax.device_put(sample, self._device)
+                self._put((sample, None))
+            except Exception as e:
+                self._put((None, e))
+
+    def _put(self, item) -> None:
+        # with a timeout, such that a full queue does not block `close`
+        while not self._stop.is_set():
+            try:
+                self._samples.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def submit(self, key: jax.Array) -> None:
+        self._keys.put(key)
+
+    def get(self) -> Any:
+        "Returns the sample of the oldest submitted key. Blocks if not ready yet."
+        queue_size = self._samples.qsize()
+        t0 = time.time()
+        sample, exception = self._samples.get()
+        wait_time = time.time() - t0
+        if exception is not None:
+            raise exception
+
+        self._n_gets += 1
+        self._n_starved += int(queue_size == 0)
+        self._wait_time += wait_time
+        self._queue_size += queue_size
+        return sample
+
+    def _reset_metrices(self) -> None:
+        self._n_gets, self._n_starved, self._wait_time, self._queue_size = 0, 0, 0.0, 0
+
+    def metrices(self, reset: bool = True) -> dict:
+        """Queue-starvation metrices averaged over all `get` calls since the last
+        reset. `prefetch_starved` is the fraction of calls that found the queue empty
+        and `prefetch_wait_time` the average blocking time in seconds."""
+        n = max(self._n_gets, 1)
+        metrices = dict(
+            prefetch_starved=self._n_starved / n,
+            prefetch_wait_time=self._wait_time / n,
+            prefetch_queue_size=self._queue_size / n,
+        )
+        if reset:
+            self._reset_metrices()
+        return metrices
+
+    def close(self) -> None:
+        "Stops the background thread and releases the samples generated in advance."
+        self._stop.set()
+        self._keys.put(None)
+        self._thread.join()
+        while not self._samples.empty():
+            self._samples.get_nowait()
+
+
 class TrainingLoop:
     def __init__(
         self,
@@ -48,6 +143,8 @@ class TrainingLoop:
         loggers: list[ml_utils.Logger],
         callbacks: list[TrainingLoopCallback] = [],
         cycle_seed: Optional[int] = None,
+        prefetch: int = 0,
+        prefetch_device=None,
     ):
         self._key = key
         self.i_episode = -1
@@ -68,10 +165,22 @@ class TrainingLoop:
         for logger in loggers:
             logger.log(dict(n_params=logger.n_params(params), batchsize=batchsize, T=T))
 
+        self._prefetcher = None
+        if prefetch > 0:
+            self._prefetcher = GeneratorPrefetcher(generator, prefetch, prefetch_device)
+            # the sample of episode `i` is generated with the key of episode `i`
+            # like without prefetching, just up to `prefetch` episodes in advance
+            for i_episode in range(prefetch):
+                self._prefetcher.submit(self._get_key(i_episode))
+            self._i_episode_submitted = prefetch - 1
+
     @property
     def key(self):
+        return self._get_key(self.i_episode)
+
+    def _get_key(self, i_episode: int):
         if self._seeds is not None:
-            seed_idx = self.i_episode % len(self._seeds)
+            seed_idx = i_episode % len(self._seeds)
             if seed_idx == 0:
                 random.shuffle(self._seeds)
             return jax.random.PRNGKey(self._seeds[seed_idx])
@@ -98,14 +207,22 @@ class TrainingLoop:
         self.i_episode += 1
 
         sample_train = self._sample_eval
-        self._sample_eval = self._generator(self.key)
+        if self._prefetcher is None:
+            self._sample_eval = self._generator(self.key)
+        else:
+            self._sample_eval = self._prefetcher.get()
+            self._i_episode_submitted += 1
+            self._prefetcher.submit(self._get_key(self._i_episode_submitted))
 
+        # `sample_train` is `(X, y)` or `(X, y, mask)`
         self._params, self._opt_state, loss, debug_grads = self._step_fn(
-            self._params, self._opt_state, sample_train[0], sample_train[1]
+            self._params, self._opt_state, *sample_train
         )
 
         metrices = {}
         metrices.update(loss)
+        if self._prefetcher is not None:
+            metrices.update(self._prefetcher.metrices())
 
         for callback in self._callbacks:
             callback.after_training_step(
@@ -124,6 +241,9 @@ class TrainingLoop:
         return metrices
 
     def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+
         for callback in self._callbacks:
             callback.close()
 
@@ -1,6 +1,7 @@
 from typing import Optional
 
 import jax.numpy as jnp
+import numpy as np
 from ring import base
 import tree_utils
 
@@ -37,41 +38,24 @@ def delete_subsystem(
         link_name in sys.link_names
     ), f"link {link_name} not found in {sys.link_names}"
 
-    subsys = _find_subsystem_indices(sys.link_parents, sys.name_to_idx(link_name))
+    topology = sys.topology()
+    subsys = topology.subtrees[sys.name_to_idx(link_name)].tolist()
     idx_map, keep = _idx_map_and_keepers(sys.link_parents, subsys)
 
     def take(list):
         return [ele for i, ele in enumerate(list) if i in keep]
 
-    d, a, ss, sz = [], [], [], []
-
-    def filter_arrays(_, __, damp, arma, stiff, zero, i: int):
-        if i in keep:
-            d.append(damp)
-            a.append(arma)
-            ss.append(stiff)
-            sz.append(zero)
-
-    sys.scan(
-        filter_arrays,
-        "dddql",
-        sys.link_damping,
-        sys.link_armature,
-        sys.link_spring_stiffness,
-        sys.link_spring_zeropoint,
-        list(range(sys.num_links())),
-    )
-
-    d, a, ss, sz = map(jnp.concatenate, (d, a, ss, sz))
+    keep_q = _slices_to_indices(take(topology.q_slices))
+    keep_d = _slices_to_indices(take(topology.qd_slices))
 
     new_sys = base.System(
         link_parents=_reindex_parent_array(sys.link_parents, subsys),
         links=tree_utils.tree_indices(sys.links, jnp.array(keep, dtype=int)),
         link_types=take(sys.link_types),
-        link_damping=d,
-        link_armature=a,
-        link_spring_stiffness=ss,
-        link_spring_zeropoint=sz,
+        link_damping=sys.link_damping[keep_d],
+        link_armature=sys.link_armature[keep_d],
+        link_spring_stiffness=sys.link_spring_stiffness[keep_d],
+        link_spring_zeropoint=sys.link_spring_zeropoint[keep_q],
         dt=sys.dt,
         geoms=[
             geom.replace(link_idx=idx_map[geom.link_idx])
@@ -84,17 +68,16 @@ def delete_subsystem(
         link_names=take(sys.link_names),
         model_name=sys.model_name,
         omc=take(sys.omc),
+        scan_mode=sys.scan_mode,
+        dynamics_method=sys.dynamics_method,
+        mass_mat_solver=sys.mass_mat_solver,
     )
 
     return new_sys.parse()
 
 
-def _find_subsystem_indices(parents: list[int], k: int) -> list[int]:
-    subsys = [k]
-    for i, p in enumerate(parents):
-        if p in subsys:
-            subsys.append(i)
-    return subsys
+def _slices_to_indices(slices: list[slice]) -> np.ndarray:
+    return np.array([i for s in slices for i in range(s.start, s.stop)], dtype=int)
 
 
 def _idx_map_and_keepers(parents: list[int], subsys: list[int]):
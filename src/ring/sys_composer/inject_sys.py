@@ -105,6 +105,9 @@ def inject_system(
         link_names=sys.link_names + sub_sys.link_names,
         model_name=sys.model_name,
         omc=sys.omc + sub_sys.omc,
+        scan_mode=sys.scan_mode,
+        dynamics_method=sys.dynamics_method,
+        mass_mat_solver=sys.mass_mat_solver,
     )
 
     return combined_sys.parse()
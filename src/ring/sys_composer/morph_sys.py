@@ -227,6 +227,9 @@ def morph_system(
         link_names=_permute(sys.link_names),
         model_name=sys.model_name,
         omc=_permute(sys.omc),
+        scan_mode=sys.scan_mode,
+        dynamics_method=sys.dynamics_method,
+        mass_mat_solver=sys.mass_mat_solver,
     )
 
     return morphed_system.parse()
@@ -316,22 +319,12 @@ def _permute_modify_geoms(
 
 
 def _per_link_arrays(sys: base.System):
-    d, a, ss, sz = [], [], [], []
-
-    def filter_arrays(_, __, damp, arma, stiff, zero):
-        d.append(damp)
-        a.append(arma)
-        ss.append(stiff)
-        sz.append(zero)
-
-    sys.scan(
-        filter_arrays,
-        "dddq",
-        sys.link_damping,
-        sys.link_armature,
-        sys.link_spring_stiffness,
-        sys.link_spring_zeropoint,
-    )
+    topology = sys.topology()
+    d, a, ss = [
+        [arr[s] for s in topology.qd_slices]
+        for arr in (sys.link_damping, sys.link_armature, sys.link_spring_stiffness)
+    ]
+    sz = [sys.link_spring_zeropoint[s] for s in topology.q_slices]
     return d, a, ss, sz
 
 
@@ -1,4 +1,7 @@
+from . import compile_cache
+from . import hdf5
 from . import randomize_sys
+from . import shards
 from .batchsize import batchsize_thresholds
 from .batchsize import distribute_batchsize
 from .batchsize import expand_batchsize
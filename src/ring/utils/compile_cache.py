@@ -0,0 +1,303 @@
+"""Persistent cache of compiled XLA executables.
+
+Unlike the persistent compilation cache of JAX itself, the executables are looked up
+using a key that is computed from the *inputs* of the function that is to be
+compiled (e.g. the system, the `MotionConfig` and the flags of the `RCMG`), such
+that a cache hit skips not only the compilation but also the tracing and lowering.
+
+The cache is disabled by default. Enable it with `set_cache_dir` or with the
+environment variable `RING_COMPILE_CACHE_DIR`.
+
+Example:
+    >>> ring.utils.compile_cache.set_cache_dir("~/.cache/ring")
+    >>> gen = ring.RCMG(sys).to_lazy_gen(32)
+    >>> gen(jax.random.PRNGKey(1))
+    >>> ring.utils.compile_cache.counters()
+    {'hits': 0, 'misses': 1}
+"""
+
+import dataclasses
+import functools
+import hashlib
+import importlib.metadata
+import inspect
+import os
+from pathlib import Path
+import pickle
+import types
+from typing import Callable, Optional
+import warnings
+
+import jax
+import jax.numpy as jnp
+from jax.experimental import serialize_executable
+import numpy as np
+
+from ring.utils.path import parse_path
+
+_cache_dir: Optional[str] = os.environ.get("RING_COMPILE_CACHE_DIR")
+_counters = dict(hits=0, misses=0)
+
+
+def set_cache_dir(path: Optional[str]) -> None:
+    "Enables the cache in folder `path`. Disables the cache if `path` is `None`."
+    global _cache_dir
+    _cache_dir = None if path is None else parse_path(path, mkdir=False)
+
+
+def get_cache_dir() -> Optional[str]:
+    return _cache_dir
+
+
+def counters() -> dict[str, int]:
+    """Returns the number of executables that were loaded from the cache (`hits`)
+    and that had to be compiled (`misses`)."""
+    return _counters.copy()
+
+
+def reset_counters() -> None:
+    for k in _counters:
+        _counters[k] = 0
+
+
+class Unkeyable(Exception):
+    "Raised by `make_key` if an object can not be reliably turned into a key."
+
+
+def make_key(*components) -> str:
+    """Returns a hash of `components` together with the source code of `ring`, the
+    versions of `jax` and `jaxlib` and the default backend.
+
+    `components` may contain (nested) lists, tuples and dicts of primitives,
+    numpy/jax arrays, dataclasses (e.g. `System` or `MotionConfig`), module-level
+    functions and partials thereof. A function is identified by its bytecode,
+    constants and names, and by the globals it references, e.g. the functions it
+    calls (recursively). Raises `Unkeyable` for other objects, e.g. lambdas or
+    closures.
+    """
+    h = hashlib.sha256()
+    parts = (_ring_source_hash(), _versions(), jax.default_backend(), components)
+    for part in _key_parts(parts, set()):
+        h.update(part)
+    return h.hexdigest()
+
+
+def derive_key(
+    key: Optional[str | Callable[[], Optional[str]]], *components
+) -> Optional[Callable[[], Optional[str]]]:
+    """Returns a function that computes the key of `key` (evaluated lazily if it is
+    a function) and `components`, see `make_key`. The function returns `None` if
+    `key` is `None` or if the components are `Unkeyable`."""
+    if key is None:
+        return None
+
+    def _key() -> Optional[str]:
+        _key = key() if callable(key) else key
+        if _key is None:
+            return None
+        try:
+            return make_key(_key, *components)
+        except Unkeyable:
+            return None
+
+    return _key
+
+
+@functools.lru_cache(maxsize=1)
+def _versions() -> tuple[str, ...]:
+    try:
+        return tuple(importlib.metadata.version(lib) for lib in ["jax", "jaxlib"])
+    except importlib.metadata.PackageNotFoundError as e:
+        raise Unkeyable(f"Could not determine the version of {e}")
+
+
+@functools.lru_cache(maxsize=1)
+def _ring_source_hash() -> str:
+    # covers the code of `ring` also if it is not installed, e.g. in a source
+    # checkout, and if it is edited without a version bump
+    h = hashlib.sha256()
+    root = Path(__file__).resolve().parents[1]
+    for file in sorted(root.rglob("*.py")):
+        h.update(str(file.relative_to(root)).encode())
+        h.update(file.read_bytes())
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _distribution_version(module: str) -> Optional[str]:
+    "Version of the installed distribution that provides `module`, if any."
+    top_level = module.split(".")[0]
+    for dist in importlib.metadata.packages_distributions().get(top_level, []):
+        try:
+            return f"{dist}=={importlib.metadata.version(dist)}"
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return None
+
+
+def _key_parts(obj, seen: set):
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        yield repr((type(obj).__name__, obj)).encode()
+    elif isinstance(obj, (list, tuple, frozenset)):
+        yield f"{type(obj).__name__}[{len(obj)}]".encode()
+        for ele in sorted(obj, key=repr) if isinstance(obj, frozenset) else obj:
+            yield from _key_parts(ele, seen)
+    elif isinstance(obj, dict):
+        yield f"dict[{len(obj)}]".encode()
+        for k in sorted(obj, key=repr):
+            yield from _key_parts(k, seen)
+            yield from _key_parts(obj[k], seen)
+    elif isinstance(obj, (np.ndarray, np.generic, jax.Array)):
+        arr = np.asarray(obj)
+        yield repr((arr.dtype.str, arr.shape)).encode()
+        yield np.ascontiguousarray(arr).tobytes()
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        yield type(obj).__qualname__.encode()
+        for field in dataclasses.fields(obj):
+            yield from _key_parts((field.name, getattr(obj, field.name)), seen)
+    elif isinstance(obj, functools.partial):
+        yield from _key_parts((obj.func, obj.args, obj.keywords), seen)
+    elif inspect.ismodule(obj):
+        yield f"module {obj.__name__}".encode()
+    elif inspect.isclass(obj):
+        yield f"class {obj.__module__}.{obj.__qualname__}".encode()
+    elif inspect.isfunction(obj):
+        yield from _function_parts(obj, seen)
+    elif inspect.isbuiltin(obj) or isinstance(obj, np.ufunc):
+        yield f"builtin {getattr(obj, '__module__', None)}.{obj.__name__}".encode()
+    else:
+        raise Unkeyable(f"Can not use object of type {type(obj)} as part of a key")
+
+
+def _function_parts(fn, seen: set):
+    if "<" in fn.__qualname__ or fn.__closure__ is not None:
+        raise Unkeyable(f"Can not use lambda or closure `{fn.__qualname__}` in a key")
+
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    yield f"function {name}".encode()
+    if name in seen:
+        # recursive functions
+        return
+    seen.add(name)
+
+    yield from _code_parts(fn.__code__)
+    yield from _key_parts((fn.__defaults__, fn.__kwdefaults__), seen)
+
+    # the source code of `ring` is part of every key, and other packages are
+    # identified by the version of their distribution
+    module = fn.__module__ or ""
+    if module.split(".")[0] == "ring":
+        return
+    version = _distribution_version(module)
+    if version is not None:
+        yield version.encode()
+        return
+
+    # user code, so also the globals it references are part of the key, e.g.
+    # module-level constants and the functions it calls
+    for global_name in sorted(_code_names(fn.__code__)):
+        if global_name in fn.__globals__:
+            yield from _key_parts(global_name, seen)
+            yield from _key_parts(fn.__globals__[global_name], seen)
+
+
+def _code_parts(code: types.CodeType):
+    yield code.co_code
+    yield repr(code.co_names).encode()
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            # e.g. nested functions and comprehensions
+            yield from _code_parts(const)
+        elif isinstance(const, frozenset):
+            # e.g. `x in {"a", "b"}`, the order of a frozenset is not deterministic
+            yield repr(sorted(const, key=repr)).encode()
+        else:
+            yield repr((type(const).__name__, const)).encode()
+
+
+def _code_names(code: types.CodeType) -> set[str]:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def jit(
+    fun: Callable,
+    key: Optional[str | Callable[[], Optional[str]]],
+    static_argnames: str | tuple[str, ...] = (),
+) -> Callable:
+    """Like `jax.jit` but the compiled executables are stored in and loaded from the
+    cache folder.
+
+    Args:
+        fun: Function to be compiled.
+        key: Identifies everything that `fun` depends on besides its arguments,
+            e.g. the values of closed-over constants, see `make_key`. Can also be a
+            function returning the key which is only evaluated if `fun` has to be
+            compiled for a new signature of the arguments. If `None` or if the
+            cache is disabled, then this is `jax.jit`.
+        static_argnames: Arguments that are static, must be passed as keywords.
+    """
+    if isinstance(static_argnames, str):
+        static_argnames = (static_argnames,)
+    jitted = jax.jit(fun, static_argnames=static_argnames)
+    if key is None:
+        return jitted
+
+    executables = {}
+
+    def _fun(*args, **kwargs):
+        if _cache_dir is None:
+            return jitted(*args, **kwargs)
+
+        static = {k: kwargs.pop(k) for k in static_argnames if k in kwargs}
+        flat, treedef = jax.tree_util.tree_flatten((args, kwargs))
+        signature = (
+            str(treedef),
+            tuple((np.shape(x), jnp.result_type(x).str) for x in flat),
+            tuple(sorted(static.items(), key=repr)),
+        )
+        if signature not in executables:
+            _key = key() if callable(key) else key
+            if _key is None:
+                executables[signature] = _partial_jitted(jitted, static)
+            else:
+                executables[signature] = _load_or_compile(
+                    jitted, _key, signature, static, args, kwargs
+                )
+        return executables[signature](*args, **kwargs)
+
+    return _fun
+
+
+def _partial_jitted(jitted, static: dict):
+    return lambda *args, **kwargs: jitted(*args, **kwargs, **static)
+
+
+def _load_or_compile(jitted, key: str, signature, static: dict, args, kwargs):
+    file = Path(_cache_dir).joinpath(make_key(key, repr(signature)) + ".pickle")
+
+    if file.exists():
+        try:
+            with open(file, "rb") as f:
+                compiled = serialize_executable.deserialize_and_load(*pickle.load(f))
+            _counters["hits"] += 1
+            return compiled
+        except Exception as e:
+            warnings.warn(f"Could not load cached executable {file}, recompiling: {e}")
+
+    _counters["misses"] += 1
+    compiled = jitted.lower(*args, **kwargs, **static).compile()
+    try:
+        os.makedirs(_cache_dir, exist_ok=True)
+        # write to a temporary file first, such that concurrent processes never
+        # read a partially written executable
+        tmp_file = file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump(serialize_executable.serialize(compiled), f, protocol=5)
+        os.replace(tmp_file, file)
+    except Exception as e:
+        warnings.warn(f"Could not store executable in compile cache: {e}")
+    return compiled
@@ -6,9 +6,7 @@ import jax
 import numpy as np
 from ring.utils import parse_path
 from ring.utils import pickle_load
-import torch
-from torch.utils.data import DataLoader
-from torch.utils.data import Dataset
+from ring.utils.shards import ShardReader
 import tqdm
 from tree_utils import PyTree
 
@@ -28,6 +26,8 @@ def make_generator(
         _make_gen = pytorch_generator
     elif backend == "eager":
         _make_gen = eager_generator
+    elif backend == "shards":
+        _make_gen = shards_generator
     else:
         raise NotImplementedError
 
@@ -44,7 +44,9 @@ def make_generator(
 T = PyTree[np.ndarray]
 
 
-class _Dataset(Dataset):
+# not a `torch.utils.data.Dataset`, such that only the `torch` backend requires
+# `torch`; the `DataLoader` only requires `__getitem__` and `__len__`
+class _Dataset:
     def __init__(self, *paths, transform):
 
         self.files = [self.listdir(path) for path in paths]
@@ -90,6 +92,9 @@ def pytorch_generator(
     seed: int = 1,
     **kwargs,
 ):
+    import torch
+    from torch.utils.data import DataLoader
+
     torch.manual_seed(seed)
 
     ds = _Dataset(*paths, transform=TransformTransform(transform))
@@ -132,6 +137,47 @@ def eager_generator(
     return RCMG.eager_gen_from_list(data, batch_size, shuffle=shuffle)
 
 
+def shards_generator(
+    *paths,
+    batch_size: int,
+    transform: Optional[Callable[[T], T]] = None,
+    shuffle=True,
+    seed=1,
+    mmap: bool = True,
+):
+    """Batches are read from datasets in the sharded format (see `RCMG.to_shards`)
+    using memory-mapping, so no file is unpickled per sequence. Like for the other
+    backends, the elements are lists with one pytree per path."""
+    readers = [ShardReader(path, mmap=mmap) for path in paths]
+    Ns = set([len(reader) for reader in readers])
+    assert len(Ns) == 1, f"{Ns}"
+    N = list(Ns)[0]
+    assert N >= batch_size
+
+    rng = np.random.default_rng(seed)
+    n_batches, i = N // batch_size, 0
+    permutation = np.arange(N)
+
+    def generator(_):
+        nonlocal i, permutation
+        if shuffle and i == 0:
+            permutation = rng.permutation(N)
+
+        indices = permutation[i * batch_size : (i + 1) * batch_size]
+        batch = [reader.take(indices) for reader in readers]
+        if transform is not None:
+            elements = [
+                transform(jax.tree_map(lambda a: a[b], batch), rng)
+                for b in range(batch_size)
+            ]
+            batch = jax.tree_map(lambda *a: np.stack(a), *elements)
+
+        i = (i + 1) % n_batches
+        return batch
+
+    return generator
+
+
 def pygrain_generator(
     *paths, batch_size: int, transform=None, shuffle=True, seed=1, **kwargs
 ):
@@ -5,9 +5,10 @@
 
 import collections
 from functools import partial
+import json
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from flax import struct
 import h5py
@@ -51,6 +52,132 @@ def load(
         return _loadtree(f["pytree"], indices, axis)
 
 
+class HDF5Writer:
+    """Append-mode writer of a pytree of arrays that grows along axis 0. Can be used
+    as callback of `batch.generators_eager`, such that a dataset never has to fit
+    into RAM at once.
+
+    The hdf5 datasets are resizable along axis 0 and chunked with
+    `chunk_sequences` sequences per chunk, such that reading a single sequence
+    only touches (and decompresses) a single chunk.
+
+    Args:
+        filepath: Path of the hdf5 file to create.
+        compression: Either `None`, `gzip` or `lz4`. The latter requires
+            the `hdf5plugin` package.
+        compression_opts: E.g. the compression level for `gzip`.
+        chunk_sequences: Number of sequences (entries along axis 0) per chunk.
+        overwrite: If false, errors if the file already exists.
+        resume: If true and the file already exists, continues this file from its
+            last `checkpoint`. Sequences after the checkpoint are discarded. The
+            metadata of this checkpoint is available as `checkpoint_meta`.
+
+    Example:
+        >>> with HDF5Writer("data.h5", compression="gzip") as writer:
+        >>>     batch.generators_eager(gens, n_calls, writer.append)
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        compression: Optional[str] = None,
+        compression_opts=None,
+        chunk_sequences: int = 1,
+        overwrite: bool = False,
+        resume: bool = False,
+    ):
+        self.filepath = _parse_path(filepath, hdf5_extension)
+        self._dataset_kwargs = dict(**_compression_kwargs(compression))
+        if compression_opts is not None:
+            self._dataset_kwargs["compression_opts"] = compression_opts
+        self._chunk_sequences = chunk_sequences
+        self._length = 0
+        self.checkpoint_meta: Optional[dict] = None
+
+        if resume and os.path.exists(self.filepath):
+            self._file = h5py.File(self.filepath, "a")
+            self._resume()
+        else:
+            _parse_path(self.filepath, file_exists_ok=overwrite)
+            self._file = h5py.File(self.filepath, "w")
+
+    def _resume(self) -> None:
+        attrs = self._file.attrs
+        if "checkpoint_meta" in attrs:
+            self._length = int(attrs["checkpoint_n_sequences"])
+            self.checkpoint_meta = json.loads(attrs["checkpoint_meta"])
+
+        if "pytree" not in self._file:
+            return
+
+        # discard everything after the checkpoint
+        def truncate(_, obj):
+            if isinstance(obj, h5py.Dataset):
+                obj.resize(self._length, axis=0)
+
+        self._file["pytree"].visititems(truncate)
+
+    def checkpoint(self, **meta) -> None:
+        """Records `meta` (e.g. the seed and the number of generator calls) together
+        with the current number of sequences, see `resume`. Must be JSON-serializable.
+        """
+        self._file.attrs["checkpoint_n_sequences"] = self._length
+        self._file.attrs["checkpoint_meta"] = json.dumps(meta)
+        self._file.flush()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, data: list) -> None:
+        "Appends a list of unbatched sequences, e.g. from `RCMG` callbacks."
+        if len(data) == 0:
+            return
+        self.append_batch(jax.tree_map(lambda *arrs: np.stack(arrs), *data))
+
+    def append_batch(self, tree) -> None:
+        "Appends a pytree whose leaves have a leading batch axis."
+        tree = jax.device_get(tree)
+        if "pytree" not in self._file:
+            _savetree(tree, self._file, "pytree", self._create_dataset)
+        else:
+            _appendtree(tree, self._file["pytree"])
+        self._length += jax.tree_util.tree_leaves(tree)[0].shape[0]
+        self._file.flush()
+
+    def _create_dataset(self, group, name: str, arr: np.ndarray):
+        return group.create_dataset(
+            name,
+            data=arr,
+            maxshape=(None,) + arr.shape[1:],
+            chunks=(self._chunk_sequences,) + arr.shape[1:],
+            **self._dataset_kwargs,
+        )
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _compression_kwargs(compression: Optional[str]) -> dict:
+    if compression is None or compression == "gzip":
+        return dict(compression=compression)
+    if compression == "lz4":
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ImportError(
+                "The `lz4` compression requires `hdf5plugin`, install with "
+                "`pip install hdf5plugin`"
+            )
+        return dict(hdf5plugin.LZ4())
+    raise NotImplementedError(f"Unknown compression `{compression}`")
+
+
 def _call_fn(fn):
     return fn()
 
@@ -136,27 +263,46 @@ def _is_namedtuple(x):
     return isinstance(x, tuple) and getattr(x, "_fields", None) is not None
 
 
-def _savetree(tree, group, name):
+def _create_dataset(group, name: str, arr: np.ndarray):
+    return group.create_dataset(name, data=arr)
+
+
+def _savetree(tree, group, name, create_dataset: Callable = _create_dataset):
     """Recursively save a pytree to an h5 file group."""
 
     if isinstance(tree, np.ndarray):
-        group.create_dataset(name, data=tree)
+        create_dataset(group, name, tree)
 
     else:
         subgroup = group.create_group(name)
         subgroup.attrs["type"] = type(tree).__name__
 
-        if _is_namedtuple(tree):
-            for k, subtree in tree._asdict().items():
-                _savetree(subtree, subgroup, k)
-        elif isinstance(tree, tuple) or isinstance(tree, list):
-            for k, subtree in enumerate(tree):
-                _savetree(subtree, subgroup, f"arr{k}")
-        elif isinstance(tree, dict):
-            for k, subtree in tree.items():
-                _savetree(subtree, subgroup, k)
-        else:
-            raise ValueError(f"Unrecognized type {type(tree)}")
+        for k, subtree in _named_children(tree):
+            _savetree(subtree, subgroup, k, create_dataset)
+
+
+def _named_children(tree) -> list:
+    if _is_namedtuple(tree):
+        return list(tree._asdict().items())
+    elif isinstance(tree, tuple) or isinstance(tree, list):
+        return [(f"arr{k}", subtree) for k, subtree in enumerate(tree)]
+    elif isinstance(tree, dict):
+        return list(tree.items())
+    else:
+        raise ValueError(f"Unrecognized type {type(tree)}")
+
+
+def _appendtree(tree, node):
+    """Recursively append a pytree to the (resizable) datasets of an h5 file group
+    along axis 0."""
+
+    if isinstance(tree, np.ndarray):
+        n = node.shape[0]
+        node.resize(n + tree.shape[0], axis=0)
+        node[n:] = tree
+    else:
+        for k, subtree in _named_children(tree):
+            _appendtree(subtree, node[k])
 
 
 def _loadtree(tree, indices: int | list[int] | slice | None, axis: int):
@@ -170,6 +316,9 @@ def _loadtree(tree, indices: int | list[int] | slice | None, axis: int):
         indices = sorted(indices)
 
     def func(leaf):
+        if isinstance(indices, list) and axis == 0 and leaf.chunks is not None:
+            return _load_chunk_aligned(leaf, indices)
+
         shape = leaf.shape
         selection = [slice(None)] * len(shape)
         selection[axis] = indices
@@ -180,6 +329,25 @@ def _loadtree(tree, indices: int | list[int] | slice | None, axis: int):
     return _lazy_tree_map(func, tree)
 
 
+def _load_chunk_aligned(leaf: h5py.Dataset, indices: list[int]) -> np.ndarray:
+    """Reads every chunk (along axis 0) that contains at least one of the sorted
+    `indices` exactly once as a whole and with a single slice-read, then selects
+    the rows. Chunks without requested indices are never touched."""
+    indices = np.asarray(indices, dtype=int)
+    if indices.size == 0:
+        return np.zeros((0,) + leaf.shape[1:], dtype=leaf.dtype)
+
+    chunk_size = leaf.chunks[0]
+    chunk_ids = indices // chunk_size
+    rows = []
+    for chunk_id in np.unique(chunk_ids):
+        start = chunk_id * chunk_size
+        stop = min(start + chunk_size, leaf.shape[0])
+        block = leaf[start:stop]
+        rows.append(block[indices[chunk_ids == chunk_id] - start])
+    return np.concatenate(rows)
+
+
 def _lazy_tree_map(func, leaf):
     if isinstance(leaf, h5py.Dataset):
         return func(leaf)
@@ -0,0 +1,231 @@
+"""Sharded on-disk format for datasets of pytrees of numpy arrays. A dataset is a
+folder that contains
+- `index.pickle`: the pytree structure, dtype and shape of each leaf, the shard size
+    and the number of sequences in each shard.
+- `shard{i}_leaf{j}.npy`: the j-th leaf of all sequences of the i-th shard as one
+    contiguous array with a leading sequence axis.
+
+Shards are read using memory-mapping, so random-access batches only read the
+required sequences from disk and nothing is unpickled per sequence.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import jax
+import numpy as np
+from tree_utils import PyTree
+
+from ring.utils.path import parse_path
+from ring.utils.utils import pickle_load
+from ring.utils.utils import pickle_save
+
+_INDEX_FILE = "index"
+
+
+def _leaf_file(path: str, shard: int, leaf: int) -> str:
+    return str(Path(path).joinpath(f"shard{shard}_leaf{leaf}.npy"))
+
+
+class ShardWriter:
+    """Writes sequences to the sharded format. Sequences are buffered until a shard
+    is full, the remaining sequences are written on `close`.
+
+    Args:
+        path: Folder of the dataset.
+        shard_size: Number of sequences per shard.
+        overwrite: If false, errors if the folder already contains a dataset,
+            otherwise its files are deleted.
+        resume: If true and the folder already contains a dataset, continues this
+            dataset from its last persisted `checkpoint`. Sequences after the
+            checkpoint are discarded. The metadata of this checkpoint is available
+            as `checkpoint_meta`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        shard_size: int = 1024,
+        overwrite: bool = False,
+        resume: bool = False,
+    ):
+        assert shard_size > 0
+        self.path = parse_path(path)
+        self.shard_size = shard_size
+        self._buffer: list[PyTree[np.ndarray]] = []
+        self._shard_sizes: list[int] = []
+        self._treedef = None
+        self._leaves_spec = None
+        # checkpoints that are not yet persisted, (n_sequences, meta)
+        self._checkpoints: list[tuple[int, dict]] = []
+        self._checkpoint = None
+        self.checkpoint_meta: Optional[dict] = None
+
+        index_file = parse_path(self.path, _INDEX_FILE, extension="pickle")
+        if resume and os.path.exists(index_file):
+            self._resume()
+        elif os.path.exists(index_file):
+            if not overwrite:
+                raise Exception(f"File {index_file} already exists but shouldn't")
+            # otherwise shards of a larger previous dataset would remain
+            for file in Path(self.path).glob("shard*_leaf*.npy"):
+                file.unlink()
+            os.remove(index_file)
+
+    def _resume(self) -> None:
+        index = pickle_load(Path(self.path).joinpath(_INDEX_FILE))
+        assert index["shard_size"] == self.shard_size, (
+            f"Dataset was written with `shard_size`={index['shard_size']} but "
+            f"`shard_size`={self.shard_size} is given"
+        )
+        self._treedef, self._leaves_spec = index["treedef"], index["leaves"]
+        self._checkpoint = index.get("checkpoint")
+        n_sequences = 0
+        if self._checkpoint is not None:
+            n_sequences, self.checkpoint_meta = self._checkpoint
+
+        # keep all full shards before the checkpoint, the remaining sequences before
+        # the checkpoint are moved back into the buffer
+        for shard_size in index["shard_sizes"]:
+            if shard_size != self.shard_size or len(self) + shard_size > n_sequences:
+                break
+            self._shard_sizes.append(shard_size)
+        remainder = np.arange(len(self), n_sequences)
+        if len(remainder) > 0:
+            leaves = jax.tree_util.tree_leaves(ShardReader(self.path).take(remainder))
+            self._buffer = [[leaf[i] for leaf in leaves] for i in range(len(remainder))]
+
+    def __len__(self) -> int:
+        return sum(self._shard_sizes) + len(self._buffer)
+
+    def append(self, data: list[PyTree[np.ndarray]]) -> None:
+        "Appends a list of unbatched sequences, e.g. from `RCMG` callbacks."
+        for sequence in data:
+            leaves, treedef = jax.tree_util.tree_flatten(sequence)
+            spec = [(np.asarray(leaf).dtype.str, np.shape(leaf)) for leaf in leaves]
+            if self._treedef is None:
+                self._treedef, self._leaves_spec = treedef, spec
+            assert treedef == self._treedef and spec == self._leaves_spec, (
+                "All sequences must have the same pytree structure, dtypes and shapes;"
+                f" expected {self._leaves_spec} but got {spec}"
+            )
+            self._buffer.append(leaves)
+            if len(self._buffer) == self.shard_size:
+                self._write_shard()
+
+    def checkpoint(self, **meta) -> None:
+        """Records `meta` (e.g. the seed and the number of generator calls) together
+        with the current number of sequences. It is persisted in the index once all
+        these sequences are written to disk, see `resume`."""
+        self._checkpoints.append((len(self), meta))
+        if len(self._buffer) == 0:
+            self._write_index()
+
+    def _write_shard(self) -> None:
+        shard = len(self._shard_sizes)
+        for j, leaf in enumerate(zip(*self._buffer)):
+            np.save(_leaf_file(self.path, shard, j), np.stack(leaf))
+        self._shard_sizes.append(len(self._buffer))
+        self._buffer = []
+        self._write_index()
+
+    def _write_index(self) -> None:
+        n_persisted = sum(self._shard_sizes)
+        while len(self._checkpoints) > 0 and self._checkpoints[0][0] <= n_persisted:
+            self._checkpoint = self._checkpoints.pop(0)
+
+        index = dict(
+            treedef=self._treedef,
+            leaves=self._leaves_spec,
+            shard_size=self.shard_size,
+            shard_sizes=self._shard_sizes,
+            checkpoint=self._checkpoint,
+        )
+        pickle_save(index, Path(self.path).joinpath(_INDEX_FILE), overwrite=True)
+
+    def close(self) -> None:
+        if len(self._buffer) > 0:
+            self._write_shard()
+        else:
+            self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ShardReader:
+    """Random-access reader of the sharded format.
+
+    Args:
+        path: Folder of the dataset.
+        mmap: If true (default), leaf arrays are memory-mapped, otherwise loaded.
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = parse_path(path, mkdir=False)
+        index = pickle_load(Path(self.path).joinpath(_INDEX_FILE))
+        self._treedef = index["treedef"]
+        self.shard_size = index["shard_size"]
+        self.shard_sizes = index["shard_sizes"]
+        self._mmap_mode = "r" if mmap else None
+        self._shards: dict[int, list[np.ndarray]] = {}
+        self._n_leaves = len(index["leaves"])
+        self._borders = np.cumsum([0] + self.shard_sizes)
+
+    def __len__(self) -> int:
+        return int(self._borders[-1])
+
+    def _shard(self, shard: int) -> list[np.ndarray]:
+        if shard not in self._shards:
+            self._shards[shard] = [
+                np.load(_leaf_file(self.path, shard, j), mmap_mode=self._mmap_mode)
+                for j in range(self._n_leaves)
+            ]
+        return self._shards[shard]
+
+    def __getitem__(self, idx: int) -> PyTree[np.ndarray]:
+        return jax.tree_map(lambda arr: arr[0], self.take([idx]))
+
+    def take(self, indices: list[int] | np.ndarray) -> PyTree[np.ndarray]:
+        "Returns the batched sequences `indices`; reads only these from disk."
+        indices = np.asarray(indices, dtype=int)
+        assert indices.ndim == 1
+        assert np.all((indices >= 0) & (indices < len(self))), "Index out of range"
+
+        shards = np.searchsorted(self._borders, indices, side="right") - 1
+        # read all indices of one shard at once (in ascending order), then undo the
+        # sorting
+        order = np.argsort(shards, kind="stable")
+        leaves = [[] for _ in range(self._n_leaves)]
+        for shard in np.unique(shards):
+            idxs = indices[shards == shard] - self._borders[shard]
+            for j, arr in enumerate(self._shard(int(shard))):
+                leaves[j].append(np.asarray(arr[idxs]))
+        inv_order = np.argsort(order)
+        leaves = [np.concatenate(leaf)[inv_order] for leaf in leaves]
+        return jax.tree_util.tree_unflatten(self._treedef, leaves)
+
+
+def save_shards(
+    path: str,
+    data: list[PyTree[np.ndarray]],
+    shard_size: int = 1024,
+    overwrite: bool = False,
+) -> None:
+    "Saves a list of unbatched sequences to the sharded format."
+    with ShardWriter(path, shard_size, overwrite) as writer:
+        writer.append(data)
+
+
+def load_shards(
+    path: str, indices: Optional[list[int] | np.ndarray] = None
+) -> PyTree[np.ndarray]:
+    "Loads (the `indices` of) a sharded dataset as batched pytree."
+    reader = ShardReader(path)
+    if indices is None:
+        indices = np.arange(len(reader))
+    return reader.take(indices)
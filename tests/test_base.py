@@ -85,6 +85,62 @@ def test_tree():
     np.testing.assert_array_equal(qds[-2], np.array(list(range(6, 7))))
 
 
+def test_scan_levels():
+    sys = load_ant()
+    links = np.arange(sys.num_links(), dtype=float)
+
+    @jax.jit
+    def forward(sys):
+        return sys.scan_levels(lambda y, _, link: y + link, 0.0, "l", links)
+
+    np.testing.assert_array_equal(forward(sys), np.array([0, 1, 3, 3, 7, 5, 11, 7, 15]))
+
+    @jax.jit
+    def reverse(sys):
+        def f(y, typ, link, qd):
+            y = y + link
+            return (y, qd.sum()), y
+
+        return sys.scan_levels(
+            f, 0.0, "ld", links, np.arange(sys.qd_size()), reverse=True
+        )
+
+    x, qd_sums = reverse(sys)
+    np.testing.assert_array_equal(x, np.array([36, 3, 2, 7, 4, 11, 6, 15, 8]))
+    np.testing.assert_array_equal(qd_sums, np.array([15] + list(range(6, 14))))
+
+    # one output per degree of freedom
+    qd = sys.map_types(
+        lambda typ, qd: qd * (-1 if typ == "free" else 1),
+        "d",
+        np.arange(sys.qd_size()),
+        out_type="d",
+    )
+    np.testing.assert_array_equal(qd[:6], -np.arange(6))
+    np.testing.assert_array_equal(qd[6:], np.arange(6, 14))
+
+
+def test_topology():
+    sys = load_ant()
+    topology = sys.topology()
+
+    assert topology.q_size == sys.q_size() == 15
+    assert topology.qd_size == sys.qd_size() == 14
+    assert topology.q_slices[1] == slice(7, 8)
+    assert topology.qd_slices[1] == slice(6, 7)
+    np.testing.assert_array_equal(topology.depth, [0, 1, 2, 1, 2, 1, 2, 1, 2])
+    np.testing.assert_array_equal(topology.children[0], [1, 3, 5, 7])
+    np.testing.assert_array_equal(topology.subtrees[3], [3, 4])
+    np.testing.assert_array_equal(topology.paths[8], [0, 7, 8])
+    np.testing.assert_array_equal(topology.leaves, [2, 4, 6, 8])
+    np.testing.assert_array_equal(topology.dof_to_link[5:8], [0, 1, 2])
+    assert topology.is_ancestor[0].all()
+    assert not topology.is_ancestor[1, 3]
+
+    # cached and shared between systems with the same tree
+    assert sys.replace(dt=0.1).topology() is topology
+
+
 def test_sys_idx_map():
     sys = ring.io.load_example("test_three_seg_seg2")
 
@@ -46,3 +46,158 @@ def test_inverse_dynamics_and_mass_matrix():
 def test_cor_step_fn():
     sys = ring.io.load_example("test_free")._replace_free_with_cor()
     jax.jit(ring.step)(sys, ring.State.create(sys))
+
+
+def test_scan_mode_levels():
+    for example in ["branched", "test_all_1", "test_three_seg_seg2"]:
+        sys = ring.io.load_example(example)
+        sys_levels = sys.replace(scan_mode="levels")
+        qd = jax.random.normal(jax.random.PRNGKey(1), (sys.qd_size(),))
+        qdd = jax.random.normal(jax.random.PRNGKey(2), (sys.qd_size(),))
+        state = ring.State.create(sys, qd=qd)
+        state = ring.step(sys, state)
+
+        def dynamics(sys):
+            sys, _state = ring.algorithms.forward_kinematics(sys, state)
+            return (
+                _state.x,
+                ring.algorithms.inverse_dynamics(sys, qd, qdd),
+                ring.algorithms.compute_mass_matrix(sys),
+                ring.step(sys, state),
+            )
+
+        jax.tree_map(
+            lambda a, b: np.testing.assert_allclose(a, b, atol=2e-5, rtol=1e-4),
+            dynamics(sys),
+            dynamics(sys_levels),
+        )
+
+
+def test_dynamics_method_aba():
+    for example in ["branched", "test_all_1", "test_three_seg_seg2", "test_free"]:
+        sys = ring.io.load_example(example)
+        sys = sys.replace(
+            link_damping=jax.random.uniform(
+                jax.random.PRNGKey(3), (sys.qd_size(),), maxval=5.0
+            )
+        )
+        q = sys.coordinate_vector_to_q(
+            jax.random.normal(jax.random.PRNGKey(1), (sys.q_size(),))
+        )
+        qd = jax.random.normal(jax.random.PRNGKey(2), (sys.qd_size(),))
+        tau = jax.random.normal(jax.random.PRNGKey(4), (sys.qd_size(),))
+        state = ring.State.create(sys, q=q, qd=qd)
+
+        @jax.jit
+        def qdd_and_step(sys):
+            _sys, _ = ring.algorithms.forward_kinematics(sys, state)
+            qdd = ring.algorithms.dynamics._forward_dynamics_qdd(
+                _sys, q, qd, tau, sys.dt
+            )
+            return qdd, ring.step(sys, state, tau)
+
+        qdd_crba, state_crba = qdd_and_step(sys)
+        for scan_mode in ["sequential", "levels"]:
+            qdd_aba, state_aba = qdd_and_step(
+                sys.replace(dynamics_method="aba", scan_mode=scan_mode)
+            )
+            np.testing.assert_allclose(qdd_aba, qdd_crba, atol=1e-3, rtol=1e-3)
+            np.testing.assert_allclose(state_aba.q, state_crba.q, atol=1e-5)
+            np.testing.assert_allclose(state_aba.qd, state_crba.qd, atol=1e-4)
+
+
+def test_mass_mat_solver_ltdl():
+    sys = ring.io.load_example("branched")
+    np.testing.assert_array_equal(
+        sys.topology().dof_parents, [-1, 0, 1, 2, 3, 4, 5, 5, 7, 7]
+    )
+
+    for example in ["branched", "test_all_1", "test_three_seg_seg2"]:
+        sys = ring.io.load_example(example)
+        q = sys.coordinate_vector_to_q(
+            jax.random.normal(jax.random.PRNGKey(1), (sys.q_size(),))
+        )
+        qd = jax.random.normal(jax.random.PRNGKey(2), (sys.qd_size(),))
+        tau = jax.random.normal(jax.random.PRNGKey(3), (sys.qd_size(),))
+        state = ring.State.create(sys, q=q, qd=qd)
+
+        @jax.jit
+        def forward_dynamics(sys):
+            sys, _ = ring.algorithms.forward_kinematics(sys, state)
+            qdd = ring.algorithms.dynamics._forward_dynamics_qdd(
+                sys, q, qd, tau, sys.dt
+            )
+            return qdd, ring.algorithms.forward_dynamics(sys, q, qd, tau)
+
+        assert sys.mass_mat_solver == "ltdl"
+        qdd, (qdd_public, mass_mat_inv) = forward_dynamics(sys)
+        qdd_dense, _ = forward_dynamics(sys.replace(mass_mat_solver="dense"))
+        np.testing.assert_allclose(qdd, qdd_dense, atol=1e-4, rtol=1e-4)
+        # the public `forward_dynamics` always returns the inverse of the mass matrix
+        np.testing.assert_allclose(qdd_public, qdd_dense, atol=1e-4, rtol=1e-4)
+        assert mass_mat_inv.shape == (sys.qd_size(), sys.qd_size())
+
+
+xml_str_stiff_imu = r"""
+<x_xy>
+    <options gravity="0 0 9.81" dt="0.01"/>
+    <worldbody>
+        <body name="upper" joint="ry" damping="0.1">
+            <geom type="box" mass="1" pos="0.5 0 0" dim="1 0.1 0.1"/>
+            <body name="imu" pos="1 0 0" joint="rx" damping="0.01" spring_stiff="500">
+                <geom type="box" mass="0.1" pos="0 0.1 0" dim="0.05 0.2 0.05"/>
+            </body>
+        </body>
+    </worldbody>
+</x_xy>
+"""
+
+
+def test_integration_methods(monkeypatch):
+    sys = ring.io.load_sys_from_str(xml_str_stiff_imu)
+    state = ring.State.create(sys, q=jnp.array([0.5, 0.3]))
+
+    def unroll(sys, T, n_substeps=1, max_substeps=None):
+        @jax.jit
+        def _unroll(state):
+            def body(state, _):
+                state = ring.step(sys, state, None, n_substeps, max_substeps)
+                return state, state.q
+
+            return jax.lax.scan(body, state, None, length=T)[1]
+
+        return _unroll(state)
+
+    # stiff spring of the unactuated `imu` joint, explicit integration diverges
+    assert np.all(np.isnan(unroll(sys, 100)[-1]))
+    implicit = sys.replace(integration_method="implicit_damping_euler")
+    assert np.all(np.isfinite(unroll(implicit, 100)))
+    sys_fk, _ = ring.algorithms.forward_kinematics(sys, state)
+    assert ring.algorithms.dynamics._adaptive_n_substeps(sys_fk, 1, 16) == 7
+    assert np.all(np.isfinite(unroll(sys, 100, max_substeps=16)))
+
+    # substepping is identical to stepping with smaller timestep
+    sys = sys.replace(link_spring_stiffness=sys.link_spring_stiffness * 0.01)
+    np.testing.assert_allclose(
+        unroll(sys, 10, n_substeps=4),
+        unroll(sys.replace(dt=sys.dt / 4), 40)[3::4],
+        atol=1e-6,
+    )
+
+    rk4 = sys.replace(integration_method="rk4")
+    q_ref = unroll(rk4, 50, n_substeps=20)
+    np.testing.assert_allclose(unroll(rk4, 50), q_ref, atol=1e-2)
+    assert np.max(np.abs(unroll(sys, 50) - q_ref)) > 5e-2
+
+    def explicit_euler(sys, state, taus, dt):
+        qdd, _ = ring.algorithms.forward_dynamics(sys, state.q, state.qd, taus, dt=0.0)
+        return state.replace(q=state.q + dt * state.qd, qd=state.qd + dt * qdd)
+
+    # the registry is restored after the test
+    dynamics = ring.algorithms.dynamics
+    monkeypatch.setattr(
+        dynamics, "_integration_methods", dynamics._integration_methods.copy()
+    )
+    ring.algorithms.register_integration_method("explicit_euler", explicit_euler)
+    state_next = ring.step(sys.replace(integration_method="explicit_euler"), state)
+    np.testing.assert_allclose(state_next.q, state.q)
@@ -2,11 +2,13 @@ import jax
 import jax.numpy as jnp
 import jaxopt
 import numpy as np
+import pytest
 import tree_utils as tu
 
 import ring
 from ring import base
 from ring import maths
+from ring.algorithms import custom_joints
 from ring.algorithms import jcalc
 from ring.algorithms import kinematics
 from ring.sim2real.sim2real import _checks_time_series_of_xs
@@ -94,6 +96,106 @@ def test_inv_kinematics_endeffector():
             assert solve(consume) < 1e-3
 
 
+def test_inv_kinematics_endeffectors():
+    xml = """
+<x_xy model="2D">
+    <worldbody>
+        <body name="s1" joint="ry">
+            <body name="s2" joint="px">
+                <body name="endeffector" joint="ry">
+                </body>
+            </body>
+        </body>
+    </worldbody>
+</x_xy>
+"""
+    sys = ring.io.load_sys_from_str(xml)
+    T = 30
+    t = jnp.linspace(0, 1, T)[:, None]
+    qs = jnp.concatenate((jnp.sin(t), 1.0 + t, 2 * t - 1), axis=-1)
+    xs = jax.vmap(lambda q: kinematics.forward_kinematics_transforms(sys, q)[0])(qs)
+    endeffector_xs = {
+        name: xs.take(sys.name_to_idx(name), axis=1) for name in ["s2", "endeffector"]
+    }
+
+    @jax.jit
+    def solve(q0, key):
+        return kinematics.inverse_kinematics_endeffectors(
+            sys,
+            endeffector_xs,
+            q0=q0,
+            random_q0_starts=4,
+            key=key,
+        )
+
+    qs_sol, values, converged = solve(qs[0], jax.random.PRNGKey(1))
+    assert qs_sol.shape == (T, sys.q_size())
+    assert values.shape == converged.shape == (T,)
+    assert converged.all()
+    np.testing.assert_allclose(qs_sol, qs, atol=1e-2)
+
+    # a bad initial guess of the first frame is fixed by random restarts
+    _, values, converged = solve(jnp.array([3.0, -1, 3]), jax.random.PRNGKey(1))
+    assert converged.all()
+
+
+@pytest.fixture
+def restore_joint_types():
+    "Restores the registry of joint types, which e.g. `ring.setup` changes."
+    registries = [jcalc._joint_types, base.Q_WIDTHS, base.QD_WIDTHS]
+    copies = [registry.copy() for registry in registries]
+    yield
+    for registry, copy in zip(registries, copies):
+        registry.clear()
+        registry.update(copy)
+
+
+def test_inverse_kinematics_xs_all_joint_types(restore_joint_types):
+    ring.setup(suntay_joint_kwargs=dict(sconfig=custom_joints.SuntayConfig()))
+    joint_types = [
+        "free",
+        "spherical",
+        # replaced by `cor` below, which can not be loaded from xml
+        "spherical",
+        "p3d",
+        "saddle",
+        "rr",
+        "rr_imp",
+        "suntay",
+        "rx",
+        "py",
+        "free_2d",
+        "frozen",
+    ]
+    bodies = ""
+    for i, joint_type in reversed(list(enumerate(joint_types))):
+        bodies = (
+            f'<body name="seg{i}" joint="{joint_type}" pos="0.1 0 0">{bodies}</body>'
+        )
+    sys = ring.io.load_sys_from_str(f"<x_xy><worldbody>{bodies}</worldbody></x_xy>")
+    sys = sys.change_joint_type("seg2", "cor")
+
+    T = 20
+    qs = jax.random.uniform(
+        jax.random.PRNGKey(1), (T, sys.q_size()), minval=-1.0, maxval=1.0
+    )
+    # small residual rotation of `rr_imp` and flexion of `suntay` within its range
+    qs = qs.at[:, sys.idx_map("q")["seg6"].start + 1].multiply(0.2)
+    qs = qs.at[:, sys.idx_map("q")["seg7"]].add(0.7)
+    to_q = {"rr": maths.wrap_to_pi, "rr_imp": maths.wrap_to_pi}
+    qs = jax.vmap(lambda q: sys.coordinate_vector_to_q(q, to_q))(qs)
+    fk = jax.vmap(lambda q: kinematics.forward_kinematics_transforms(sys, q)[0])
+    xs = fk(qs)
+
+    qs_inv = jax.jit(kinematics.inverse_kinematics_xs)(sys, xs)
+    assert qs_inv.shape == qs.shape
+    xs_inv = fk(qs_inv)
+    np.testing.assert_allclose(xs_inv.pos, xs.pos, atol=1e-5)
+    np.testing.assert_allclose(
+        jax.vmap(jax.vmap(maths.angle_error))(xs_inv.rot, xs.rot), 0.0, atol=1e-3
+    )
+
+
 def _preprocess_q(sys, q: jax.Array) -> jax.Array:
     # preprocess q
     # - normalize quaternions
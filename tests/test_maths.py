@@ -83,3 +83,34 @@ def test_quat_project():
     q_pri, q_res = maths.quat_project(q, axis)
     np.testing.assert_allclose(angle, maths.quat_angle(q_pri))
     np.testing.assert_allclose(jnp.array(0.0), maths.quat_angle(q_res))
+
+
+def test_linear_recurrence():
+    A = jnp.array([[0.5, -0.2], [1.0, 0.3]])
+    bs = jax.random.normal(jax.random.PRNGKey(1), (100, 2, 3))
+    s0 = jnp.ones((2, 3))
+
+    def f(s, b):
+        s = A @ s + b
+        return s, s
+
+    np.testing.assert_allclose(
+        maths.linear_recurrence(A, bs, s0), jax.lax.scan(f, s0, bs)[1], atol=1e-5
+    )
+
+
+def test_quat_ema_lowpassfilter():
+    T = 1000
+    t = jnp.arange(T) * 0.01
+    angles = jnp.stack([jnp.sin(t), 0.5 * jnp.cos(2 * t), 2 * jnp.sin(0.5 * t)], -1)
+    angles += jax.random.normal(jax.random.PRNGKey(1), angles.shape) * 0.05
+    qs = maths.quat_euler(angles)
+    # `q` and `-q` are the same rotation
+    qs = qs.at[::3].multiply(-1.0)
+
+    for filtfilt in [False, True]:
+        qs_exact = maths.quat_lowpassfilter(qs, 5.0, 100.0, filtfilt)
+        qs_ema = maths.quat_ema_lowpassfilter(qs, 5.0, 100.0, filtfilt)
+        # the filters agree up to second order in the step-wise rotation angle
+        errors = jax.vmap(maths.angle_error)(qs_exact, qs_ema)
+        assert jnp.max(jnp.abs(errors)) < 1e-3
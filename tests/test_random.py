@@ -1,8 +1,14 @@
+import warnings
+
+import jax
 from jax import random as jrand
+import jax.numpy as jnp
 import numpy as np
 import pytest
 
 import ring
+from ring.algorithms._random import _draw_knots
+from ring.algorithms._random import _PREALLOCATION_WARN_LIMIT
 from ring.algorithms._random import _resolve_range_of_motion
 
 
@@ -90,3 +96,137 @@ def test_position():
         assert pos.shape == (int(T / Ts),)
         # TODO Why does this fail for POS_0 != 0.0?
         assert pos[0] == POS_0
+
+
+@pytest.mark.parametrize(
+    "randomized_interpolation, range_of_motion",
+    [(False, False), (False, True), (True, False), (True, True)],
+)
+def test_angle_vectorized(randomized_interpolation, range_of_motion):
+    T, Ts, ANG_0 = 30.0, 0.01, 0.5
+
+    def angle(key, vectorized):
+        return ring.algorithms.random_angle_over_time(
+            jrand.fold_in(key, 0),
+            jrand.fold_in(key, 1),
+            ANG_0,
+            0.1,
+            3.0,
+            0.0,
+            2 * np.pi,
+            0.05,
+            0.3,
+            T,
+            Ts,
+            None,
+            5,
+            randomized_interpolation,
+            range_of_motion,
+            vectorized=vectorized,
+        )
+
+    keys = jrand.split(jrand.PRNGKey(1), 32)
+    angles = {
+        vectorized: np.unwrap(jax.vmap(lambda key: angle(key, vectorized))(keys))
+        for vectorized in [False, True]
+    }
+
+    assert angles[True].shape == (32, int(T / Ts))
+    np.testing.assert_allclose(angles[True][:, 0], ANG_0, rtol=1e-6)
+    # same distribution of angular velocities as the loop sampler
+    dang = {k: np.abs(np.diff(v, axis=-1) / Ts).mean() for k, v in angles.items()}
+    np.testing.assert_allclose(dang[True], dang[False], rtol=0.05)
+
+
+def test_position_vectorized():
+    T, Ts, pos_min, pos_max = 30.0, 0.01, -0.2, 0.2
+
+    def position(key, vectorized):
+        return ring.algorithms.random_position_over_time(
+            key,
+            0.0,
+            pos_min,
+            pos_max,
+            0.1,
+            0.5,
+            0.1,
+            0.5,
+            T,
+            Ts,
+            None,
+            10,
+            vectorized=vectorized,
+        )
+
+    keys = jrand.split(jrand.PRNGKey(1), 32)
+    pos = {
+        vectorized: jax.vmap(lambda key: position(key, vectorized))(keys)
+        for vectorized in [False, True]
+    }
+
+    assert pos[True].shape == (32, int(T / Ts))
+    assert np.all(pos[True][:, 0] == 0.0)
+    assert np.all((pos[True] >= pos_min) & (pos[True] <= pos_max))
+    dpos = {k: np.abs(np.diff(v, axis=-1) / Ts).mean() for k, v in pos.items()}
+    np.testing.assert_allclose(dpos[True], dpos[False], rtol=0.1)
+
+
+def test_draw_knots_overrun():
+    # the intervals do not cover `T`, so the knots are redrawn and then continued
+    # by the extra blocks of `ceil(sqrt(4)) = 2` knots
+    def draw(x, n, key):
+        return jnp.ones((n,)), x + jnp.cumsum(jrand.uniform(key, (n,)))
+
+    knots = _draw_knots(draw, [jrand.PRNGKey(1)], jnp.array(0.5), 7.5, 0.1, 4)
+    assert knots.shape == (4 + 4 * 2, 2)
+    np.testing.assert_allclose(knots[:9, 0], np.arange(9.0), atol=1e-6)
+    assert knots[0, 1] == 0.5
+    # the values continue from the last knot
+    assert np.all(np.diff(knots[1:9, 1]) >= 0.0)
+    # all knots after the first one beyond `T` are equal to it
+    np.testing.assert_array_equal(knots[8:], jnp.repeat(knots[8:9], 4, 0))
+
+    # if even the extra blocks do not cover `T`, the last knot is kept
+    knots = _draw_knots(draw, [jrand.PRNGKey(1)], jnp.array(0.5), 100.0, 0.1, 4)
+    assert knots.shape == (12, 2)
+    np.testing.assert_allclose(knots[:, 0], np.arange(12.0), atol=1e-6)
+
+
+@pytest.mark.parametrize("range_of_motion", [False, True])
+def test_vectorized_no_preallocation(range_of_motion):
+    T, t_min, Ts = 400.0, 0.05, 0.1
+    assert T // t_min > _PREALLOCATION_WARN_LIMIT
+
+    def angle(vectorized):
+        return jax.jit(
+            lambda key: ring.algorithms.random_angle_over_time(
+                jrand.fold_in(key, 0),
+                jrand.fold_in(key, 1),
+                0.0,
+                0.1,
+                3.0,
+                0.0,
+                2 * np.pi,
+                t_min,
+                0.3,
+                T,
+                Ts,
+                range_of_motion=range_of_motion,
+                vectorized=vectorized,
+            )
+        ).lower(jrand.PRNGKey(1))
+
+    def position(vectorized):
+        return jax.jit(
+            lambda key: ring.algorithms.random_position_over_time(
+                key, 0.0, -0.2, 0.2, 0.1, 0.5, t_min, 0.3, T, Ts, vectorized=vectorized
+            )
+        ).lower(jrand.PRNGKey(1))
+
+    for fn in [angle, position]:
+        with pytest.warns(UserWarning, match="preallocating"):
+            fn(vectorized=False)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings("error", message=".*preallocating")
+            fn(vectorized=True)
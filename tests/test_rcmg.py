@@ -1,9 +1,13 @@
+import os
+
 import jax
 import jax.numpy as jnp
 import numpy as np
 import pytest
+import tree_utils
 
 import ring
+from ring.algorithms.generator import batch
 from ring.maths import unit_quats_like
 from ring.maths import wrap_to_pi
 
@@ -34,6 +38,25 @@ def test_batch_generator(N: int, seed: int):
     arr_eq(2 * N, 3 * N)
 
 
+def test_generators_lazy_dispatch():
+    sys = ring.io.load_example("test_free")
+    gens = [
+        ring.RCMG(sys, config, add_y_relpose=1).to_lazy_gen()
+        for config in [ring.MotionConfig(T=3.0), ring.MotionConfig(T=3.0, t_max=1.0)]
+    ]
+    repeats = [1, 3, 2]
+    grouped = batch.generators_lazy(
+        [gens[0], gens[1], gens[0]], repeats, dispatch="grouped"
+    )
+    switch = batch.generators_lazy([gens[0], gens[1], gens[0]], repeats)
+    key = jax.random.PRNGKey(1)
+    np.testing.assert_allclose(
+        jax.tree_util.tree_leaves(grouped(key)),
+        jax.tree_util.tree_leaves(switch(key)),
+        atol=1e-5,
+    )
+
+
 def test_initial_ang_pos_values():
     T = 1.0
     bs = 8
@@ -144,3 +167,232 @@ def test_rcmg_sizes_arg():
 
     d = make(3, 2).to_list(6)
     assert len(d) == 6
+
+
+def test_rcmg_to_shards(tmp_path):
+    sys = ring.io.load_example("test_double_pendulum")
+    rcmg = ring.RCMG(sys, ring.MotionConfig(T=3.0), add_y_relpose=1, disable_tqdm=1)
+    data = rcmg.to_list(10)
+    rcmg.to_shards(tmp_path / "shards", 10, shard_size=4)
+
+    reader = ring.utils.shards.ShardReader(tmp_path / "shards")
+    assert len(reader) == 10
+    assert reader.shard_sizes == [4, 4, 2]
+
+    indices = [9, 0, 5, 4, 3]
+    expected = jax.tree_map(lambda *a: np.stack(a), *[data[i] for i in indices])
+    jax.tree_map(np.testing.assert_array_equal, reader.take(indices), expected)
+    jax.tree_map(np.testing.assert_array_equal, reader[7], data[7])
+
+    # an existing dataset is only overwritten if requested
+    with pytest.raises(Exception, match="already exists"):
+        rcmg.to_shards(tmp_path / "shards", 10, shard_size=4)
+    # the shards of the previous, larger dataset are deleted
+    rcmg.to_shards(tmp_path / "shards", 2, shard_size=4, overwrite=True)
+    assert len(ring.utils.shards.ShardReader(tmp_path / "shards")) == 2
+    files = os.listdir(tmp_path / "shards")
+    assert {file.split("_")[0] for file in files} == {"index.pickle", "shard0"}
+    rcmg.to_shards(tmp_path / "shards", 10, shard_size=4, overwrite=True)
+
+    # the `shards` backend does not require `torch`
+    from ring.utils import dataloader
+
+    gen = dataloader.make_generator(
+        tmp_path / "shards",
+        batch_size=5,
+        transform=None,
+        shuffle=False,
+        backend="shards",
+    )
+    for start in [0, 5, 0]:
+        expected = jax.tree_map(lambda *a: np.stack(a), *data[start : start + 5])
+        jax.tree_map(np.testing.assert_array_equal, gen(None), [expected])
+
+
+@pytest.mark.parametrize("to", ["to_shards", "to_hdf5"])
+def test_rcmg_stream_resume(tmp_path, monkeypatch, to):
+    sys = ring.io.load_example("test_double_pendulum")
+    configs = [ring.MotionConfig(T=3.0), ring.MotionConfig(T=3.0, t_max=0.5)]
+    rcmg = ring.RCMG([sys, sys], configs, add_y_relpose=1, disable_tqdm=1)
+    data = rcmg.to_list([4, 2], seed=2)
+
+    # interrupt the run after the first generator call
+    generators_eager = batch.generators_eager
+
+    def interrupted(gens, n_calls, callback, *args):
+        def _callback(data):
+            callback(data)
+            raise KeyboardInterrupt
+
+        generators_eager(gens, n_calls, _callback, *args)
+
+    monkeypatch.setattr(batch, "generators_eager", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        getattr(rcmg, to)(tmp_path / "data", [4, 2], seed=2)
+    monkeypatch.undo()
+
+    # the seed is taken from the checkpoint
+    stats = getattr(rcmg, to)(tmp_path / "data", [4, 2], seed=5, resume=True)
+    assert 0 < stats["n_sequences"] < 6
+
+    if to == "to_shards":
+        loaded = ring.utils.shards.load_shards(tmp_path / "data")
+    else:
+        loaded = ring.utils.hdf5.load(tmp_path / "data")
+    expected = jax.tree_map(lambda *a: np.stack(a), *data)
+    jax.tree_map(np.testing.assert_array_equal, loaded, expected)
+
+
+def test_rcmg_processes():
+    sys = ring.io.load_example("test_double_pendulum")
+    config = ring.MotionConfig(T=3.0)
+    rcmg = ring.RCMG([sys, sys], config, add_y_relpose=1, disable_tqdm=1)
+    data = rcmg.to_list(4, seed=3)
+    data_processes = rcmg.to_list(4, seed=3, processes=2)
+
+    assert len(data) == len(data_processes) == 4
+    jax.tree_map(np.testing.assert_array_equal, data_processes, data)
+
+
+@pytest.mark.parametrize("single_threaded", [False, True])
+def test_generators_eager_processes_xla_flags(single_threaded: bool):
+    flag = "--xla_cpu_multi_thread_eigen=false"
+    # the worker appends to its own copy of `built`
+    built = []
+
+    def make_generators():
+        # only executed in the worker, before any generator is called
+        built.append(True)
+        in_worker = flag in os.environ.get("XLA_FLAGS", "")
+        return [lambda key: {"flag": np.array([in_worker])}]
+
+    xla_flags = os.environ.get("XLA_FLAGS")
+    data = []
+    batch.generators_eager_processes(
+        make_generators,
+        [2],
+        data.extend,
+        disable_tqdm=True,
+        processes=1,
+        single_threaded=single_threaded,
+    )
+
+    assert [d["flag"] for d in data] == [single_threaded] * 2
+    # the generators are never built in this process
+    assert built == []
+    # the flags of this process are restored
+    assert os.environ.get("XLA_FLAGS") == xla_flags
+
+
+def test_rcmg_sample():
+    sys = ring.io.load_example("test_double_pendulum")
+    configs = [ring.MotionConfig(T=3.0), ring.MotionConfig(T=3.0, t_max=0.5)]
+    rcmg = ring.RCMG([sys, sys], configs, add_y_relpose=1)
+
+    data = rcmg.sample(range(8), seed=2)
+    assert tree_utils.tree_shape(data) == 8
+    # every sequence only depends on its index
+    indices = [7, 0, 3, 7]
+    expected = jax.tree_map(lambda a: a[np.array(indices)], data)
+    jax.tree_map(np.testing.assert_array_equal, rcmg.sample(indices, seed=2), expected)
+    jax.tree_map(
+        np.testing.assert_array_equal,
+        rcmg.sample(5, seed=2),
+        jax.tree_map(lambda a: a[5:6], data),
+    )
+
+    # e.g. a worker of `range(rank, N, n_workers)` with `rank >= N`
+    empty = rcmg.sample(range(8, 4, 2), seed=2)
+    assert jax.tree_util.tree_structure(empty) == jax.tree_util.tree_structure(data)
+    leaves = zip(jax.tree_util.tree_leaves(empty), jax.tree_util.tree_leaves(data))
+    for leaf, leaf_data in leaves:
+        assert leaf.shape == (0,) + leaf_data.shape[1:]
+        assert leaf.dtype == leaf_data.dtype
+
+    other_seed = rcmg.sample(range(8), seed=3)
+    assert not np.allclose(
+        jax.tree_util.tree_leaves(other_seed)[0], jax.tree_util.tree_leaves(data)[0]
+    )
+
+
+def test_rcmg_nan_resamples():
+    sys = ring.io.load_example("test_double_pendulum")
+
+    def finalize_fn(key, q, x, sys):
+        # every second sequence is not finite
+        return jnp.where(jax.random.bernoulli(key), jnp.nan, q)
+
+    rcmg = ring.RCMG(sys, ring.MotionConfig(T=1.0), finalize_fn=finalize_fn)
+    q = rcmg.to_lazy_gen(16)(jax.random.PRNGKey(1))
+    finite = np.all(np.isfinite(q), axis=(1, 2))
+    assert 0 < np.sum(finite) < 16
+
+    gen = rcmg.to_lazy_gen(16, nan_resamples=20)
+    q_resampled = gen(jax.random.PRNGKey(1))
+    assert np.all(np.isfinite(q_resampled))
+    # finite sequences are unchanged
+    np.testing.assert_array_equal(q_resampled[finite], q[finite])
+
+    summary = gen.nan_rejections.summary()
+    assert summary["n_calls"] == 16
+    assert summary["n_rejected"] >= np.sum(~finite)
+    assert summary["n_failed"] == 0
+    assert 0 < summary["rejection_rate"] < 1
+
+    # tracing the generator does not count (or leak tracers)
+    jax.jit(gen)(jax.random.PRNGKey(2))
+    gen(jax.random.PRNGKey(3)).block_until_ready()
+    assert gen.nan_rejections.summary(block=False)["n_calls"] == 32
+
+
+def test_rcmg_stacked_configs():
+    configs = [
+        ring.MotionConfig(T=3.0),
+        ring.MotionConfig(T=3.0, t_max=1.0, dang_max=1.0),
+        ring.MotionConfig(T=3.0, pos_min=-1.0, pos_max=1.0, ang0_max=0.0),
+    ]
+    config, fields = ring.algorithms.stack_motionconfigs(configs)
+    assert config.T == 3.0
+    assert fields["t_max"].shape == (3,)
+    assert "T" not in fields
+    # `T` determines the shape of `q`
+    assert ring.algorithms.stack_motionconfigs(configs + [ring.MotionConfig()]) is None
+
+    sys = ring.io.load_example("test_three_seg_seg2")
+    make_gen = lambda stack_configs: ring.RCMG(
+        sys,
+        configs,
+        finalize_fn=lambda key, q, x, sys: q,
+        stack_configs=stack_configs,
+    ).to_lazy_gen(6)
+    q = make_gen(True)(jax.random.PRNGKey(1))
+
+    # one `draw_random_q` per config
+    q_loop = make_gen(False)(jax.random.PRNGKey(1))
+    np.testing.assert_allclose(q, q_loop, atol=1e-4)
+
+
+def test_rcmg_randomize_hz_buckets():
+    sys = ring.io.load_example("test_three_seg_seg2")
+    rcmg = ring.RCMG(
+        sys,
+        ring.MotionConfig(T=2.0),
+        add_X_imus=True,
+        add_y_relpose=True,
+        randomize_hz=True,
+        randomize_hz_kwargs=dict(
+            sampling_rates=[120.0, 40.0, 100.0, 50.0], n_buckets=2
+        ),
+    )
+    # one generator per bucket, [40, 50] and [100, 120]
+    assert len(rcmg.gens) == 2
+    X, y = rcmg.to_lazy_gen(8)(jax.random.PRNGKey(1))
+
+    assert X["mask"].shape == (8, 240)
+    assert X["seg1"]["acc"].shape == (8, 240, 3)
+    assert y["seg1"].shape == (8, 240, 4)
+    # every sequence spans `T`, the first four are of the first bucket
+    N_valid = np.sum(X["mask"], axis=1)
+    np.testing.assert_allclose(N_valid, 2.0 / X["dt"], atol=1.0)
+    assert np.all(N_valid[:4] <= 100) and np.all(N_valid[4:] >= 200)
+    assert all(np.all(np.isfinite(leaf)) for leaf in jax.tree_util.tree_leaves(y))
@@ -2,6 +2,7 @@ import jax
 import jax.numpy as jnp
 import numpy as np
 import ring
+from ring.algorithms import sensors
 from ring.algorithms.sensors import rescale_natural_units
 
 
@@ -135,3 +136,85 @@ def test_natural_units():
 
     # just test that this works
     {key: rescale_natural_units(val) for key, val in X.items()}
+
+
+def test_associative_scan():
+    T, dt = 1000, 0.01
+    t = jnp.arange(T) * dt
+    pos = jnp.stack([jnp.sin(t), jnp.cos(2 * t), jnp.sin(0.5 * t)], axis=-1)
+    pos += jax.random.normal(jax.random.PRNGKey(1), pos.shape) * 0.01
+    xs = ring.Transform.create(pos=pos)
+
+    for method in ["forward", "backward", "forward_backward"]:
+        np.testing.assert_allclose(
+            sensors._butterworth(pos, 1 / dt, 10.0, method, associative_scan=True),
+            sensors._butterworth(pos, 1 / dt, 10.0, method),
+            atol=1e-4,
+        )
+
+    np.testing.assert_allclose(
+        sensors._quasi_physical_simulation(xs, dt, associative_scan=True).pos,
+        sensors._quasi_physical_simulation(xs, dt).pos,
+        atol=1e-4,
+    )
+
+    # everything together; the quaternion low-pass filter is only approximate
+    xs = xs.replace(rot=ring.maths.quat_euler(pos))
+    imu_kwargs = dict(
+        quasi_physical=True,
+        low_pass_filter_pos_f_cutoff=10.0,
+        low_pass_filter_rot_cutoff=10.0,
+    )
+    imu = sensors.imu(xs, jnp.array([0, 0, 9.81]), dt, **imu_kwargs)
+    imu_assoc = sensors.imu(
+        xs, jnp.array([0, 0, 9.81]), dt, associative_scan=True, **imu_kwargs
+    )
+    np.testing.assert_allclose(imu_assoc["acc"], imu["acc"], atol=0.01)
+    np.testing.assert_allclose(imu_assoc["gyr"], imu["gyr"], atol=0.01)
+
+
+def _np_smoothen(arr, kernel):
+    half_window = (len(kernel) - 1) // 2
+    arr = np.pad(arr, ((half_window, half_window), (0, 0)), mode="edge")
+    return np.stack(
+        [np.convolve(col, kernel[::-1], mode="valid") for col in arr.T], axis=-1
+    )
+
+
+def test_smoothen():
+    T = 5000
+    arr = np.random.default_rng(1).normal(size=(T, 3)) * 20 + 9.81
+
+    for window in [3, 15, 17, 101]:
+        np.testing.assert_allclose(
+            sensors._moving_average(jnp.asarray(arr), window),
+            _np_smoothen(arr, np.ones((window,)) / window),
+            atol=1e-4,
+        )
+
+    for kernel in ["gaussian", "savgol2", "savgol3"]:
+        for window in [7, 51]:
+            coeffs = sensors._fir_kernel(kernel, window)
+            np.testing.assert_allclose(np.sum(coeffs), 1.0, rtol=1e-6)
+            np.testing.assert_allclose(
+                sensors._smoothen(jnp.asarray(arr), window, kernel),
+                _np_smoothen(arr, coeffs),
+                atol=1e-3,
+            )
+
+    # savitzky-golay filters reproduce polynomials up to their order
+    t = np.linspace(-1, 1, 200)[:, None]
+    np.testing.assert_allclose(
+        sensors._smoothen(jnp.asarray(t**2), 11, "savgol2")[5:-5],
+        (t**2)[5:-5],
+        atol=1e-5,
+    )
+
+    imu = sensors.imu(
+        ring.Transform.create(pos=jnp.asarray(arr)),
+        jnp.zeros((3,)),
+        0.01,
+        smoothen_degree=5,
+        smoothen_kernel="gaussian",
+    )
+    assert imu["acc"].shape == (T, 3)
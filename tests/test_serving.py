@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ring import ml
+
+
+def test_inference_engine():
+    rng = np.random.default_rng(1)
+    lams = [(-1, 0, 1), (-1, 0, 0, 2), (-1, -1), (-1, 0, 1, 2, 3)]
+    X0 = rng.normal(size=(10, 3, 9)).astype(np.float32)
+    params, _ = ml.RING(hidden_state_dim=20, message_dim=10, lam=lams[0]).init(X=X0)
+    ringnet = ml.base.ScaleX_FilterWrapper(
+        ml.RING(params, hidden_state_dim=20, message_dim=10)
+    )
+
+    requests = []
+    for i in range(10):
+        lam = lams[i % len(lams)]
+        T = [30, 45, 60][i % 3]
+        requests.append((rng.normal(size=(T, len(lam), 9)).astype(np.float32), lam))
+
+    engine = ml.InferenceEngine(ringnet, max_batch_size=4, T_bucket_size=32)
+    yhats = engine.infer(requests)
+    for (X, lam), yhat in zip(requests, yhats):
+        np.testing.assert_allclose(yhat, ringnet.apply(X, lam=lam)[0], atol=1e-5)
+    # T is padded to 32 or 64 and N to 2, 4 or 8
+    buckets = {bucket[1:3] for bucket in engine._compiled_buckets}
+    assert buckets == {(T, N) for T in [32, 64] for N in [2, 4, 8]}
+
+    with engine:
+        futures = [engine.submit(X, lam) for X, lam in requests]
+        for future, yhat in zip(futures, yhats):
+            np.testing.assert_allclose(future.result(), yhat, atol=1e-6)
+
+
+class _SumFilter(ml.base.AbstractFilter):
+    def _apply_batched(self, X, params, state, y, lam):
+        return X.sum(axis=-1, keepdims=True), state
+
+
+def test_inference_engine_features_and_threads():
+    rng = np.random.default_rng(1)
+    lam = (-1, 0, 1)
+    # requests of the same `T` and `N` but a different number of features
+    requests = [
+        (rng.normal(size=(20, len(lam), F)).astype(np.float32), lam)
+        for F in [9, 10, 9, 10]
+    ]
+
+    engine = ml.InferenceEngine(_SumFilter(), max_batch_size=4, T_bucket_size=32)
+    for (X, _), yhat in zip(requests, engine.infer(requests)):
+        np.testing.assert_allclose(yhat, X.sum(-1, keepdims=True), atol=1e-5)
+    assert {bucket[-1] for bucket in engine._compiled_buckets} == {9, 10}
+
+    # the first `submit`s of many threads start only one worker thread
+    with engine, ThreadPoolExecutor(8) as pool:
+        futures = list(pool.map(lambda request: engine.submit(*request), requests * 4))
+        for future, (X, _) in zip(futures, requests * 4):
+            np.testing.assert_allclose(
+                future.result(), X.sum(-1, keepdims=True), atol=1e-5
+            )
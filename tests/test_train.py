@@ -1,7 +1,11 @@
 from pathlib import Path
 
+import haiku as hk
+import jax
+import jax.numpy as jnp
 import numpy as np
 import optax
+import pytest
 import tree_utils
 
 import ring
@@ -47,6 +51,107 @@ def test_ring():
     )
 
 
+def test_ring_precision():
+    lam = (-1, 0, 1)
+    X = np.random.default_rng(1).normal(size=(2, 20, 3, 9)).astype(np.float32)
+    params, _ = ml.RING(hidden_state_dim=20, message_dim=10, lam=lam).init(X=X)
+    yhat, _ = ml.RING(params, lam, hidden_state_dim=20, message_dim=10).apply(X)
+
+    for precision, atol in [("bfloat16", 5e-2), ("float16", 1e-2)]:
+        ringnet = ml.RING(
+            params, lam, hidden_state_dim=20, message_dim=10, precision=precision
+        )
+        for module, name, value in hk.data_structures.traverse(ringnet.params):
+            dtype = np.float32 if "layer_norm" in module else precision
+            assert value.dtype == dtype, f"{module}/{name}"
+        yhat_precision, state = ringnet.apply(X)
+        assert yhat_precision.dtype == state["~"]["inner_cell_state"].dtype
+        assert yhat_precision.dtype == np.float32
+        np.testing.assert_allclose(yhat_precision, yhat, atol=atol)
+
+
+def test_ring_step(tmp_path):
+    lam = (-1, 0, 1)
+    X = np.random.default_rng(1).normal(size=(2, 20, 3, 9)).astype(np.float32)
+    y = ring.maths.quat_random(jax.random.PRNGKey(1), (2, 20, 3))
+    params, _ = ml.RING(hidden_state_dim=20, message_dim=10, lam=lam).init(X=X)
+    ringnet = ml.RING(params, lam, hidden_state_dim=20, message_dim=10)
+    ringnet = ml.base.ScaleX_FilterWrapper(ringnet)
+    ringnet = ml.base.LPF_FilterWrapper(ringnet, 10.0, 100.0, filtfilt=False)
+    ringnet = ml.base.GroundTruthHeading_FilterWrapper(ringnet)
+
+    yhat, final_state = ringnet.apply(X, y=y)
+    state, yhat_step = None, []
+    for t in range(X.shape[1]):
+        yhat_t, state = ringnet.step(X[:, t], state=state, y=y[:, t])
+        yhat_step.append(yhat_t)
+    np.testing.assert_allclose(np.stack(yhat_step, axis=1), yhat, atol=1e-5)
+    assert tree_utils.tree_close(state, final_state, atol=1e-5)
+
+    assert ringnet.step(X[0, 0])[0].shape == (3, 4)
+    ringnet.save(tmp_path / "ringnet.pickle")
+
+
+def test_tbp_scan():
+    gen, lam = _load_gen_lam()
+    X, y = gen(jax.random.PRNGKey(1))
+    ringnet = ml.RING(hidden_state_dim=20, message_dim=10, lam=lam).nojit()
+    params, _ = ringnet.init(X=X, seed=1)
+    optimizer = optax.adam(1e-3)
+    opt_state = optimizer.init(params)
+
+    def step(**kwargs):
+        step_fn = ml.train._build_step_fn(
+            ml.train._default_loss_fn, ringnet, optimizer, tbp=250, **kwargs
+        )
+        return step_fn(params, opt_state, X, y)
+
+    params_loop, _, loss_loop, grads_loop = step()
+    params_scan, _, loss_scan, grads_scan = step(tbp_scan=True)
+    _, _, _, grads_stats = step(tbp_scan=True, tbp_scan_grads_stats=True)
+
+    np.testing.assert_allclose(loss_loop["loss"], loss_scan["loss"], rtol=1e-5)
+    assert tree_utils.tree_close(params_loop, params_scan, rtol=1e-4, atol=1e-6)
+    assert len(grads_loop) == len(grads_scan) == len(grads_stats) == 4
+    assert tree_utils.tree_close(grads_loop, grads_scan, rtol=1e-4, atol=1e-6)
+    grads_flat = tree_utils.batch_concat(grads_loop[-1], num_batch_dims=0)
+    np.testing.assert_allclose(
+        grads_stats[-1].l2norm, np.linalg.norm(grads_flat), rtol=1e-4
+    )
+
+
+def test_prefetch():
+    gen, lam = _load_gen_lam()
+    keys = jax.random.split(jax.random.PRNGKey(1), 3)
+
+    prefetcher = ml.training_loop.GeneratorPrefetcher(gen, queue_depth=2)
+    for key in keys:
+        prefetcher.submit(key)
+    for key in keys:
+        assert tree_utils.tree_close(prefetcher.get(), gen(key))
+    assert prefetcher.metrices()["prefetch_starved"] <= 1.0
+    prefetcher.close()
+    assert not prefetcher._thread.is_alive()
+
+    # closing does not hang if the worker is blocked on a full queue
+    prefetcher = ml.training_loop.GeneratorPrefetcher(gen, queue_depth=1)
+    for key in keys:
+        prefetcher.submit(key)
+    prefetcher.close()
+    assert not prefetcher._thread.is_alive()
+    assert prefetcher._samples.empty()
+
+    logger = ml.ml_utils.DictLogger()
+    ml.train_fn(
+        gen,
+        5,
+        ml.RING(hidden_state_dim=20, message_dim=10, lam=lam),
+        loggers=[logger],
+        prefetch=2,
+    )
+    assert len(logger.get_logs()["prefetch_starved"]) == 5
+
+
 def _remove_file_if_exists(path: str) -> None:
     Path(path).expanduser().unlink(missing_ok=True)
 
@@ -108,3 +213,66 @@ def test_checkpointing():
     )
 
     np.testing.assert_allclose(trained_params_nopause_flat, trained_params_pause_flat)
+
+
+def test_masked_loss():
+    gen, lam = _load_gen_lam()
+    X, y = gen(jax.random.PRNGKey(1))
+    ringnet = ml.RING(hidden_state_dim=20, message_dim=10, lam=lam).nojit()
+    params, _ = ringnet.init(X=X, seed=1)
+    optimizer = optax.adam(1e-3)
+    opt_state = optimizer.init(params)
+
+    def loss(X, y, mask=None, metric_fn=ml.train._default_loss_fn, **kwargs):
+        step_fn = ml.train._build_step_fn(metric_fn, ringnet, optimizer, **kwargs)
+        return step_fn(params, opt_state, X, y, mask)[2]["loss"]
+
+    # only the first half of the sequences is valid
+    T = X.shape[1]
+    mask = np.arange(T)[None] < np.full((X.shape[0], 1), T // 2)
+    loss_half = loss(X[:, : T // 2], y[:, : T // 2], tbp=T // 2)
+    np.testing.assert_allclose(loss(X, y, mask, tbp=T), loss_half, rtol=1e-5)
+    np.testing.assert_allclose(
+        loss(X, y, mask, tbp=T, tbp_scan=True), loss_half, rtol=1e-5
+    )
+
+    # the update of the second chunk without valid timesteps is skipped, so the
+    # parameters are the same as after the first chunk only
+    def step(X, y, mask=None, **kwargs):
+        step_fn = ml.train._build_step_fn(
+            ml.train._default_loss_fn, ringnet, optimizer, tbp=T // 2, **kwargs
+        )
+        return step_fn(params, opt_state, X, y, mask)[0]
+
+    params_half = step(X[:, : T // 2], y[:, : T // 2])
+    for tbp_scan in [False, True]:
+        jax.tree_map(
+            lambda a, b: np.testing.assert_allclose(a, b, rtol=1e-5, atol=1e-7),
+            step(X, y, mask, tbp_scan=tbp_scan),
+            params_half,
+        )
+
+    # a `metric_fn` that reduces over the time-axis can not be masked
+    reduced = lambda q, qhat: jnp.mean(ml.train._default_loss_fn(q, qhat))
+    with pytest.raises(AssertionError, match="must keep the time-axis"):
+        loss(X, y, mask, metric_fn=reduced, tbp=T)
+
+
+def test_train_randomize_hz_buckets():
+    sys = ring.io.load_example("test_three_seg_seg2")
+    gen = ring.RCMG(
+        sys,
+        ring.MotionConfig(T=2.0),
+        add_X_imus=1,
+        add_y_relpose=1,
+        add_y_rootincl=1,
+        use_link_number_in_Xy=1,
+        randomize_hz=True,
+        randomize_hz_kwargs=dict(sampling_rates=[50.0, 100.0], n_buckets=2),
+    ).to_lazy_gen(2)
+    gen = ring.algorithms.GeneratorTrafoExpandFlatten(gen)
+    X, y, mask = gen(jax.random.PRNGKey(1))
+    assert X.shape[:2] == y.shape[:2] == mask.shape == (2, 200)
+
+    lam = sys.make_sys_noimu()[0].link_parents
+    ml.train_fn(gen, 2, ml.RING(hidden_state_dim=20, message_dim=10, lam=lam), tbp=100)
@@ -1,7 +1,11 @@
+import jax
+import numpy as np
 import pytest
 
+import ring
 from ring.utils import dict_to_nested
 from ring.utils import dict_union
+from ring.utils import hdf5
 from ring.utils import tree_equal
 
 
@@ -31,3 +35,88 @@ def test_dict_union():
 def test_dict_nest():
     d = dict(x=1)
     assert tree_equal(dict(x=dict(fancy=1)), dict_to_nested(d, "fancy"))
+
+
+def test_hdf5_writer(tmp_path):
+    data = [
+        dict(X=np.full((4, 2), i, dtype=np.float32), y=(np.array([i]),))
+        for i in range(11)
+    ]
+    filepath = str(tmp_path / "data.h5")
+    with hdf5.HDF5Writer(filepath, compression="gzip", chunk_sequences=2) as writer:
+        writer.append(data[:3])
+        writer.append(data[3:])
+        assert len(writer) == 11
+
+    assert hdf5.load_length(filepath) == 11
+    batched = jax.tree_map(lambda *a: np.stack(a), *data)
+    assert tree_equal(hdf5.load(filepath), batched)
+    indices = [10, 0, 3, 4]
+    assert tree_equal(
+        hdf5.load(filepath, indices),
+        jax.tree_map(lambda a: a[np.sort(indices)], batched),
+    )
+
+
+def test_compile_cache(tmp_path):
+    compile_cache = ring.utils.compile_cache
+    sys = ring.io.load_example("test_double_pendulum")
+    rcmg = ring.RCMG(sys, ring.MotionConfig(T=1.0), add_y_relpose=True)
+    key = jax.random.PRNGKey(1)
+    expected = rcmg.to_lazy_gen(2)(key)
+
+    compile_cache.set_cache_dir(tmp_path)
+    compile_cache.reset_counters()
+    try:
+        for hits in range(2):
+            # a new generator, such that the in-memory cache of `jax.jit` is empty
+            data = rcmg.to_lazy_gen(2)(key)
+            jax.tree_map(np.testing.assert_allclose, data, expected)
+            assert compile_cache.counters() == dict(hits=hits, misses=1)
+
+        # a different configuration is a different executable
+        ring.RCMG(sys, ring.MotionConfig(T=1.5)).to_lazy_gen(2)(key)
+        assert compile_cache.counters() == dict(hits=1, misses=2)
+
+        # lambdas can not be part of a key, so no caching
+        rcmg = ring.RCMG(sys, ring.MotionConfig(T=1.0), finalize_fn=lambda *a: a)
+        assert [cache_key() for cache_key in rcmg._cache_keys] == [None]
+    finally:
+        compile_cache.set_cache_dir(None)
+
+
+_SCALE = 2.0
+
+
+def _helper(x):
+    return _SCALE * x
+
+
+def _uses_helper(x):
+    return _helper(x) + 1.0
+
+
+def test_compile_cache_make_key(monkeypatch):
+    make_key = ring.utils.compile_cache.make_key
+    key = make_key(_uses_helper)
+
+    # module-level constants and callees are part of the key
+    monkeypatch.setitem(globals(), "_SCALE", 3.0)
+    assert make_key(_uses_helper) != key
+    monkeypatch.undo()
+    assert make_key(_uses_helper) == key
+
+    monkeypatch.setitem(globals(), "_helper", lambda x: x)
+    with pytest.raises(ring.utils.compile_cache.Unkeyable):
+        make_key(_uses_helper)
+    monkeypatch.undo()
+
+    # closures can not be keyed
+    def make_fn(c):
+        def fn(x):
+            return x + c
+
+        return fn
+
+    with pytest.raises(ring.utils.compile_cache.Unkeyable):
+        make_key(make_fn(1.0))